@@ -129,6 +129,97 @@ MAX_ATTEMPTS = 10
 MAX_RUN_TIME = 600
 BACKGROUND_TASK_RUN_ASYNC = True
 
+# Maximum number of seconds the CLAM process poller (manage.py poll_processes) sleeps between two cycles
+CLAM_POLL_INTERVAL = 1
+# Running processes are polled with exponential backoff between these intervals (in seconds), the interval is reset
+# when new log messages arrive or CLAM reports a completion of at least CLAM_POLL_NEAR_COMPLETION percent
+CLAM_POLL_MIN_INTERVAL = 1
+CLAM_POLL_MAX_INTERVAL = 60
+CLAM_POLL_BACKOFF_FACTOR = 2
+CLAM_POLL_NEAR_COMPLETION = 90
+# Number of consecutive failed status requests (e.g. timeouts or a restarting CLAM server) after which a process fails
+CLAM_POLL_MAX_FAILURES = 5
+# Number of seconds between two syncs of the profiles and parameters of all scripts (manage.py sync_scripts)
+CLAM_SYNC_INTERVAL = 3600
+# Number of processes the batch scheduler keeps in flight per CLAM host (manage.py poll_processes)
+BATCH_MAX_IN_FLIGHT_PER_HOST = 4
+# Maximum number of shards (separate CLAM projects running at the same time) the input files of a process are split into
+CLAM_MAX_SHARDS = 16
+# Maximum number of concurrent requests to a single CLAM host (including uploads and downloads of processes) and
+# maximum number of concurrent status and metadata requests in total
+CLAM_MAX_CONNECTIONS_PER_HOST = 8
+CLAM_MAX_WORKERS = 32
+# Size of the chunks (in bytes) in which files are downloaded from CLAM
+CLAM_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Number of files uploaded to CLAM concurrently per process
+CLAM_UPLOAD_WORKERS = 4
+# Number of times a failed upload is retried and the delay (in seconds) before the first retry
+CLAM_RETRIES = 3
+CLAM_RETRY_DELAY = 1
+# Maximum number of seconds a process status request waits for a change (must stay below the uwsgi harakiri timeout)
+# and the interval (in seconds) in which the process is checked for changes while waiting
+PROCESS_LONG_POLL_TIMEOUT = 15
+PROCESS_LONG_POLL_INTERVAL = 5
+# Maximum number of status requests that wait for a change at the same time per server process. A waiting request holds
+# a uwsgi thread, so this must stay below the number of threads per process (4 in resources/uwsgi.sh, so at most 2 of
+# the 4 threads of each of the 5 processes wait). Status requests above the limit are answered immediately and the
+# client is told to request again after PROCESS_LONG_POLL_INTERVAL seconds.
+PROCESS_LONG_POLL_MAX_WAITERS = 2
+# Maximum number of project folders of which an index of files is cached per process
+FILE_INDEX_CACHE_SIZE = 256
+# Number of seconds the resolved parameters of a script are cached, they are invalidated when the parameters change
+PARAMETER_CACHE_TIMEOUT = 3600
+
+# Folder in which downloadable project archives are cached (an archives folder in DOWNLOAD_DIR if None), unused
+# archives are evicted after ARCHIVE_CACHE_MAX_AGE seconds or when the cache is larger than ARCHIVE_CACHE_MAX_SIZE bytes
+ARCHIVE_CACHE_FOLDER = None
+ARCHIVE_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+ARCHIVE_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+# Folder in which the output files of CLAM runs are cached (a results folder in DOWNLOAD_DIR if None), the least
+# recently used outputs are evicted when the cache is larger than RESULT_CACHE_MAX_SIZE bytes
+RESULT_CACHE_FOLDER = None
+RESULT_CACHE_MAX_SIZE = 5 * 1024 * 1024 * 1024
+
+# Folder of the content-addressed store that input files of projects are hard linked to (a #blobs folder in
+# USER_DATA_FOLDER if None), it must be on the same file system as USER_DATA_FOLDER for files to be deduplicated
+BLOB_STORE_FOLDER = None
+
+# Compression of downloadable zip archives, files with one of the ZIP_STORED_EXTENSIONS are already compressed or
+# hardly compress (PCM audio) and are stored without compression. Archives are streamed in chunks of
+# ZIP_STREAM_CHUNK_SIZE bytes
+ZIP_COMPRESSION_LEVEL = 6
+ZIP_STORED_EXTENSIONS = [
+    "zip",
+    "gz",
+    "bz2",
+    "xz",
+    "wav",
+    "mp3",
+    "ogg",
+    "flac",
+    "m4a",
+    "opus",
+    "mp4",
+    "png",
+    "jpg",
+    "jpeg",
+]
+ZIP_STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Limits for uploaded zip archives, the maximum number of files in an archive and the maximum total uncompressed size
+# (in bytes) of the files that are extracted
+UPLOAD_ZIP_MAX_MEMBERS = 10000
+UPLOAD_ZIP_MAX_SIZE = 20 * 1024 * 1024 * 1024
+
+# Chunked uploads, files are uploaded in chunks of UPLOAD_CHUNK_SIZE bytes of which the browser sends at most
+# UPLOAD_PARALLEL_CHUNKS at the same time. Files can be at most UPLOAD_MAX_FILE_SIZE bytes and uploads that did not
+# receive a chunk for UPLOAD_CHUNK_EXPIRY seconds are removed
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_PARALLEL_CHUNKS = 4
+UPLOAD_MAX_FILE_SIZE = 20 * 1024 * 1024 * 1024
+UPLOAD_CHUNK_EXPIRY = 2 * 24 * 60 * 60
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 STATIC_URL = "/static/"
@@ -14,5 +14,5 @@ def project_status(**kwargs):
     """
     project = kwargs.get("project", None)
     if project is not None:
-        return project.get_next_step()
+        return project.status
     return -1
@@ -103,7 +103,7 @@ class ScriptAdmin(NestedModelAdmin):
 
     inlines = [ProfileInline, BaseParameterInline]
 
-    list_display = ["name", "hostname"]
+    list_display = ["name", "hostname", "last_synced", "last_sync_duration"]
 
     def change_view(self, request, object_id, form_url="", extra_context=None):
         """
@@ -205,7 +205,7 @@ class PipelineAdmin(admin.ModelAdmin):
 class ProcessAdmin(admin.ModelAdmin):
     """Model admin for Processes."""
 
-    list_display = ["folder", "script", "status"]
+    list_display = ["folder", "script", "status", "shard_count"]
     list_filter = ["status", "script"]
 
 
@@ -215,3 +215,35 @@ class ProjectAdmin(admin.ModelAdmin):
 
     list_display = ["name", "user", "pipeline", "current_process"]
     list_filter = ["user", "pipeline"]
+
+
+class BatchProjectInline(admin.TabularInline):
+    """Display the projects of a Batch inline."""
+
+    model = models.BatchProject
+    extra = 0
+    readonly_fields = ["process", "started", "finished"]
+
+
+@admin.register(models.Batch)
+class BatchAdmin(admin.ModelAdmin):
+    """Model admin for Batches."""
+
+    list_display = ["name", "user", "created", "finished", "progress"]
+    list_filter = ["user"]
+    inlines = [BatchProjectInline]
+
+    def progress(self, obj):
+        """
+        Get a summary of the progress of a batch.
+
+        :param obj: the batch
+        :return: a string with the number of done, failed and total projects and the throughput of the batch
+        """
+        progress = obj.get_progress()
+        return "{}/{} done, {} failed, {:.1f} per hour".format(
+            progress["done"],
+            progress["total"],
+            progress["failed"],
+            progress["throughput"],
+        )
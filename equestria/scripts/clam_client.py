@@ -0,0 +1,689 @@
+"""Module to communicate with CLAM servers."""
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import clam.common.client
+import clam.common.data
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+
+
+def call_with_retries(function, *args, retries=None, delay=None, **kwargs):
+    """
+    Call a function and retry it when it raises an exception.
+
+    :param function: the function to call
+    :param args: arguments for the function
+    :param retries: the number of times to retry, defaults to settings.CLAM_RETRIES
+    :param delay: the number of seconds to wait before the first retry, doubled after every retry, defaults to
+    settings.CLAM_RETRY_DELAY
+    :param kwargs: keyword arguments for the function
+    :return: the return value of the function, raises the exception of the last attempt if all attempts fail
+    """
+    retries = settings.CLAM_RETRIES if retries is None else retries
+    delay = settings.CLAM_RETRY_DELAY if delay is None else delay
+    for attempt in range(retries + 1):
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise e
+            logging.warning(
+                "CLAM request failed, retrying in {} seconds. Error: {}".format(
+                    delay, e
+                )
+            )
+            time.sleep(delay)
+            delay *= 2
+
+
+def get_clam_metadata(clamclient, project):
+    """
+    Get the CLAM data describing the profiles and parameters of a CLAM service.
+
+    The info page of the service is requested first. CLAM servers that do not describe their profiles on the info page
+    are asked for the data of a temporary project instead, which is deleted afterwards.
+    :param clamclient: the CLAM client of the service
+    :param project: the CLAM id to use for the temporary project
+    :return: the CLAMData including the profiles and parameters of the service
+    """
+    try:
+        data = clamclient.request("info/")
+        if isinstance(data, clam.common.data.CLAMData) and data.profiles:
+            return data
+    except Exception as e:
+        logging.debug(
+            "CLAM info page not available, using a temporary project. Error: {}".format(
+                e
+            )
+        )
+    clamclient.create(project)
+    try:
+        return clamclient.get(project)
+    finally:
+        clamclient.delete(project)
+
+
+class PooledCLAMClient(clam.common.client.CLAMClient):
+    """
+    CLAM client that sends all requests through one keep-alive HTTP session.
+
+    The default CLAMClient opens a new connection (including the TLS handshake) for every request, this client reuses
+    the connections of its session. CLAMClient sends its requests with the functions of the requests module, so every
+    method of CLAMClient that sends requests itself is overridden here: request (used by get, create, start, delete and
+    the other project methods), initrequest, downloadarchive and addinputfile. The error handling follows CLAMClient.
+    addinput and downloadstorage are not used by this app and still send their requests without the session.
+    """
+
+    def __init__(self, url, user=None, password=None, slots=None, **kwargs):
+        """
+        Initialise the PooledCLAMClient.
+
+        :param url: the URL of the CLAM server
+        :param user: the username for the CLAM server, None if no authentication is needed
+        :param password: the password for the CLAM server, None if no authentication is needed
+        :param slots: the semaphore limiting the concurrent requests to the CLAM server, shared by all clients of the
+        server, None to create a semaphore with settings.CLAM_MAX_CONNECTIONS_PER_HOST slots for this client
+        :param kwargs: keyword arguments for CLAMClient
+        """
+        self.slots = (
+            threading.BoundedSemaphore(settings.CLAM_MAX_CONNECTIONS_PER_HOST)
+            if slots is None
+            else slots
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.CLAM_MAX_CONNECTIONS_PER_HOST,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.request_count = 0
+        self.input_templates = dict()
+        self.lock = threading.Lock()
+        super(PooledCLAMClient, self).__init__(url, user, password, **kwargs)
+        self.auth = None
+        if self.authenticated and not self.oauth:
+            if self.basicauth:
+                self.auth = requests.auth.HTTPBasicAuth(
+                    self.user, self.password
+                )
+            else:
+                self.auth = requests.auth.HTTPDigestAuth(
+                    self.user, self.password
+                )
+
+    def initrequest(self, data=None):
+        """
+        Get the keyword arguments for a request to the CLAM server, see CLAMClient.initrequest.
+
+        Unlike CLAMClient.initrequest, the authentication object is created once per client, so digest authentication
+        reuses its nonce instead of being challenged on every request.
+        :param data: the data to send with the request, None to send no data
+        :return: a dictionary of keyword arguments for send
+        """
+        params = {"headers": self.initauth(), "verify": self.verify}
+        if self.auth is not None:
+            params["auth"] = self.auth
+        if data:
+            params["data"] = data
+        return params
+
+    def send(self, method, url, **kwargs):
+        """
+        Send a HTTP request through the session of this client.
+
+        The request waits for a free slot of the CLAM server and holds it until the response is received.
+        :param method: the HTTP method
+        :param url: the URL to send the request to
+        :param kwargs: keyword arguments for requests.Session.request
+        :return: the requests.Response
+        """
+        with self.lock:
+            self.request_count += 1
+        with self.slots:
+            return self.session.request(method, url, **kwargs)
+
+    def send_streamed(self, method, url, **kwargs):
+        """
+        Send a HTTP request through the session of this client and stream the response.
+
+        The request waits for a free slot of the CLAM server and holds it until the response is released with
+        release_streamed.
+        :param method: the HTTP method
+        :param url: the URL to send the request to
+        :param kwargs: keyword arguments for requests.Session.request
+        :return: the requests.Response
+        """
+        with self.lock:
+            self.request_count += 1
+        self.slots.acquire()
+        try:
+            return self.session.request(method, url, stream=True, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release_streamed(self, response):
+        """
+        Close a response of send_streamed and free its slot of the CLAM server.
+
+        :param response: the requests.Response
+        :return: None
+        """
+        try:
+            response.close()
+        finally:
+            self.slots.release()
+
+    def iter_streamed(self, response):
+        """
+        Iterate over the content of a response of send_streamed in chunks and release it afterwards.
+
+        :param response: the requests.Response
+        :return: a generator of the chunks of the response, the response is released when the generator is exhausted
+        or closed
+        """
+        try:
+            yield from response.iter_content(
+                chunk_size=settings.CLAM_DOWNLOAD_CHUNK_SIZE
+            )
+        finally:
+            self.release_streamed(response)
+
+    def close(self):
+        """
+        Close all connections of this client.
+
+        :return: None
+        """
+        self.session.close()
+
+    @staticmethod
+    def check_response(response, method, url):
+        """
+        Raise the CLAM exception corresponding to the status code of a response, see CLAMClient.request.
+
+        Responses with status code 403 are handled by the callers, as CLAM may describe the error in XML.
+        :param response: the requests.Response
+        :param method: the HTTP method of the request
+        :param url: the URL of the request
+        :return: None, raises a CLAM exception if the response indicates an error
+        """
+        if response.status_code == 400:
+            raise clam.common.data.BadRequest()
+        elif response.status_code == 401:
+            raise clam.common.data.AuthRequired()
+        elif response.status_code == 403:
+            raise clam.common.data.PermissionDenied(response.text)
+        elif response.status_code == 404:
+            raise clam.common.data.NotFound(response.text)
+        elif response.status_code == 500:
+            raise clam.common.data.ServerError(response.text)
+        elif response.status_code == 405:
+            raise clam.common.data.ServerError(
+                "Server returned 405: Method not allowed for {} on {}".format(
+                    method, url
+                )
+            )
+        elif response.status_code == 408:
+            raise clam.common.data.TimeOut()
+        elif not (200 <= response.status_code <= 299):
+            raise Exception(
+                "An error occured, return code {}".format(response.status_code)
+            )
+
+    def request(
+        self, url="", method="GET", data=None, parse=True, encoding=None
+    ):
+        """
+        Issue a HTTP request and parse the CLAM XML response, see CLAMClient.request.
+
+        :param url: the URL relative to the CLAM server
+        :param method: the HTTP method
+        :param data: the data to send with the request
+        :param parse: whether to parse the response as CLAM XML
+        :param encoding: the encoding of the response, None to detect it
+        :return: the CLAMData of the response if parse is True, the text of the response otherwise
+        """
+        response = self.send(method, self.url + url, **self.initrequest(data))
+        if encoding is not None:
+            response.encoding = encoding
+        if response.status_code == 403 and parse:
+            content = self._parse(response.text)
+            if content is not True and content and content.errors:
+                error = content.parametererror()
+                if error:
+                    raise clam.common.data.ParameterError(error)
+            raise clam.common.data.PermissionDenied(
+                content if content and content is not True else response.text
+            )
+        self.check_response(response, method, self.url + url)
+        if parse:
+            return self._parse(response.text)
+        return response.text
+
+    def downloadarchive(self, project, targetfile, archiveformat="zip"):
+        """
+        Download all output files of a project as a single archive.
+
+        Unlike CLAMClient.downloadarchive, the archive is streamed to the target file instead of being held in memory.
+        :param project: the CLAM id of the project
+        :param targetfile: the path (or file object) to write the archive to
+        :param archiveformat: the format of the archive, can be zip, gz or bz2
+        :return: None
+        """
+        url = self.url + project + "/output/" + archiveformat
+        response = self.send_streamed("GET", url, **self.initrequest())
+        try:
+            self.check_response(response, "GET", url)
+            if isinstance(targetfile, str):
+                targetfile = open(targetfile, "wb")
+            with targetfile:
+                for chunk in response.iter_content(
+                    chunk_size=settings.CLAM_DOWNLOAD_CHUNK_SIZE
+                ):
+                    targetfile.write(chunk)
+        finally:
+            self.release_streamed(response)
+
+    def iter_archive(self, project, archiveformat="zip", offset=0):
+        """
+        Stream the output archive of a project in chunks.
+
+        :param project: the CLAM id of the project
+        :param archiveformat: the format of the archive, can be zip, gz or bz2
+        :param offset: the number of bytes of the archive that are already received, the download is resumed at this
+        position with a HTTP Range request
+        :return: a tuple (offset, chunks) with the position in the archive of the first chunk (0 if the server does not
+        support resuming) and a generator of the chunks of the archive, the download holds a slot of the CLAM server
+        until the generator is exhausted or closed
+        """
+        url = self.url + project + "/output/" + archiveformat
+        params = self.initrequest()
+        if offset > 0:
+            params["headers"]["Range"] = "bytes={}-".format(offset)
+        response = self.send_streamed("GET", url, **params)
+        try:
+            self.check_response(response, "GET", url)
+        except Exception:
+            self.release_streamed(response)
+            if response.status_code == 416 and offset > 0:
+                return self.iter_archive(project, archiveformat=archiveformat)
+            raise
+        if response.status_code != 206:
+            offset = 0
+        return offset, self.iter_streamed(response)
+
+    def get_input_template(self, project, template_id):
+        """
+        Get the CLAM input template of a project.
+
+        Input templates are cached per project so uploading many files only requests the project once.
+        :param project: the CLAM id of the project
+        :param template_id: the id of the input template
+        :return: a clam.common.data.InputTemplate
+        """
+        key = (project, template_id)
+        with self.lock:
+            input_template = self.input_templates.get(key)
+        if input_template is None:
+            input_template = self.get(project).inputtemplate(template_id)
+            with self.lock:
+                self.input_templates[key] = input_template
+        return input_template
+
+    def addinputfile(self, project, inputtemplate, sourcefile, **kwargs):
+        """
+        Upload an input file to a CLAM project, see CLAMClient.addinputfile.
+
+        Input templates given by their id are looked up in the cache of this client instead of requesting the project
+        for every file. Without authentication the file is streamed, with authentication it is sent as a multipart form
+        like CLAMClient does.
+        :param project: the CLAM id of the project
+        :param inputtemplate: the id of the input template or a clam.common.data.InputTemplate
+        :param sourcefile: the path of the file to upload
+        :param kwargs: keyword arguments, filename sets the name on the CLAM server, metadata a
+        clam.common.data.CLAMMetaData and metafile the path of a metadata file of the file, other keyword arguments are
+        sent as metadata parameters
+        :return: True if the file was uploaded, raises a CLAM exception otherwise
+        """
+        if isinstance(inputtemplate, str):
+            inputtemplate = self.get_input_template(project, inputtemplate)
+        filename = self.getinputfilename(
+            inputtemplate, kwargs.pop("filename", os.path.basename(sourcefile))
+        )
+        metafile = kwargs.pop("metafile", None)
+        data = {"inputtemplate": inputtemplate.id}
+        for key, value in kwargs.items():
+            if key == "metadata":
+                if not isinstance(value, clam.common.data.CLAMMetaData):
+                    raise TypeError(
+                        "metadata must be an instance of CLAMMetaData"
+                    )
+                data["metadata"] = value.xml()
+            else:
+                data[key] = value
+        url = self.url + project + "/input/" + filename
+        params = self.initrequest(data)
+        with contextlib.ExitStack() as stack:
+            file = stack.enter_context(open(sourcefile, "rb"))
+            files = [
+                ("file", (filename, file, inputtemplate.formatclass.mimetype))
+            ]
+            if metafile is not None:
+                files.append(
+                    (
+                        "metafile",
+                        (
+                            "." + filename + ".METADATA",
+                            stack.enter_context(open(metafile, "rb")),
+                            "text/xml",
+                        ),
+                    )
+                )
+            if "auth" in params:
+                # A streamed body can not be sent again when authentication challenges the request
+                params["files"] = files
+            else:
+                encoder = MultipartEncoder(
+                    fields=list(params["data"].items()) + files
+                )
+                params["data"] = encoder
+                params["headers"]["Content-Type"] = encoder.content_type
+            response = self.send("POST", url, **params)
+        if response.status_code == 403 and response.text.startswith("<"):
+            return self._parseupload(response.text)
+        self.check_response(response, "POST", url)
+        return self._parseupload(response.text)
+
+    def delete(self, project):
+        """
+        Abort and delete a CLAM project.
+
+        :param project: the CLAM id of the project
+        :return: the response of the CLAM server
+        """
+        with self.lock:
+            self.input_templates = {
+                key: value
+                for key, value in self.input_templates.items()
+                if key[0] != project
+            }
+        return super(PooledCLAMClient, self).delete(project)
+
+
+class CLAMClientPool:
+    """
+    Process-wide pool of PooledCLAMClients, one per Script, hostname and credentials.
+
+    All clients of a hostname share one semaphore, so at most settings.CLAM_MAX_CONNECTIONS_PER_HOST requests
+    (including uploads, downloads and deletes of all processes) are sent to a CLAM server at the same time.
+    """
+
+    def __init__(self):
+        """Initialise the CLAMClientPool."""
+        self.clients = dict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.closed_requests = 0
+        self.slots = dict()
+
+    def get_slots(self, hostname):
+        """
+        Get the semaphore limiting the concurrent requests to a CLAM server.
+
+        Must be called while holding the lock of this pool.
+        :param hostname: the hostname of the CLAM server
+        :return: a threading.BoundedSemaphore with settings.CLAM_MAX_CONNECTIONS_PER_HOST slots
+        """
+        if hostname not in self.slots:
+            self.slots[hostname] = threading.BoundedSemaphore(
+                settings.CLAM_MAX_CONNECTIONS_PER_HOST
+            )
+        return self.slots[hostname]
+
+    @staticmethod
+    def get_key(script):
+        """
+        Get the key of a script in this pool.
+
+        :param script: the Script
+        :return: a tuple of the Script id, hostname and credentials
+        """
+        return script.pk, script.hostname, script.username, script.password
+
+    def get_client(self, script):
+        """
+        Get the CLAM client for a script, create one if it does not exist yet.
+
+        :param script: the Script to get the client for
+        :return: a PooledCLAMClient
+        """
+        key = self.get_key(script)
+        with self.lock:
+            client = self.clients.get(key, None)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            slots = self.get_slots(script.hostname)
+            if script.username != "" and script.password != "":
+                client = PooledCLAMClient(
+                    script.hostname,
+                    script.username,
+                    script.password,
+                    slots=slots,
+                    basicauth=True,
+                )
+            else:
+                client = PooledCLAMClient(script.hostname, slots=slots)
+            self.clients[key] = client
+            return client
+
+    def invalidate(self, script):
+        """
+        Close and remove all clients of a script.
+
+        :param script: the Script to remove the clients of
+        :return: None
+        """
+        with self.lock:
+            for key in [x for x in self.clients.keys() if x[0] == script.pk]:
+                client = self.clients.pop(key)
+                self.closed_requests += client.request_count
+                client.close()
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Close and remove all clients in this pool.
+
+        :return: None
+        """
+        with self.lock:
+            for client in self.clients.values():
+                self.closed_requests += client.request_count
+                client.close()
+            self.clients = dict()
+
+    def statistics(self):
+        """
+        Get usage statistics of this pool.
+
+        :return: a dictionary with the number of clients, client lookups that hit or missed the pool, the hit rate,
+        invalidations and the number of requests sent through the sessions of the clients
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            requests_sent = self.closed_requests + sum(
+                client.request_count for client in self.clients.values()
+            )
+            return {
+                "clients": len(self.clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0,
+                "invalidations": self.invalidations,
+                "requests": requests_sent,
+            }
+
+
+client_pool = CLAMClientPool()
+
+
+class AsyncCLAMClient:
+    """
+    Asynchronous wrapper around a CLAM client.
+
+    Every request is executed in the executor of the AsyncCLAMPool this client belongs to, at most
+    settings.CLAM_MAX_CONNECTIONS_PER_HOST requests are in flight per hostname at the same time. The pool is used for
+    the many small requests of the background cycles (status polling and syncing scripts). Uploads, downloads and
+    deletes of processes are sent from the process itself, they share the per host limit with these requests through
+    the semaphore of the PooledCLAMClients of the host (see CLAMClientPool).
+    """
+
+    def __init__(self, pool, clamclient, hostname):
+        """
+        Initialise the AsyncCLAMClient.
+
+        :param pool: the AsyncCLAMPool this client belongs to
+        :param clamclient: the (blocking) CLAM client to execute requests with
+        :param hostname: the hostname of the CLAM server, used to limit the number of concurrent requests
+        """
+        self.pool = pool
+        self.clamclient = clamclient
+        self.hostname = hostname
+
+    async def call(self, method, *args, **kwargs):
+        """
+        Call a method of the CLAM client without blocking the event loop.
+
+        :param method: the name of the CLAM client method to call
+        :param args: arguments for the method
+        :param kwargs: keyword arguments for the method
+        :return: the return value of the CLAM client method
+        """
+        return await self.run(getattr(self.clamclient, method), *args, **kwargs)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Call a blocking function that sends requests to the CLAM server of this client without blocking the event loop.
+
+        :param function: the function to call
+        :param args: arguments for the function
+        :param kwargs: keyword arguments for the function
+        :return: the return value of the function
+        """
+        async with self.pool.get_semaphore(self.hostname):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.pool.executor,
+                functools.partial(function, *args, **kwargs),
+            )
+
+    async def get(self, project):
+        """
+        Get the status of a CLAM project.
+
+        :param project: the CLAM id of the project
+        :return: the CLAMData of the project
+        """
+        return await self.call("get", project)
+
+
+class AsyncCLAMPool:
+    """
+    Pool of asynchronous CLAM clients sharing one executor and per host concurrency limits.
+
+    Use as a context manager so the executor is shut down afterwards, the requests itself must be awaited from a
+    single event loop (for example through AsyncCLAMPool.run).
+    """
+
+    def __init__(self, max_connections_per_host=None, max_workers=None):
+        """
+        Initialise the AsyncCLAMPool.
+
+        :param max_connections_per_host: the maximum number of concurrent requests per CLAM host, defaults to
+        settings.CLAM_MAX_CONNECTIONS_PER_HOST
+        :param max_workers: the maximum number of concurrent requests in total, defaults to settings.CLAM_MAX_WORKERS
+        """
+        self.max_connections_per_host = (
+            settings.CLAM_MAX_CONNECTIONS_PER_HOST
+            if max_connections_per_host is None
+            else max_connections_per_host
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.CLAM_MAX_WORKERS
+            if max_workers is None
+            else max_workers
+        )
+        self.semaphores = dict()
+        self.clients = dict()
+
+    def __enter__(self):
+        """
+        Enter the context of this pool.
+
+        :return: this pool
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Exit the context of this pool and shut down the executor.
+
+        :return: None
+        """
+        self.executor.shutdown(wait=True)
+
+    def get_semaphore(self, hostname):
+        """
+        Get the semaphore limiting the concurrent requests to a host.
+
+        Semaphores are created lazily so they are bound to the event loop that is running.
+        :param hostname: the hostname of the CLAM server
+        :return: an asyncio.Semaphore
+        """
+        if hostname not in self.semaphores:
+            self.semaphores[hostname] = asyncio.Semaphore(
+                self.max_connections_per_host
+            )
+        return self.semaphores[hostname]
+
+    def get_client(self, script):
+        """
+        Get the asynchronous CLAM client for a script.
+
+        This constructs the CLAM client, so it must be called outside of the event loop.
+        :param script: the Script to get the client for
+        :return: an AsyncCLAMClient for the script
+        """
+        if script.pk not in self.clients:
+            self.clients[script.pk] = AsyncCLAMClient(
+                self, script.get_clam_server(), script.hostname
+            )
+        return self.clients[script.pk]
+
+    def run(self, calls):
+        """
+        Run coroutines concurrently in a new event loop.
+
+        :param calls: a list of coroutines (for example AsyncCLAMClient.get calls)
+        :return: a list of results in the same order as calls, exceptions are returned instead of raised
+        """
+
+        async def gather():
+            return await asyncio.gather(*calls, return_exceptions=True)
+
+        self.semaphores = dict()
+        return asyncio.run(gather())
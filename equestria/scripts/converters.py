@@ -1,5 +1,5 @@
 from django.urls.converters import IntConverter
-from .models import Project, Profile, Process, Script
+from .models import Project, Profile, Process, Script, Batch
 
 
 class ScriptConverter(IntConverter):
@@ -100,3 +100,28 @@ class ProcessConverter(IntConverter):
         :return: the public key of the Process object in string format
         """
         return str(obj.pk)
+
+
+class BatchConverter(IntConverter):
+    """Converter for Batch model."""
+
+    def to_python(self, value):
+        """
+        Cast integer to Batch.
+
+        :param value: the public key of the Batch
+        :return: a Batch or ValueError
+        """
+        try:
+            return Batch.objects.get(id=int(value))
+        except Batch.DoesNotExist:
+            raise ValueError
+
+    def to_url(self, obj):
+        """
+        Cast an object of Batch to a string.
+
+        :param obj: the Batch object
+        :return: the public key of the Batch object in string format
+        """
+        return str(obj.pk)
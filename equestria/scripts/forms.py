@@ -108,6 +108,28 @@ class ProjectCreateForm(forms.Form):
         return pipeline
 
 
+class BatchCreateForm(forms.Form):
+    """Form for batch creation."""
+
+    batch_name = forms.CharField(label="Batch name", required=True)
+    projects = forms.ModelMultipleChoiceField(
+        queryset=Project.objects.none(), widget=forms.CheckboxSelectMultiple,
+    )
+
+    def __init__(self, user, *args, **kwargs):
+        """
+        Initialise method for BatchCreateForm.
+
+        :param user: the user creating the batch, only the projects of this user can be selected
+        :param args: argument
+        :param kwargs: keyword arguments
+        """
+        super(BatchCreateForm, self).__init__(*args, **kwargs)
+        self.fields["projects"].queryset = Project.objects.filter(
+            user=user.id
+        ).order_by("name")
+
+
 class ParameterForm(forms.Form):
     """Form for setting parameters."""
 
@@ -115,7 +137,7 @@ class ParameterForm(forms.Form):
         """
         Initialise the ParameterForm.
 
-        :param parameters: a list of BaseParameter objects including the parameters to add to this form, field types are
+        :param parameters: a list of BaseParameter or ResolvedParameter objects including the parameters to add to this form, field types are
         automatically set for the parameters
         :param args: arguments
         :param kwargs: keyword arguments
@@ -132,14 +154,9 @@ class ParameterForm(forms.Form):
             elif parameter.type == BaseParameter.STRING_TYPE:
                 self.fields[parameter.name] = forms.CharField()
             elif parameter.type == BaseParameter.CHOICE_TYPE:
-                self.fields[parameter.name] = forms.ChoiceField(choices=[])
-                choice_parameter = ChoiceParameter.objects.get(base=parameter)
-                choices = list()
-                for choice in Choice.objects.filter(
-                    corresponding_choice_parameter=choice_parameter
-                ):
-                    choices.append((choice.id, choice.value))
-                self.fields[parameter.name].choices = choices
+                self.fields[parameter.name] = forms.ChoiceField(
+                    choices=parameter.get_choices()
+                )
             elif parameter.type == BaseParameter.TEXT_TYPE:
                 self.fields[parameter.name] = forms.CharField(
                     widget=forms.Textarea
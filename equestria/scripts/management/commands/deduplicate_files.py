@@ -0,0 +1,42 @@
+"""Management command for sharing the input files of all projects through the blob store."""
+import os
+
+from django.core.management.base import BaseCommand
+
+from scripts.models import ProjectFile
+from scripts.services import blob_store
+
+
+class Command(BaseCommand):
+    """Link the input files of all projects to the blob store and remove blobs that are no longer used."""
+
+    help = "Deduplicate the input files of all projects through the blob store"
+
+    def handle(self, *args, **options):
+        """
+        Add the input files in the file manifests of all projects to the blob store and collect unused blobs.
+
+        :param args: arguments
+        :param options: command options
+        :return: None
+        """
+        linked = 0
+        project_files = ProjectFile.objects.filter(
+            role=ProjectFile.INPUT
+        ).select_related("project")
+        for project_file in project_files.iterator():
+            path = os.path.join(project_file.project.folder, project_file.path)
+            try:
+                if ProjectFile.hash_file(path) != project_file.content_hash:
+                    continue
+            except FileNotFoundError:
+                continue
+            if blob_store.add(path, project_file.content_hash):
+                project_file.project.register_file(
+                    project_file.path, content_hash=project_file.content_hash
+                )
+                linked += 1
+        removed = blob_store.collect()
+        self.stdout.write(
+            "Linked {} files, removed {} unused blobs".format(linked, removed)
+        )
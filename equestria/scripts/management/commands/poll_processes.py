@@ -0,0 +1,71 @@
+"""Management command for polling CLAM for the status of running processes."""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from scripts.tasks import (
+    poll_running_processes,
+    schedule_batches,
+    seconds_until_next_poll,
+    update_sharded_processes,
+)
+
+
+class Command(BaseCommand):
+    """Long-lived poller that updates running and sharded processes and schedules the processes of batches."""
+
+    help = (
+        "Poll CLAM for the status of all running processes and schedule batches"
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add arguments to the command.
+
+        :param parser: the argument parser
+        :return: None
+        """
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.CLAM_POLL_INTERVAL,
+            help="Maximum number of seconds to wait between two poll cycles",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run a single poll cycle and exit",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run poll and batch scheduling cycles until interrupted, sleeping until the next process is due.
+
+        :param args: arguments
+        :param options: command options
+        :return: None
+        """
+        while True:
+            close_old_connections()
+            try:
+                poll_running_processes()
+            except Exception as e:
+                logging.error(
+                    "Error while polling running processes: {}".format(e)
+                )
+            try:
+                update_sharded_processes()
+            except Exception as e:
+                logging.error(
+                    "Error while updating sharded processes: {}".format(e)
+                )
+            try:
+                schedule_batches()
+            except Exception as e:
+                logging.error("Error while scheduling batches: {}".format(e))
+            if options["once"]:
+                return
+            time.sleep(seconds_until_next_poll(options["interval"]))
@@ -0,0 +1,60 @@
+"""Management command for syncing the profiles and parameters of scripts with CLAM."""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from scripts.tasks import sync_scripts
+
+
+class Command(BaseCommand):
+    """Long-lived job that periodically syncs all scripts with their CLAM servers."""
+
+    help = "Sync the profiles and parameters of all scripts with CLAM"
+
+    def add_arguments(self, parser):
+        """
+        Add arguments to the command.
+
+        :param parser: the argument parser
+        :return: None
+        """
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.CLAM_SYNC_INTERVAL,
+            help="Number of seconds to wait between two syncs",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single sync and exit",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Apply the CLAM data even if it did not change",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Sync all scripts until interrupted.
+
+        :param args: arguments
+        :param options: command options
+        :return: None
+        """
+        while True:
+            close_old_connections()
+            try:
+                changed, failed = sync_scripts(force=options["force"])
+                logging.info(
+                    "Synced scripts, {} changed and {} failed".format(
+                        len(changed), len(failed)
+                    )
+                )
+            except Exception as e:
+                logging.error("Error while syncing scripts: {}".format(e))
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
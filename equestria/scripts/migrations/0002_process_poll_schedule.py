@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='next_poll',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='poll_interval',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0002_process_poll_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='download_offset',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
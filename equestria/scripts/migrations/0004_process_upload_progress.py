@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0003_process_download_offset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='upload_bytes_done',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='upload_bytes_total',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='upload_files_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='upload_files_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
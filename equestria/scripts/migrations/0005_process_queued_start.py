@@ -0,0 +1,34 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0004_process_upload_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='error_message',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='parameter_values',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='profile',
+            field=models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scripts.Profile'),
+        ),
+        migrations.AlterField(
+            model_name='process',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'Created'), (1, 'Uploading files to CLAM'), (2, 'Running'), (3, 'Waiting for download from CLAM'), (4, 'Downloading files from CLAM'), (5, 'Finished'), (6, 'Queued for starting'), (-1, 'Error'), (-2, 'Error while downloading files from CLAM')], default=0),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:42
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def remove_duplicate_log_messages(apps, schema_editor):
+    """Remove duplicate log messages and set the high-water mark of every process."""
+    LogMessage = apps.get_model("scripts", "LogMessage")
+    Process = apps.get_model("scripts", "Process")
+    duplicates = (
+        LogMessage.objects.values("process", "index")
+        .annotate(first=Min("id"), count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        LogMessage.objects.filter(
+            process=duplicate["process"], index=duplicate["index"]
+        ).exclude(id=duplicate["first"]).delete()
+    for process in LogMessage.objects.values("process").annotate(
+        last=Max("index")
+    ):
+        Process.objects.filter(id=process["process"]).update(
+            log_high_water=process["last"] + 1
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0005_process_queued_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='log_high_water',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            remove_duplicate_log_messages, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='logmessage',
+            constraint=models.UniqueConstraint(fields=('process', 'index'), name='unique_process_log_index'),
+        ),
+    ]
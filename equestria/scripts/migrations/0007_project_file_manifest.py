@@ -0,0 +1,84 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:49
+
+import datetime
+import hashlib
+import os
+
+import pytz
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def hash_file(full_path):
+    """Compute the SHA-256 hash of a file."""
+    content_hash = hashlib.sha256()
+    with open(full_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def create_file_manifests(apps, schema_editor):
+    """Register the files of all existing projects in the file manifest."""
+    Project = apps.get_model("scripts", "Project")
+    ProjectFile = apps.get_model("scripts", "ProjectFile")
+    for project in Project.objects.all():
+        if not os.path.isdir(project.folder):
+            continue
+        archive = os.path.basename(project.folder) + ".zip"
+        for directory, folders, files in os.walk(project.folder):
+            if directory == project.folder and "extract" in folders:
+                folders.remove("extract")
+            for file in files:
+                full_path = os.path.join(directory, file)
+                path = os.path.relpath(full_path, project.folder)
+                if path == archive:
+                    continue
+                if path.split(os.sep)[0] == "output":
+                    role = "output"
+                elif path.endswith(".oov.dict"):
+                    role = "dictionary"
+                else:
+                    role = "input"
+                stat = os.stat(full_path)
+                ProjectFile.objects.create(
+                    project=project,
+                    path=path,
+                    size=stat.st_size,
+                    extension=file.lstrip(".").partition(".")[2],
+                    content_hash=hash_file(full_path),
+                    role=role,
+                    modified=datetime.datetime.fromtimestamp(
+                        stat.st_mtime, tz=pytz.utc
+                    ),
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0006_log_high_water'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('extension', models.CharField(db_index=True, max_length=64)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('role', models.CharField(choices=[('input', 'Input'), ('output', 'Output'), ('dictionary', 'Dictionary')], max_length=16)),
+                ('modified', models.DateTimeField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='scripts.Project')),
+            ],
+            options={
+                'verbose_name': 'Project file',
+                'verbose_name_plural': 'Project files',
+                'ordering': ['path'],
+                'unique_together': {('project', 'path')},
+            },
+        ),
+        migrations.RunPython(create_file_manifests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:52
+
+import os
+
+from django.db import migrations, models
+
+
+def finished_fa(project):
+    """Check whether a non empty .ctm file is present in the output folder of a project."""
+    output_folder = os.path.join(project.folder, "output")
+    if not os.path.isdir(output_folder):
+        return False
+    for file_name in os.listdir(output_folder):
+        full_file_path = os.path.join(output_folder, file_name)
+        if file_name.endswith("ctm") and os.path.isfile(full_file_path):
+            if os.stat(full_file_path).st_size != 0:
+                return True
+    return False
+
+
+def set_project_states(apps, schema_editor):
+    """Store the state of all existing projects."""
+    Project = apps.get_model("scripts", "Project")
+    for project in Project.objects.select_related(
+        "current_process", "pipeline"
+    ):
+        if project.current_process is None:
+            state = 3 if finished_fa(project) else 0
+        elif project.current_process.script_id == project.pipeline.fa_script_id:
+            state = 1
+        elif project.current_process.script_id == project.pipeline.g2p_script_id:
+            state = 2
+        else:
+            continue
+        Project.objects.filter(pk=project.pk).update(state=state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0007_project_file_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='state',
+            field=models.IntegerField(choices=[(0, 'Uploading'), (1, 'FA running'), (2, 'G2P running'), (3, 'Check dictionary')], default=0),
+        ),
+        migrations.RunPython(set_project_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0008_project_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='script',
+            name='parameters_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0009_script_parameters_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='script',
+            name='clam_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='script',
+            name='last_sync_duration',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='script',
+            name='last_synced',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0010_script_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='result_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scripts', '0011_process_result_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Batch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=512)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, default=None, null=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Batches',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BatchProject',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.IntegerField(choices=[(0, 'Forced alignment'), (1, 'G2P'), (2, 'Forced alignment with dictionary'), (3, 'Done'), (4, 'Failed')], db_index=True, default=0)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('started', models.DateTimeField(blank=True, default=None, null=True)),
+                ('finished', models.DateTimeField(blank=True, default=None, null=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='scripts.Batch')),
+                ('process', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scripts.Process')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_entries', to='scripts.Project')),
+            ],
+            options={
+                'verbose_name': 'Batch project',
+                'verbose_name_plural': 'Batch projects',
+                'ordering': ['batch', 'id'],
+                'unique_together': {('batch', 'project')},
+            },
+        ),
+    ]
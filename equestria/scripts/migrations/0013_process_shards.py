@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0012_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='parent',
+            field=models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='scripts.Process'),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='shard_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='process',
+            name='shard_files',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
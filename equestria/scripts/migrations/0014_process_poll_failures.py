@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scripts', '0013_process_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='process',
+            name='poll_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -2,7 +2,7 @@
 import shutil
 
 import pytz
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db.models import *
 import clam.common.client
 import clam.common.data
@@ -13,10 +13,36 @@ import logging
 from django.conf import settings
 import os
 import secrets
+import json
+import hashlib
+import tempfile
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction, connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+import time
 import zipfile
-from .services import zip_dir
-from .tasks import update_script
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .clam_client import client_pool, call_with_retries, get_clam_metadata
+from .services import (
+    zip_files,
+    StreamingZipExtractor,
+    ProfileMatcher,
+    has_extension,
+    get_file_index,
+    get_extension,
+    invalidate_file_index,
+    archive_cache,
+    blob_store,
+    result_cache,
+    iter_zip,
+    FilteredZipExtractor,
+    split_into_shards,
+    append_file,
+)
+from .tasks import start_process, get_next_script
 
 # Create your models here.
 
@@ -26,6 +52,7 @@ STATUS_RUNNING = 2
 STATUS_WAITING = 3
 STATUS_DOWNLOADING = 4
 STATUS_FINISHED = 5
+STATUS_QUEUED = 6
 STATUS_ERROR = -1
 STATUS_ERROR_DOWNLOAD = -2
 
@@ -36,10 +63,21 @@ STATUS = (
     (STATUS_WAITING, "Waiting for download from CLAM"),
     (STATUS_DOWNLOADING, "Downloading files from CLAM"),
     (STATUS_FINISHED, "Finished"),
+    (STATUS_QUEUED, "Queued for starting"),
     (STATUS_ERROR, "Error"),
     (STATUS_ERROR_DOWNLOAD, "Error while downloading files from CLAM"),
 )
 
+# Statuses of processes that occupy a CLAM host
+IN_FLIGHT_STATUSES = (
+    STATUS_QUEUED,
+    STATUS_CREATED,
+    STATUS_UPLOADING,
+    STATUS_RUNNING,
+    STATUS_WAITING,
+    STATUS_DOWNLOADING,
+)
+
 User = get_user_model()
 
 
@@ -54,6 +92,44 @@ def user_data_folder_path():
     return settings.USER_DATA_FOLDER
 
 
+def bulk_create_with_ids(model, objects, key=None):
+    """
+    Create objects in bulk and set their ids.
+
+    Database backends that return the ids of objects created in bulk (such as PostgreSQL) set the ids directly, on
+    other backends the ids are looked up by the natural key of the objects. Objects without a natural key are saved
+    one by one on those backends.
+    :param model: the model class of the objects
+    :param objects: a list of unsaved objects of the model
+    :param key: a tuple of field attribute names that identify an object uniquely, None if the objects do not have a
+    natural key
+    :return: the list of objects with their ids set
+    """
+    if len(objects) == 0:
+        return objects
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+    if key is None:
+        for obj in objects:
+            obj.save()
+        return objects
+    model.objects.bulk_create(objects)
+    ids = {
+        tuple(row[1:]): row[0]
+        for row in model.objects.filter(
+            **{
+                "{}__in".format(field): set(
+                    getattr(obj, field) for obj in objects
+                )
+                for field in key
+            }
+        ).values_list("pk", *key)
+    }
+    for obj in objects:
+        obj.pk = ids[tuple(getattr(obj, field) for field in key)]
+    return objects
+
+
 class Script(Model):
     """
     Database model for scripts.
@@ -79,21 +155,33 @@ class Script(Model):
     username = CharField(max_length=200, blank=True)
     password = CharField(max_length=200, blank=True)
 
+    parameters_version = PositiveIntegerField(default=0, editable=False)
+
+    clam_fingerprint = CharField(max_length=64, blank=True, editable=False)
+    last_synced = DateTimeField(null=True, blank=True, editable=False)
+    last_sync_duration = FloatField(null=True, blank=True, editable=False)
+
+    # Fields that are only written with queryset updates, saving a script never overwrites them
+    UPDATED_FIELDS = [
+        "parameters_version",
+        "clam_fingerprint",
+        "last_synced",
+        "last_sync_duration",
+    ]
+
     def refresh(self):
         """
-        Save function to load profile data from CLAM.
+        Load the profile and parameter data from CLAM and apply it, even if CLAM did not change it.
 
-        :param args: arguments
-        :param kwargs: keyword arguments
-        :return: super(Script, self).save()
+        :return: None, raises a ValidationError if CLAM can not be reached
         """
         # First contact CLAM to get the profile data
-        random_token = Process.get_random_clam_id()
+        client_pool.invalidate(self)
+        start = time.monotonic()
         try:
-            clamclient = self.get_clam_server()
-            clamclient.create(random_token)
-            data = clamclient.get(random_token)
-            clamclient.delete(random_token)
+            data = get_clam_metadata(
+                self.get_clam_server(), Process.get_random_clam_id()
+            )
         except Exception as e:
             # If CLAM can't be reached, the credentials are most likely not valid
             raise ValidationError(
@@ -101,25 +189,153 @@ class Script(Model):
                 " password?"
             )
 
-        # Remove the profiles that are now associated with this Script
-        self.remove_corresponding_profiles()
+        self.sync(data, time.monotonic() - start, force=True)
 
-        default_values = dict()
-        for parameter in BaseParameter.objects.filter(
-            corresponding_script=self
+    @staticmethod
+    def get_clam_fingerprint(clam_data):
+        """
+        Get a fingerprint of the profiles and parameters in CLAM data.
+
+        :param clam_data: the CLAM data
+        :return: a SHA-256 hex digest of the profiles and parameters elements of the CLAM XML
+        """
+        fingerprint = hashlib.sha256()
+        root = ET.fromstring(clam_data.xml)
+        for tag in ["profiles", "parameters"]:
+            for element in root.findall(tag):
+                fingerprint.update(ET.tostring(element))
+        return fingerprint.hexdigest()
+
+    def sync(self, clam_data, fetch_duration=0, force=False):
+        """
+        Apply CLAM data to this script if its profiles or parameters changed since the last sync.
+
+        Only the differences with the current profiles and parameters are applied, unchanged rows (and their presets)
+        are left alone.
+        :param clam_data: the CLAM data with the profiles and parameters of this script
+        :param fetch_duration: the number of seconds it took to fetch the CLAM data
+        :param force: whether to apply the CLAM data even if its fingerprint did not change
+        :return: True if the CLAM data was applied, False otherwise
+        """
+        start = time.monotonic()
+        fingerprint = Script.get_clam_fingerprint(clam_data)
+        changed = force or fingerprint != self.clam_fingerprint
+        if changed:
+            with transaction.atomic():
+                self.update_parameters_from_clam_data(clam_data)
+                self.update_profiles_from_clam_data(clam_data.profiles)
+            Script.invalidate_parameters(self.pk)
+        Script.objects.filter(pk=self.pk).update(
+            clam_fingerprint=fingerprint,
+            last_synced=timezone.now(),
+            last_sync_duration=fetch_duration + time.monotonic() - start,
+        )
+        self.refresh_from_db(fields=Script.UPDATED_FIELDS)
+        return changed
+
+    def update_parameters_from_clam_data(self, clam_data):
+        """
+        Update the parameters of this script to the parameters in CLAM data.
+
+        Parameters with the same name and type are kept together with their presets, only the choices of choice
+        parameters are updated. Parameters that are not in the CLAM data anymore or changed type are removed and new
+        parameters are created in bulk. The preset of a parameter that changed type is set on the new parameter if it
+        is valid for the new type.
+        :param clam_data: the CLAM data
+        :return: None
+        """
+        clam_parameters = {
+            name: clam_data.parameter(name)
+            for name in clam_data.passparameters().keys()
+        }
+        kept = dict()
+        removed = list()
+        for parameter in (
+            BaseParameter.objects.filter(corresponding_script=self)
+            .select_related(*ResolvedParameter.TYPED_RELATIONS.values())
+            .order_by("id")
         ):
-            default_key = parameter.get_default_value()
-            if default_key is not None:
-                default_values[parameter.name] = parameter.get_default_value()
+            if (
+                parameter.name in kept
+                or parameter.name not in clam_parameters
+                or parameter.type
+                != BaseParameter.get_type(clam_parameters[parameter.name])
+                or not parameter.has_typed_parameter()
+            ):
+                removed.append(parameter)
+            else:
+                kept[parameter.name] = parameter
 
-        self.remove_corresponding_parameters()
+        default_values = dict()
+        for parameter in removed:
+            if (
+                parameter.name in clam_parameters
+                and parameter.name not in kept
+                and parameter.name not in default_values
+            ):
+                default_value = parameter.get_default_value()
+                if default_value is not None:
+                    default_values[parameter.name] = default_value
+
+        BaseParameter.remove_parameters(removed)
+        self.update_choices_from_clam_data(
+            [
+                (parameter.choiceparameter, clam_parameters[name])
+                for name, parameter in kept.items()
+                if parameter.type == BaseParameter.CHOICE_TYPE
+            ]
+        )
         self.generate_parameters_from_clam_data(
-            data.passparameters().keys(), data, default_values
+            [name for name in clam_parameters.keys() if name not in kept],
+            clam_data,
+            default_values,
         )
 
-        # Create new profiles associated with this script
-        for profile in data.profiles:
-            self.create_templates_from_data(profile.input)
+    @staticmethod
+    def update_choices_from_clam_data(choice_parameters):
+        """
+        Update the choices of choice parameters to the choices in CLAM data.
+
+        Missing choices are created in bulk and choices that are not in the CLAM data anymore are removed, a preset
+        on a removed choice is removed as well.
+        :param choice_parameters: a list of (ChoiceParameter, CLAM choice parameter) tuples
+        :return: None
+        """
+        if len(choice_parameters) == 0:
+            return
+        current = dict()
+        for choice_id, parameter_id, value in Choice.objects.filter(
+            corresponding_choice_parameter__in=[x for x, _ in choice_parameters]
+        ).values_list("id", "corresponding_choice_parameter_id", "value"):
+            current.setdefault(parameter_id, dict()).setdefault(
+                value, choice_id
+            )
+
+        new_choices = list()
+        kept_ids = list()
+        for choice_parameter, clam_parameter in choice_parameters:
+            values = current.get(choice_parameter.pk, dict())
+            for _, value in clam_parameter.choices:
+                if value in values:
+                    kept_ids.append(values[value])
+                else:
+                    new_choices.append(
+                        Choice(
+                            corresponding_choice_parameter=choice_parameter,
+                            value=value,
+                        )
+                    )
+        removed = Choice.objects.filter(
+            corresponding_choice_parameter__in=[x for x, _ in choice_parameters]
+        ).exclude(pk__in=kept_ids)
+        if removed.exists():
+            removed.delete()
+            BaseParameter.objects.filter(
+                choiceparameter__in=[x for x, _ in choice_parameters],
+                choiceparameter__value__isnull=True,
+                preset=True,
+            ).update(preset=False)
+        Choice.objects.bulk_create(new_choices)
 
     def generate_parameters_from_clam_data(
         self, parameter_names, clam_data, default_values
@@ -127,38 +343,59 @@ class Script(Model):
         """
         Generate parameter objects from CLAM data and set default values for these objects.
 
+        The parameters, typed parameters and choices are created in bulk.
         :param parameter_names: the names of the parameters to generate
         :param clam_data: the CLAM data
         :param default_values: a dictionary of (parameter_name, parameter_value) pairs with default values
         :return: None
         """
-        for parameter_name in parameter_names:
-            parameter = clam_data.parameter(parameter_name)
-            type = BaseParameter.get_type(parameter)
-            base_parameter = BaseParameter.objects.create(
-                name=parameter_name, corresponding_script=self, type=type
+        clam_parameters = [clam_data.parameter(x) for x in parameter_names]
+        base_parameters = bulk_create_with_ids(
+            BaseParameter,
+            [
+                BaseParameter(
+                    name=name,
+                    corresponding_script=self,
+                    type=BaseParameter.get_type(parameter),
+                )
+                for name, parameter in zip(parameter_names, clam_parameters)
+            ],
+            ("corresponding_script_id", "name"),
+        )
+
+        typed_parameters = dict()
+        for base_parameter in base_parameters:
+            typed_parameters[
+                base_parameter.name
+            ] = BaseParameter.get_typed_model(base_parameter.type)(
+                base=base_parameter
             )
-            if type == BaseParameter.BOOLEAN_TYPE:
-                param = BooleanParameter.objects.create(base=base_parameter)
-            elif type == BaseParameter.STATIC_TYPE:
-                param = StaticParameter.objects.create(base=base_parameter)
-            elif type == BaseParameter.STRING_TYPE:
-                param = StringParameter.objects.create(base=base_parameter)
-            elif type == BaseParameter.CHOICE_TYPE:
-                param = ChoiceParameter.objects.create(base=base_parameter)
-                choices = [x for _, x in parameter.choices]
-                Choice.add_choices(choices, param)
-            elif type == BaseParameter.TEXT_TYPE:
-                param = TextParameter.objects.create(base=base_parameter)
-            elif type == BaseParameter.INTEGER_TYPE:
-                param = IntegerParameter.objects.create(base=base_parameter)
-            elif type == BaseParameter.FLOAT_TYPE:
-                param = FloatParameter.objects.create(base=base_parameter)
+        for model in set(x.__class__ for x in typed_parameters.values()):
+            objects = [
+                x for x in typed_parameters.values() if isinstance(x, model)
+            ]
+            if model == ChoiceParameter:
+                bulk_create_with_ids(model, objects, ("base_id",))
             else:
-                param = None
+                model.objects.bulk_create(objects)
 
-            if parameter_name in default_values.keys() and param is not None:
-                param.set_preset(default_values[parameter_name])
+        Choice.objects.bulk_create(
+            [
+                Choice(
+                    corresponding_choice_parameter=typed_parameters[name],
+                    value=value,
+                )
+                for name, parameter in zip(parameter_names, clam_parameters)
+                if isinstance(typed_parameters[name], ChoiceParameter)
+                for _, value in parameter.choices
+            ]
+        )
+
+        for base_parameter in base_parameters:
+            if base_parameter.name in default_values.keys():
+                base_parameter.get_typed_parameter().set_preset(
+                    default_values[base_parameter.name]
+                )
 
     def get_parameters(self):
         """
@@ -168,13 +405,52 @@ class Script(Model):
         """
         return BaseParameter.objects.filter(corresponding_script=self)
 
+    def get_parameters_cache_key(self):
+        """
+        Get the cache key of the resolved parameters of this script.
+
+        :return: a cache key including the parameters version of this script
+        """
+        return "scripts.parameters.{}.{}".format(
+            self.pk, self.parameters_version
+        )
+
+    def get_resolved_parameters(self):
+        """
+        Get a snapshot of all parameters of this script with their types, presets and choices.
+
+        The snapshot is loaded with two queries and cached until the parameters of this script change.
+        :return: a list of ResolvedParameter objects
+        """
+        key = self.get_parameters_cache_key()
+        parameters = cache.get(key)
+        if parameters is None:
+            parameters = ResolvedParameter.load(self)
+            cache.set(key, parameters, settings.PARAMETER_CACHE_TIMEOUT)
+        return parameters
+
+    @staticmethod
+    def invalidate_parameters(script_id):
+        """
+        Invalidate the cached resolved parameters of a script.
+
+        The parameters version of the script is increased, so the cached snapshot is not used by any process anymore.
+        :param script_id: the id of the script
+        :return: None
+        """
+        if script_id is None:
+            return
+        Script.objects.filter(pk=script_id).update(
+            parameters_version=F("parameters_version") + 1
+        )
+
     def get_variable_parameters(self):
         """
         Get a list of all parameters without a preset.
 
-        :return: a list of BaseParameter objects without a preset
+        :return: a list of ResolvedParameter objects without a preset
         """
-        parameters = self.get_parameters()
+        parameters = self.get_resolved_parameters()
         variable_parameters = list()
         for parameter in parameters:
             if parameter.get_default_value() is None:
@@ -188,7 +464,7 @@ class Script(Model):
 
         :return: a dictionary of (parameter_name, parameter_value) pairs for all default parameters with a preset
         """
-        parameters = self.get_parameters()
+        parameters = self.get_resolved_parameters()
         values = dict()
         for parameter in parameters:
             value = parameter.get_default_value()
@@ -206,17 +482,17 @@ class Script(Model):
         :return: a dictionary of (parameter_name, parameter_value) pairs of parameters that have valid values and exist
         for this script
         """
+        parameters = {
+            parameter.name: parameter
+            for parameter in self.get_resolved_parameters()
+        }
         variable_dict = dict()
         for parameter_name, parameter_value in parameter_dict.items():
-            try:
-                parameter = BaseParameter.objects.get(
-                    name=parameter_name, corresponding_script=self
-                )
+            parameter = parameters.get(parameter_name)
+            if parameter is not None:
                 value = parameter.get_corresponding_value(parameter_value)
                 if value is not None:
                     variable_dict[parameter_name] = value
-            except BaseParameter.DoesNotExist:
-                pass
         return variable_dict
 
     def get_parameters_as_dict(self, preset_parameters=None):
@@ -246,7 +522,7 @@ class Script(Model):
         :param parameter_names: a list of satisfied parameter names
         :return: a list of parameters without their names being in parameter_names
         """
-        parameters = self.get_parameters()
+        parameters = self.get_resolved_parameters()
         not_satisfied = list()
         for parameter in parameters:
             if parameter.name not in parameter_names:
@@ -261,19 +537,86 @@ class Script(Model):
         :param input_templates: a list of CLAM input template objects
         :return: None
         """
-        new_profile = Profile.objects.create(script=self)
-        for input_template in input_templates:
-            InputTemplate.objects.create(
-                template_id=input_template.id,
-                format=input_template.formatclass,
-                label=input_template.label,
-                extension=input_template.extension,
-                optional=input_template.optional,
-                unique=input_template.unique,
-                accept_archive=input_template.acceptarchive,
-                corresponding_profile=new_profile,
+        self.create_profiles_from_data([input_templates])
+
+    def create_profiles_from_data(self, profiles):
+        """
+        Create Profile and InputTemplate objects from CLAM profile data in bulk.
+
+        :param profiles: a list of lists of CLAM input template objects, one list per profile
+        :return: None
+        """
+        new_profiles = bulk_create_with_ids(
+            Profile, [Profile(script=self) for _ in profiles]
+        )
+        InputTemplate.objects.bulk_create(
+            [
+                InputTemplate(
+                    corresponding_profile=profile,
+                    **InputTemplate.get_fields_from_data(input_template),
+                )
+                for profile, input_templates in zip(new_profiles, profiles)
+                for input_template in input_templates
+            ]
+        )
+
+    def update_profiles_from_clam_data(self, clam_profiles):
+        """
+        Update the profiles of this script to the profiles in CLAM data.
+
+        Profiles are matched on the ids of their input templates. Matched profiles are kept and their templates are
+        updated in bulk if CLAM changed them, the other profiles are removed and new profiles are created in bulk.
+        :param clam_profiles: a list of CLAM profile objects
+        :return: None
+        """
+        templates = dict()
+        for template in InputTemplate.objects.filter(
+            corresponding_profile__script=self
+        ).order_by("id"):
+            templates.setdefault(
+                template.corresponding_profile_id, list()
+            ).append(template)
+        current = dict()
+        for profile_id in (
+            Profile.objects.filter(script=self)
+            .order_by("id")
+            .values_list("id", flat=True)
+        ):
+            profile_templates = templates.get(profile_id, list())
+            key = tuple(x.template_id for x in profile_templates)
+            current.setdefault(key, list()).append(
+                (profile_id, profile_templates)
             )
 
+        changed = list()
+        new_profiles = list()
+        for clam_profile in clam_profiles:
+            key = tuple(x.id for x in clam_profile.input)
+            if len(current.get(key, list())) == 0:
+                new_profiles.append(clam_profile.input)
+                continue
+            _, profile_templates = current[key].pop(0)
+            for template, input_template in zip(
+                profile_templates, clam_profile.input
+            ):
+                fields = InputTemplate.get_fields_from_data(input_template)
+                if any(getattr(template, x) != y for x, y in fields.items()):
+                    for field, value in fields.items():
+                        setattr(template, field, value)
+                    changed.append(template)
+
+        Profile.remove_profiles(
+            [
+                profile_id
+                for profiles in current.values()
+                for profile_id, _ in profiles
+            ]
+        )
+        InputTemplate.objects.bulk_update(
+            changed, InputTemplate.DATA_FIELDS.keys()
+        )
+        self.create_profiles_from_data(new_profiles)
+
     def __str__(self):
         """Use name of script in admin display."""
         return self.name
@@ -284,10 +627,9 @@ class Script(Model):
 
         :return: None
         """
-        profiles = Profile.objects.filter(script=self)
-        for profile in profiles:
-            profile.remove_corresponding_templates()
-            profile.delete()
+        Profile.remove_profiles(
+            Profile.objects.filter(script=self).values_list("id", flat=True)
+        )
 
     def remove_corresponding_parameters(self):
         """
@@ -295,38 +637,76 @@ class Script(Model):
 
         :return: None
         """
-        parameters = BaseParameter.objects.filter(corresponding_script=self)
-        for parameter in parameters:
-            parameter.remove_corresponding_presets()
-            parameter.delete()
+        BaseParameter.remove_parameters(
+            BaseParameter.objects.filter(corresponding_script=self)
+        )
 
     def get_clam_server(self):
         """
         Get a CLAM server for handling this script.
 
+        Clients are shared process-wide and keep their HTTP connections alive, see clam_client.client_pool.
         :return: a CLAMClient
         """
-        if self.username != "" and self.password != "":
-            return clam.common.client.CLAMClient(
-                self.hostname, self.username, self.password, basicauth=True
-            )
-        else:
-            return clam.common.client.CLAMClient(self.hostname)
+        return client_pool.get_client(self)
+
+    def save(self, *args, **kwargs):
+        """
+        Save this script and invalidate its pooled CLAM clients.
+
+        :param args: arguments
+        :param kwargs: keyword arguments
+        :return: None
+        """
+        adding = self._state.adding
+        if (
+            not adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            # Never write back a parameters version or sync state read before they changed
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in Script.UPDATED_FIELDS
+            ]
+        super(Script, self).save(*args, **kwargs)
+        if adding:
+            # A reused primary key must not pick up the parameters of a deleted script
+            cache.delete(self.get_parameters_cache_key())
+        client_pool.invalidate(self)
 
     def get_valid_profiles(self, folder):
         """
         Get the profiles for which the current files meet the requirements.
 
         :param folder: the folder to check for files
-        :return:
+        :return: a list of valid profiles
         """
-        profiles = Profile.objects.filter(script=self)
-        valid_profiles = []
+        return [
+            profile
+            for profile, _ in self.match_profiles(
+                get_file_index(folder).names()
+            )
+        ]
 
-        for p in profiles:
-            if p.is_valid(folder):
-                valid_profiles.append(p)
-        return valid_profiles
+    def match_profiles(self, file_names):
+        """
+        Match files against all profiles of this script in a single pass.
+
+        The profiles and input templates of this script are loaded in one query each.
+        :param file_names: a list of file names
+        :return: a list of tuples (profile, assignment) for every valid profile, in which assignment is a dictionary
+        of the template ids of the profile to the file names assigned to them
+        """
+        matcher = ProfileMatcher(
+            list(Profile.objects.filter(script=self)),
+            list(
+                InputTemplate.objects.filter(corresponding_profile__script=self)
+            ),
+        )
+        return matcher.match(file_names)
 
     class Meta:
         """
@@ -349,6 +729,18 @@ class Process(Model):
                                       Used for identification only, can be anything.
         clam_id                       Identification number given by CLAM.
         output_path                   Path to the primary output file (e.g. output/error.log)
+        profile                       Profile to start the process with when it is queued.
+        parameter_values              JSON encoded parameter values to start the process with when it is queued.
+        error_message                 Message describing why starting the process failed.
+        log_high_water                Number of CLAM log messages of this process that are stored.
+        poll_failures                 Number of consecutive status requests for this process that failed.
+        result_key                    Key of the outputs of this process in the result cache, empty if they are not
+                                      cached.
+        parent                        The process this process runs a shard of, None if it is not a shard.
+        shard_count                   Number of shards the input files of this process are split into, each shard runs
+                                      as its own CLAM project. 1 if the input files are not split.
+        shard_files                   JSON encoded list of the input files of this shard, empty if this process is not
+                                      a shard.
     """
 
     script = ForeignKey(Script, on_delete=SET_NULL, blank=False, null=True)
@@ -357,6 +749,31 @@ class Process(Model):
     folder = FilePathField(
         allow_folders=True, allow_files=False, path=user_data_folder_path
     )
+    next_poll = DateTimeField(null=True, blank=True, default=None)
+    poll_interval = FloatField(default=0)
+    poll_failures = PositiveIntegerField(default=0)
+    download_offset = BigIntegerField(default=0)
+    upload_files_total = PositiveIntegerField(default=0)
+    upload_files_done = PositiveIntegerField(default=0)
+    upload_bytes_total = BigIntegerField(default=0)
+    upload_bytes_done = BigIntegerField(default=0)
+    log_high_water = PositiveIntegerField(default=0)
+    profile = ForeignKey(
+        "Profile", on_delete=SET_NULL, null=True, blank=True, default=None
+    )
+    parameter_values = TextField(blank=True, default="")
+    error_message = TextField(blank=True, default="")
+    result_key = CharField(max_length=64, blank=True, default="")
+    parent = ForeignKey(
+        "self",
+        on_delete=CASCADE,
+        null=True,
+        blank=True,
+        default=None,
+        related_name="shards",
+    )
+    shard_count = PositiveIntegerField(default=1)
+    shard_files = TextField(blank=True, default="")
 
     def __str__(self):
         """Convert this object to string."""
@@ -375,28 +792,95 @@ class Process(Model):
         """
         Update the log messages of this process from the CLAM xml data.
 
+        Only the log messages after the high-water mark of this process are parsed, they are inserted in bulk and the
+        high-water mark is moved past them. The new log messages of a shard are added to the log of its parent as well.
         :param xml_data: the XML data send by CLAM including a <status> tag with an arbitrary amount of <log> tags
-        :return: None
+        :return: the number of log messages that were new for this process
         """
         try:
             # The clamclient does not have a way to retrieve the log messages so we will do it ourselves.
             xml = ET.fromstring(xml_data)
-            for index, item in enumerate(
-                reversed(list(xml.find("status").iter("log")))
-            ):
-                time = Process.parse_time_string(item.attrib["time"])
-                if not LogMessage.objects.filter(
-                    time=time, message=item.text, process=self, index=index
-                ).exists():
-                    LogMessage.objects.create(
-                        time=time, message=item.text, process=self, index=index
-                    )
+            # CLAM sends the newest log message first.
+            items = list(xml.find("status").iter("log"))
+            new_items = items[: max(0, len(items) - self.log_high_water)]
+            if len(new_items) == 0:
+                return 0
+            messages = [
+                LogMessage(
+                    time=Process.parse_time_string(item.attrib["time"]),
+                    message=item.text,
+                    process=self,
+                    index=len(items) - 1 - position,
+                )
+                for position, item in enumerate(new_items)
+            ]
+            with transaction.atomic():
+                LogMessage.objects.bulk_create(
+                    reversed(messages), ignore_conflicts=True
+                )
+                Process.objects.filter(pk=self.pk).update(
+                    log_high_water=len(items)
+                )
+                if self.parent_id is not None:
+                    self.add_log_messages_to_parent(list(reversed(messages)))
+            self.log_high_water = len(items)
+            return len(messages)
         except Exception as e:
             logging.error(
                 "Failed to parse XML response from CLAM server. Error: {}".format(
                     e
                 )
             )
+            return 0
+
+    def add_log_messages_to_parent(self, messages):
+        """
+        Add log messages of this shard to the log of its parent process.
+
+        The messages are appended after the log of the parent and prefixed with the number of this shard. Must be
+        called inside a transaction.
+        :param messages: the new LogMessage objects of this shard, oldest first
+        :return: None
+        """
+        Process.objects.filter(pk=self.parent_id).update(
+            log_high_water=F("log_high_water") + len(messages)
+        )
+        end = Process.objects.values_list("log_high_water", flat=True).get(
+            pk=self.parent_id
+        )
+        number = (
+            Process.objects.filter(
+                parent_id=self.parent_id, id__lt=self.id
+            ).count()
+            + 1
+        )
+        LogMessage.objects.bulk_create(
+            [
+                LogMessage(
+                    time=message.time,
+                    message="Shard {} of {}: {}".format(
+                        number, self.parent.shard_count, message.message
+                    ),
+                    process_id=self.parent_id,
+                    index=end - len(messages) + position,
+                )
+                for position, message in enumerate(messages)
+            ],
+            ignore_conflicts=True,
+        )
+
+    def reset_log_messages(self):
+        """
+        Remove the log messages of this process and reset its high-water mark.
+
+        A new CLAM run numbers its log messages from 0 again, so the log messages of a previous run are removed before
+        this process is run again.
+        :return: None
+        """
+        with transaction.atomic():
+            LogMessage.objects.filter(process=self).delete()
+            Process.objects.filter(pk=self.pk).update(log_high_water=0)
+        self.log_high_water = 0
 
     @staticmethod
     def parse_time_string(time):
@@ -419,10 +903,24 @@ class Process(Model):
         """
         Get an absolute path to the output folder.
 
+        Shards download their outputs to a folder of their own, the outputs are merged in the output folder of their
+        parent when all shards are finished.
         :return: the absolute path to the output folder
         """
+        if self.parent_id is not None:
+            return os.path.join(
+                self.folder, Project.SHARDS_FOLDER, str(self.id)
+            )
         return os.path.join(self.folder, Project.OUTPUT_FOLDER)
 
+    def is_sharded(self):
+        """
+        Check whether the input files of this process are split over multiple shards.
+
+        :return: True if this process runs its inputs as multiple CLAM projects, False otherwise
+        """
+        return self.shard_count > 1
+
     def set_status(self, status):
         """
         Set the status for this process and save it to the Database.
@@ -433,14 +931,67 @@ class Process(Model):
         self.status = status
         self.save()
 
+    def schedule_next_poll(self, reset=False):
+        """
+        Set the time at which CLAM should be polled again for this process (does not save to the Database).
+
+        The polling interval starts at settings.CLAM_POLL_MIN_INTERVAL and is multiplied by
+        settings.CLAM_POLL_BACKOFF_FACTOR after every poll without activity, up to settings.CLAM_POLL_MAX_INTERVAL.
+        :param reset: whether to snap back to the minimal polling interval, for example because CLAM reported activity
+        :return: None
+        """
+        if reset or self.poll_interval <= 0:
+            self.poll_interval = settings.CLAM_POLL_MIN_INTERVAL
+        else:
+            self.poll_interval = min(
+                self.poll_interval * settings.CLAM_POLL_BACKOFF_FACTOR,
+                settings.CLAM_POLL_MAX_INTERVAL,
+            )
+        self.next_poll = timezone.now() + datetime.timedelta(
+            seconds=self.poll_interval
+        )
+
+    def register_poll_failure(self, permanent=False):
+        """
+        Count a failed status request for this process (does not save to the Database).
+
+        Failed requests are retried with the backoff of schedule_next_poll until settings.CLAM_POLL_MAX_FAILURES
+        consecutive requests failed.
+        :param permanent: whether the failure can not be resolved by retrying, for example because the project does not
+        exist on CLAM anymore
+        :return: True if this process should fail, False if it is polled again later
+        """
+        self.poll_failures += 1
+        if permanent or self.poll_failures >= settings.CLAM_POLL_MAX_FAILURES:
+            return True
+        self.schedule_next_poll()
+        return False
+
+    @staticmethod
+    def is_near_completion(clam_data):
+        """
+        Check whether CLAM reports that a process is almost done.
+
+        :param clam_data: the CLAM data returned by a status request
+        :return: True if the completion percentage reported by CLAM is at least settings.CLAM_POLL_NEAR_COMPLETION,
+        False otherwise
+        """
+        try:
+            completion = int(getattr(clam_data, "completion", 0))
+        except (TypeError, ValueError):
+            return False
+        return completion >= settings.CLAM_POLL_NEAR_COMPLETION
+
     def set_clam_id(self, clam_id):
         """
         Set the CLAM id for this process and save it to the Database.
 
+        The download offset belongs to the archive of the previous CLAM project, so it is reset.
         :param clam_id: the CLAM id to set for this process
         :return: None
         """
         self.clam_id = clam_id
+        self.download_offset = 0
         self.save()
 
     def start_safe(self, profile, parameter_values=None):
@@ -461,6 +1012,65 @@ class Process(Model):
             self.cleanup()
             raise e
 
+    def queue(self, profile, parameter_values=None):
+        """
+        Queue this process for starting by a background worker.
+
+        :param profile: the profile to start this process with
+        :param parameter_values: a dictionary of (key, value) pairs with the parameter values to fill in, only
+        overwrites variable parameters
+        :return: None
+        """
+        self.profile = profile
+        self.parameter_values = json.dumps(
+            dict() if parameter_values is None else parameter_values
+        )
+        self.error_message = ""
+        self.set_status(STATUS_QUEUED)
+        start_process(self.id)
+
+    def start_queued(self):
+        """
+        Start a queued process with the profile and parameter values it was queued with.
+
+        When starting fails, the process is set to STATUS_ERROR and a message describing the error is stored.
+        :return: True when the process was started, False otherwise
+        """
+        if self.status != STATUS_QUEUED:
+            return False
+        parameter_values = (
+            json.loads(self.parameter_values) if self.parameter_values else None
+        )
+        self.set_status(STATUS_CREATED)
+        try:
+            return self.start_safe(
+                self.profile, parameter_values=parameter_values
+            )
+        except Exception as e:
+            logging.error(e)
+            self.error_message = Process.get_start_error_message(e)
+            self.set_status(STATUS_ERROR)
+            return False
+
+    @staticmethod
+    def get_start_error_message(exception):
+        """
+        Get a message for the user describing why a process could not be started.
+
+        :param exception: the exception raised while starting the process
+        :return: a string describing the error
+        """
+        if isinstance(exception, BaseParameter.ParameterException):
+            return "Not all script parameters are filled in"
+        elif isinstance(exception, Project.StateException):
+            return "There is already a running process for this project"
+        elif isinstance(exception, Profile.IncorrectProfileException):
+            return "Invalid profile for running this script"
+        elif isinstance(exception, ValueError):
+            return "Error while starting the process, make sure all input files are specified"
+        else:
+            return "Error while uploading files to CLAM, please try again later"
+
     def start(self, profile, parameter_values=None):
         """
         Add inputs to clam server and starts it.
@@ -475,10 +1085,6 @@ class Process(Model):
             parameter_values = dict()
 
         if self.status == STATUS_CREATED:
-            self.set_status(STATUS_UPLOADING)
-            self.set_clam_id(Process.get_random_clam_id())
-            clamclient = self.script.get_clam_server()
-            clamclient.create(self.clam_id)
             templates = InputTemplate.objects.filter(
                 corresponding_profile=profile
             )
@@ -499,26 +1105,267 @@ class Process(Model):
                     "Not all parameters are satisfied"
                 )
 
+            self.reset_log_messages()
+            self.result_key = self.get_result_key(templates, merged_parameters)
+            if self.result_key and self.restore_cached_result():
+                return True
+
+            if self.is_sharded():
+                shard_files = self.get_shard_files(templates)
+                if len(shard_files) > 1:
+                    self.start_shards(profile, parameter_values, shard_files)
+                    return True
+                self.shard_count = 1
+
+            self.set_status(STATUS_UPLOADING)
+            self.set_clam_id(Process.get_random_clam_id())
+            clamclient = self.script.get_clam_server()
+            clamclient.create(self.clam_id)
+
             self.upload_input_templates(templates)
 
             clamclient.startsafe(self.clam_id, **merged_parameters)
+            self.poll_interval = 0
+            self.poll_failures = 0
+            self.next_poll = timezone.now()
             self.set_status(STATUS_RUNNING)
-            update_script(self.pk)
             return True
         else:
             return False
 
+    def get_result_key(self, templates, merged_parameters):
+        """
+        Get the key of the outputs of running the script of this process in the result cache.
+
+        The key is a fingerprint of the configuration of the script on CLAM, the merged parameters and the names and
+        hashes of the input files of the templates.
+        :param templates: the input templates to run the script with
+        :param merged_parameters: the merged parameters to run the script with
+        :return: a SHA-256 hex digest, an empty string if the configuration of the script on CLAM is not known or this
+        process is a shard (the merged outputs of shards are cached by their parent)
+        """
+        if not self.script.clam_fingerprint or self.parent_id is not None:
+            return ""
+        content_hashes = dict(
+            ProjectFile.objects.filter(project__folder=self.folder).values_list(
+                "path", "content_hash"
+            )
+        )
+        inputs = list()
+        for template in templates:
+            for file in self.get_input_files(template) or []:
+                content_hash = content_hashes.get(file)
+                if content_hash is None:
+                    content_hash = ProjectFile.hash_file(
+                        os.path.join(self.folder, file)
+                    )
+                inputs.append([template.template_id, file, content_hash])
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "hostname": self.script.hostname,
+                    "script": self.script.clam_fingerprint,
+                    "parameters": merged_parameters,
+                    "inputs": sorted(inputs),
+                },
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get_input_files(self, template):
+        """
+        Get the files of this process corresponding to an input template.
+
+        :param template: the input template
+        :return: a list of relative paths of the files with the extension of the template, restricted to the files of
+        this shard if this process is a shard, False if there are no such files
+        """
+        files = template.is_valid_for(self.folder)
+        if files and self.shard_files:
+            allowed = set(json.loads(self.shard_files))
+            files = [file for file in files if file in allowed]
+        return files if files else False
+
+    def get_shard_files(self, templates):
+        """
+        Split the input files of this process into shards.
+
+        Files that share a name apart from their extension (e.g. file.wav and file.txt) are kept in the same shard, the
+        files of unique templates (e.g. a dictionary) are added to every shard.
+        :param templates: the input templates to run the script with
+        :return: a list of at most shard_count lists of input files, raises a ValueError if a shard does not satisfy
+        all input templates
+        """
+        groups = dict()
+        shared = list()
+        for template in templates:
+            files = template.is_valid_for(self.folder) or []
+            if template.unique:
+                shared += files
+                continue
+            for file in files:
+                name = file[: -len(template.extension.lstrip(".")) - 1]
+                group_files, size = groups.get(name, (list(), 0))
+                group_files.append(file)
+                groups[name] = (
+                    group_files,
+                    size + os.path.getsize(os.path.join(self.folder, file)),
+                )
+        shard_files = [
+            sorted(files + shared)
+            for files in split_into_shards(groups, self.shard_count)
+        ]
+        for files in shard_files:
+            for template in templates:
+                if not template.is_satisfied_by(files):
+                    raise ValueError(
+                        "No file specified for template {} in a shard".format(
+                            template
+                        )
+                    )
+        return shard_files
+
+    def start_shards(self, profile, parameter_values, shard_files):
+        """
+        Queue a shard for every list of input files, the shards run as separate CLAM projects at the same time.
+
+        :param profile: the profile to run the shards with
+        :param parameter_values: a dictionary of (key, value) pairs with the parameter values to fill in
+        :param shard_files: a list of lists of the input files of each shard
+        :return: None
+        """
+        self.shard_count = len(shard_files)
+        self.next_poll = None
+        self.set_status(STATUS_RUNNING)
+        for files in shard_files:
+            shard = Process.objects.create(
+                script=self.script,
+                folder=self.folder,
+                parent=self,
+                shard_files=json.dumps(files),
+            )
+            shard.queue(profile, parameter_values=parameter_values)
+
+    def update_from_shards(self):
+        """
+        Finish or fail this process depending on the status of its shards.
+
+        When all shards are finished, their outputs are merged in the output folder and this process is finished. When
+        a shard failed, the other shards are stopped and this process is set to STATUS_ERROR.
+        :return: True if this process was finished or failed, False if its shards are still running
+        """
+        statuses = list(
+            self.shards.order_by("id").values_list("status", "error_message")
+        )
+        failed = [
+            (index, status, error_message)
+            for index, (status, error_message) in enumerate(statuses)
+            if status in (STATUS_ERROR, STATUS_ERROR_DOWNLOAD)
+        ]
+        if failed:
+            new_status = STATUS_ERROR
+        elif all(status == STATUS_FINISHED for status, _ in statuses):
+            new_status = STATUS_DOWNLOADING
+        else:
+            return False
+        # Only one worker may finish or fail this process
+        if (
+            Process.objects.filter(pk=self.pk, status=STATUS_RUNNING).update(
+                status=new_status
+            )
+            == 0
+        ):
+            return False
+        self.status = new_status
+
+        if failed:
+            index, status, error_message = failed[0]
+            self.error_message = "Shard {} of {} failed: {}".format(
+                index + 1, len(statuses), error_message or dict(STATUS)[status],
+            )
+            self.cleanup(status=STATUS_ERROR)
+        else:
+            self.store_result(self.merge_shard_outputs())
+            self.finish_download(next_script=get_next_script(self))
+        return True
+
+    def merge_shard_outputs(self):
+        """
+        Move the outputs of all shards to the output folder of this process.
+
+        Outputs of which multiple shards have a file with the same name (e.g. a list of out of vocabulary words) are
+        concatenated in the order of the shards.
+        :return: a list of the names of the merged files relative to the output folder
+        """
+        merged = list()
+        seen = set()
+        for shard in self.shards.order_by("id"):
+            folder = shard.output_folder
+            for directory, _, files in os.walk(folder):
+                for file in sorted(files):
+                    source = os.path.join(directory, file)
+                    name = os.path.relpath(source, folder)
+                    target = os.path.join(self.output_folder, name)
+                    if name in seen:
+                        append_file(source, target)
+                    else:
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.replace(source, target)
+                        merged.append(name)
+                        seen.add(name)
+            shutil.rmtree(folder, ignore_errors=True)
+        invalidate_file_index(self.output_folder)
+        return merged
+
+    def restore_cached_result(self):
+        """
+        Finish this process with the cached outputs of an identical run instead of running it on CLAM.
+
+        :return: True if the outputs were cached and are restored to the output folder, False otherwise
+        """
+        if result_cache.restore(self.result_key, self.output_folder) is None:
+            return False
+        invalidate_file_index(self.output_folder)
+        self.finish_download(next_script=get_next_script(self))
+        return True
+
+    def store_result(self, names):
+        """
+        Store the downloaded outputs of this process in the result cache.
+
+        :param names: the names of the downloaded members of the output archive
+        :return: None
+        """
+        if not self.result_key:
+            return
+        files = list()
+        for name in names:
+            path = os.path.normpath(name.replace("\\", "/")).lstrip("/")
+            if not path.startswith("..") and os.path.isfile(
+                os.path.join(self.output_folder, path)
+            ):
+                files.append(path)
+        try:
+            result_cache.store(self.result_key, self.output_folder, files)
+        except OSError as e:
+            logging.error(
+                "Failed to cache the outputs of {}: {}".format(self, e)
+            )
+
     def upload_input_templates(self, templates):
         """
         Upload files corresponding to the input templates.
 
+        Files are uploaded concurrently by settings.CLAM_UPLOAD_WORKERS workers, failed uploads are retried. The
+        number of uploaded files and bytes is stored on this process while uploading.
         :param templates: a list of InputTemplate objects
         :return: None, raises a ValueError if there is no file for the template or more than one file for a unique
-        template
+        template, raises the exception of the last attempt if uploading a file fails
         """
-        clamclient = self.script.get_clam_server()
+        uploads = list()
         for template in templates:
-            files = template.is_valid_for(self.folder)
+            files = self.get_input_files(template)
             if not files and not template.optional:
                 raise ValueError(
                     "No file specified for template {}".format(template)
@@ -532,17 +1379,106 @@ class Process(Model):
                     )
                 for file in files:
                     full_file_path = os.path.join(self.folder, file)
-                    clamclient.addinputfile(
-                        self.clam_id, template.template_id, full_file_path
+                    uploads.append(
+                        (
+                            template.template_id,
+                            full_file_path,
+                            os.path.getsize(full_file_path),
+                        )
+                    )
+
+        self.set_upload_progress(
+            files_total=len(uploads),
+            bytes_total=sum(size for _, _, size in uploads),
+        )
+        clamclient = self.script.get_clam_server()
+        with ThreadPoolExecutor(
+            max_workers=settings.CLAM_UPLOAD_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(
+                    call_with_retries,
+                    clamclient.addinputfile,
+                    self.clam_id,
+                    template_id,
+                    full_file_path,
+                ): size
+                for template_id, full_file_path, size in uploads
+            }
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    self.set_upload_progress(
+                        files_done=self.upload_files_done + 1,
+                        bytes_done=self.upload_bytes_done + futures[future],
                     )
+            except Exception as e:
+                for future in futures:
+                    future.cancel()
+                raise e
+
+    def set_upload_progress(
+        self, files_done=0, bytes_done=0, files_total=None, bytes_total=None
+    ):
+        """
+        Set the upload progress of this process and save it to the Database.
+
+        :param files_done: the number of files uploaded to CLAM
+        :param bytes_done: the number of bytes uploaded to CLAM
+        :param files_total: the number of files to upload, None to leave it unchanged
+        :param bytes_total: the number of bytes to upload, None to leave it unchanged
+        :return: None
+        """
+        self.upload_files_done = files_done
+        self.upload_bytes_done = bytes_done
+        if files_total is not None:
+            self.upload_files_total = files_total
+        if bytes_total is not None:
+            self.upload_bytes_total = bytes_total
+        Process.objects.filter(pk=self.pk).update(
+            upload_files_done=self.upload_files_done,
+            upload_bytes_done=self.upload_bytes_done,
+            upload_files_total=self.upload_files_total,
+            upload_bytes_total=self.upload_bytes_total,
+        )
+
+    def get_upload_progress(self):
+        """
+        Get the upload progress of this process.
+
+        :return: a dictionary with the number of files and bytes uploaded and to upload, summed over the shards of this
+        process if its input files are split
+        """
+        if self.is_sharded():
+            progress = self.shards.aggregate(
+                files_done=Sum("upload_files_done"),
+                files_total=Sum("upload_files_total"),
+                bytes_done=Sum("upload_bytes_done"),
+                bytes_total=Sum("upload_bytes_total"),
+            )
+            return {key: value or 0 for key, value in progress.items()}
+        return {
+            "files_done": self.upload_files_done,
+            "files_total": self.upload_files_total,
+            "bytes_done": self.upload_bytes_done,
+            "bytes_total": self.upload_bytes_total,
+        }
 
     def cleanup(self, status=STATUS_CREATED):
         """
         Reset a project on the CLAM server by deleting it and resetting the clam id and status on Django.
 
+        Shards of this process that are still running are stopped and the outputs of all shards are removed.
         :param status: the status to set the process to after this function has been ran, default=STATUS_CREATED
         :return: None
         """
+        for shard in self.shards.all():
+            if shard.clam_id is not None or shard.status not in (
+                STATUS_FINISHED,
+                STATUS_ERROR,
+            ):
+                shard.cleanup(status=STATUS_ERROR)
+            shutil.rmtree(shard.output_folder, ignore_errors=True)
         if self.clam_id is not None:
             try:
                 clamclient = self.script.get_clam_server()
@@ -550,6 +1486,7 @@ class Process(Model):
             except Exception as e:
                 logging.error(e)
         self.clam_id = None
+        self.download_offset = 0
         self.status = status
         self.save()
 
@@ -567,9 +1504,13 @@ class Process(Model):
             except Exception as e:
                 logging.error(e)
                 return False
-            self.update_log_messages_from_xml(data.xml)
+            new_messages = self.update_log_messages_from_xml(data.xml)
+            self.schedule_next_poll(
+                reset=new_messages > 0 or Process.is_near_completion(data)
+            )
             if data.status == clam.common.status.DONE:
-                self.set_status(STATUS_WAITING)
+                self.status = STATUS_WAITING
+            self.save()
             return True
         else:
             return False
@@ -586,9 +1527,7 @@ class Process(Model):
         ):
             self.set_status(STATUS_DOWNLOADING)
             if self.download_archive_and_decompress():
-                if next_script is not None:
-                    self.move_downloaded_output_files(next_script)
-                self.cleanup(status=STATUS_FINISHED)
+                self.finish_download(next_script=next_script)
                 return True
             else:
                 self.set_status(STATUS_ERROR_DOWNLOAD)
@@ -596,47 +1535,132 @@ class Process(Model):
         else:
             return False
 
+    def finish_download(self, next_script=None):
+        """
+        Finish this process once its outputs are in the output folder.
+
+        The output files needed for the next script are moved to the main directory, the file manifest of the project
+        is updated and the process is set to STATUS_FINISHED.
+        :param next_script: the script that runs after this process, None if no script runs after this process
+        :return: None
+        """
+        moved = (
+            self.move_downloaded_output_files(next_script)
+            if next_script is not None
+            else list()
+        )
+        project = self.get_project()
+        if project is not None:
+            project.sync_files(subfolder=Project.OUTPUT_FOLDER)
+            for file in moved:
+                project.register_file(file)
+            project.update_state()
+        self.cleanup(status=STATUS_FINISHED)
+        if self.parent is not None:
+            self.parent.update_from_shards()
+
+    def get_project(self):
+        """
+        Get the project this process is the current process of.
+
+        :return: the project, None if this process is not the current process of a project
+        """
+        return Project.objects.filter(current_process=self).first()
+
     def move_downloaded_output_files(self, script):
         """
         Move downloaded output files that are needed for the next script to the main directory.
 
         :param script: the next script
-        :return: None
+        :return: a list of the names of the moved files
         """
         templates = InputTemplate.objects.filter(
             corresponding_profile__script=script
         )
+        moved = list()
         for template in templates:
-            template.move_corresponding_files(self.output_folder, self.folder)
+            moved += template.move_corresponding_files(
+                self.output_folder, self.folder
+            )
+        return moved
 
     def download_archive_and_decompress(self):
         """
         Download the output archive from the CLAM server.
 
-        :return: the location of the downloaded archive on success, False on failure
+        The archive is streamed and every member is extracted as soon as its bytes are received. When the download is
+        interrupted, the position of the first incomplete member is stored in download_offset and the next download
+        resumes from there.
+        :return: True on success, False on failure
         """
         try:
             clamclient = self.script.get_clam_server()
             if not os.path.exists(self.output_folder):
                 os.makedirs(self.output_folder)
+            if hasattr(clamclient, "iter_archive"):
+                resumed = self.download_offset > 0
+                try:
+                    extracted = self.stream_archive_and_decompress(clamclient)
+                    invalidate_file_index(self.output_folder)
+                    if not resumed:
+                        self.store_result(extracted)
+                    return True
+                except StreamingZipExtractor.UnsupportedArchive as e:
+                    logging.warning(
+                        "Falling back to a full archive download. Error: {}".format(
+                            e
+                        )
+                    )
             downloaded_archive = os.path.join(
                 self.output_folder, str(self.clam_id) + ".{}".format("zip")
             )
             clamclient.downloadarchive(self.clam_id, downloaded_archive, "zip")
             with zipfile.ZipFile(downloaded_archive, "r") as zip_ref:
-                zip_ref.extractall(
-                    os.path.join(self.folder, Project.OUTPUT_FOLDER)
-                )
+                zip_ref.extractall(self.output_folder)
+                extracted = zip_ref.namelist()
             os.remove(downloaded_archive)
+            invalidate_file_index(self.output_folder)
+            self.download_offset = 0
+            self.save()
+            self.store_result(extracted)
             return True
         except Exception as e:
-            print(
+            logging.error(
                 "An error occurred while downloading and decompressing files from CLAM. Error: {}".format(
                     e
                 )
             )
             return False
 
+    def stream_archive_and_decompress(self, clamclient):
+        """
+        Stream the output archive from the CLAM server and extract it while downloading.
+
+        :param clamclient: the CLAM client to download the archive with
+        :return: a list of the extracted file names, raises an Exception when the download is interrupted
+        """
+        offset, chunks = clamclient.iter_archive(
+            self.clam_id, "zip", offset=self.download_offset
+        )
+        extractor = StreamingZipExtractor(self.output_folder, offset=offset)
+        try:
+            for chunk in chunks:
+                extractor.feed(chunk)
+                if extractor.done:
+                    break
+            extracted = extractor.close()
+        except StreamingZipExtractor.UnsupportedArchive:
+            extractor.abort()
+            raise
+        except Exception:
+            extractor.abort()
+            self.download_offset = extractor.offset
+            self.save()
+            raise
+        self.download_offset = 0
+        self.save()
+        return extracted
+
     def is_finished(self):
         """
         Check if this process is finished.
@@ -651,7 +1675,7 @@ class Process(Model):
 
         :return: the status messages in a QuerySet
         """
-        return LogMessage.objects.filter(process=self)
+        return LogMessage.objects.filter(process=self).order_by("index")
 
     def get_output_file_name(self, extension="zip"):
         """
@@ -671,6 +1695,8 @@ class Process(Model):
         """
         if self.status == STATUS_CREATED:
             return "Ready to start"
+        elif self.status == STATUS_QUEUED:
+            return "Queued for starting"
         elif self.status == STATUS_RUNNING:
             return "Running"
         elif self.status == STATUS_WAITING:
@@ -680,7 +1706,11 @@ class Process(Model):
         elif self.status == STATUS_FINISHED:
             return "Done"
         elif self.status == STATUS_ERROR:
-            return "An error occurred"
+            return (
+                self.error_message
+                if self.error_message
+                else "An error occurred"
+            )
         else:
             return "Unknown"
 
@@ -696,15 +1726,9 @@ class Process(Model):
         """
         Get the profiles for which the current files meet the requirements.
 
-        :return:
+        :return: a list of valid profiles
         """
-        profiles = Profile.objects.filter(script=self.script)
-        valid_profiles = []
-
-        for p in profiles:
-            if p.is_valid(self.folder):
-                valid_profiles.append(p)
-        return valid_profiles
+        return self.script.get_valid_profiles(self.folder)
 
     class Meta:
         """
@@ -725,6 +1749,15 @@ class LogMessage(Model):
     process = ForeignKey(Process, on_delete=CASCADE)
     index = PositiveIntegerField()
 
+    class Meta:
+        """Meta class for LogMessage model."""
+
+        constraints = [
+            UniqueConstraint(
+                fields=["process", "index"], name="unique_process_log_index"
+            ),
+        ]
+
 
 class Profile(Model):
     """
@@ -757,6 +1790,21 @@ class Profile(Model):
         """
         return "Profile {}".format(self.pk)
 
+    @staticmethod
+    def remove_profiles(profile_ids):
+        """
+        Remove profiles and their input templates.
+
+        :param profile_ids: a list of ids of the profiles to remove
+        :return: None
+        """
+        if len(profile_ids) == 0:
+            return
+        InputTemplate.objects.filter(
+            corresponding_profile__in=profile_ids
+        ).delete()
+        Profile.objects.filter(pk__in=profile_ids).delete()
+
     def remove_corresponding_templates(self):
         """
         Remove the templates corresponding to this profile object.
@@ -776,9 +1824,18 @@ class Profile(Model):
         :param folder: the folder to check
         :return: True if all InputTemplates corresponding to this profile are valid for the folder, False otherwise
         """
+        return self.is_satisfied_by(get_file_index(folder).names())
+
+    def is_satisfied_by(self, file_names):
+        """
+        Check if a list of files satisfies all input templates corresponding to this profile.
+
+        :param file_names: a list of file names
+        :return: True if all InputTemplates corresponding to this profile are satisfied by the files, False otherwise
+        """
         templates = InputTemplate.objects.filter(corresponding_profile=self)
         for template in templates:
-            if not template.is_valid(folder):
+            if not template.is_satisfied_by(file_names):
                 return False
         return True
 
@@ -848,23 +1905,59 @@ class InputTemplate(Model):
     accept_archive = BooleanField()
     corresponding_profile = ForeignKey(Profile, on_delete=SET_NULL, null=True)
 
+    # Fields of this model and the corresponding attributes of CLAM input template objects
+    DATA_FIELDS = {
+        "template_id": "id",
+        "format": "formatclass",
+        "label": "label",
+        "extension": "extension",
+        "optional": "optional",
+        "unique": "unique",
+        "accept_archive": "acceptarchive",
+    }
+
+    @staticmethod
+    def get_fields_from_data(input_template):
+        """
+        Get the field values of an input template from CLAM input template data.
+
+        :param input_template: a CLAM input template object
+        :return: a dictionary of (field_name, value) pairs
+        """
+        return {
+            field: getattr(input_template, attribute)
+            for field, attribute in InputTemplate.DATA_FIELDS.items()
+        }
+
     def move_corresponding_files(self, from_directory, to_directory):
         """
         Move the corresponding files of this template from a directory to a directory (overwrite if necessary).
 
+        Existing files are replaced instead of written in place, so other links to them (e.g. in the blob store) keep
+        their contents.
         :param from_directory: the directory to check files from
         :param to_directory: the directory to move files to
-        :return: None
+        :return: a list of the names of the moved files
         """
-        for file in [
-            f
-            for f in os.listdir(from_directory)
-            if f.endswith("." + self.extension)
-        ]:
-            shutil.copyfile(
-                os.path.join(from_directory, file),
-                os.path.join(to_directory, file),
+        files = get_file_index(from_directory).names_ending_with(
+            "." + self.extension
+        )
+        for file in files:
+            fd, temporary_path = tempfile.mkstemp(
+                dir=to_directory, suffix=".tmp"
             )
+            os.close(fd)
+            try:
+                shutil.copyfile(
+                    os.path.join(from_directory, file), temporary_path
+                )
+                os.replace(temporary_path, os.path.join(to_directory, file))
+            except BaseException:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
+        invalidate_file_index(to_directory)
+        return files
 
     def is_valid(self, folder):
         """
@@ -873,16 +1966,30 @@ class InputTemplate(Model):
         :param folder: the folder to search for the file
         :return: True if at least one file is found with the extension from this object, False otherwise
         """
-        matching_files = 0
-        for file in os.listdir(folder):
-            if file.endswith(self.extension):
-                matching_files += 1
-        if matching_files == 0 and not self.optional:
-            return False
-        elif matching_files > 1 and self.unique:
-            return False
-        else:
-            return True
+        return self.is_satisfied_by(get_file_index(folder).names())
+
+    def get_matching_files(self, file_names):
+        """
+        Get the file names that have the extension of this input template.
+
+        :param file_names: a list of file names
+        :return: a list of the file names with the extension of this object
+        """
+        return [
+            name for name in file_names if has_extension(name, self.extension)
+        ]
+
+    def is_satisfied_by(self, file_names):
+        """
+        Check if a list of files satisfies this input template.
+
+        :param file_names: a list of file names
+        :return: True if at least one file has the extension of this object or this object is optional, and not more
+        than one file has the extension of this object if this object is unique, False otherwise
+        """
+        return ProfileMatcher.is_satisfied(
+            self, self.get_matching_files(file_names)
+        )
 
     def is_valid_for(self, folder):
         """
@@ -892,10 +1999,7 @@ class InputTemplate(Model):
         :return: a list relative paths to with the extension of this object in the folder,
         if no files are found False is returned
         """
-        valid_files = list()
-        for file in os.listdir(folder):
-            if file.endswith(self.extension):
-                valid_files.append(file)
+        valid_files = self.get_matching_files(get_file_index(folder).names())
 
         if len(valid_files) == 0:
             return False
@@ -978,6 +2082,8 @@ class Project(Model):
 
     EXTRACT_FOLDER = "extract"
     OUTPUT_FOLDER = "output"
+    UPLOAD_FOLDER = ".upload"
+    SHARDS_FOLDER = ".shards"
 
     name = CharField(max_length=512)
     folder = FilePathField(
@@ -988,31 +2094,198 @@ class Project(Model):
     current_process = ForeignKey(
         Process, on_delete=SET_NULL, null=True, blank=True
     )
+    state = IntegerField(choices=TYPES, default=UPLOADING)
 
-    def move_extracted_files(self, extensions):
+    def extract_archive(self, file, extensions):
         """
-        Move extracted files to the project folder.
+        Extract the files with an allowed extension from a zip archive to the project folder.
 
+        Only the allowed files are written, each directly to its final path in the project folder.
+        :param file: the zip archive, a path or a seekable file-like object
         :param extensions: the allowed extensions
-        :return: a list of non-moved files
+        :return: a list of the names of the files that are not extracted, raises a FilteredZipExtractor.LimitExceeded
+        exception if the archive is too large
         """
-        non_copied = list()
-        if os.path.exists(os.path.join(self.folder, Project.EXTRACT_FOLDER)):
-            for root, _, files in os.walk(
-                os.path.join(self.folder, Project.EXTRACT_FOLDER)
-            ):
-                for file in files:
-                    name, extension = os.path.splitext(file)
-                    if extension[1:] in extensions:
-                        shutil.copy(os.path.join(root, file), self.folder)
-                    else:
-                        non_copied.append(file)
-        return non_copied
+        extractor = FilteredZipExtractor(
+            lambda name: os.path.splitext(name)[1][1:] in extensions
+        )
+        try:
+            extracted, skipped = extractor.extract(file, self.folder)
+        finally:
+            invalidate_file_index(self.folder)
+        for name in extracted:
+            self.register_file(name)
+        return skipped
 
     def __str__(self):
         """Convert this object to string."""
         return self.name
 
+    def register_file(self, path, content_hash=None):
+        """
+        Add or update a file in the file manifest of this project.
+
+        Input files are shared through the blob store.
+        :param path: the path of the file relative to the project folder
+        :param content_hash: the SHA-256 hash of the contents of the file if it is known, None to hash the file
+        :return: the ProjectFile for the file, None if the file does not exist
+        """
+        full_path = os.path.join(self.folder, path)
+        role = ProjectFile.get_role(path)
+        try:
+            if content_hash is None:
+                content_hash = ProjectFile.hash_file(full_path)
+            if role == ProjectFile.INPUT:
+                blob_store.add(full_path, content_hash)
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            self.unregister_file(path)
+            return None
+        previous_hash = (
+            ProjectFile.objects.filter(project=self, path=path)
+            .values_list("content_hash", flat=True)
+            .first()
+        )
+        project_file, _ = ProjectFile.objects.update_or_create(
+            project=self,
+            path=path,
+            defaults={
+                "size": stat.st_size,
+                "extension": get_extension(os.path.basename(path)),
+                "content_hash": content_hash,
+                "role": role,
+                "modified": datetime.datetime.fromtimestamp(
+                    stat.st_mtime, tz=pytz.utc
+                ),
+            },
+        )
+        if previous_hash is not None and previous_hash != content_hash:
+            blob_store.release(previous_hash)
+        return project_file
+
+    def unregister_file(self, path):
+        """
+        Remove a file from the file manifest of this project and release its blob.
+
+        :param path: the path of the file relative to the project folder
+        :return: None
+        """
+        project_files = ProjectFile.objects.filter(project=self, path=path)
+        content_hashes = list(
+            project_files.values_list("content_hash", flat=True)
+        )
+        project_files.delete()
+        for content_hash in content_hashes:
+            blob_store.release(content_hash)
+
+    def sync_files(self, subfolder=None):
+        """
+        Synchronise the file manifest of this project with the files on disk.
+
+        Only files of which the size or modification time changed are hashed again.
+        :param subfolder: the folder relative to the project folder to synchronise, None to synchronise all files
+        :return: None
+        """
+        root = (
+            self.folder
+            if subfolder is None
+            else os.path.join(self.folder, subfolder)
+        )
+        ignored = {os.path.basename(self.folder) + ".zip"}
+        on_disk = dict()
+        for directory, folders, files in os.walk(root):
+            if directory == self.folder:
+                folders[:] = [
+                    x
+                    for x in folders
+                    if x
+                    not in (
+                        Project.EXTRACT_FOLDER,
+                        Project.UPLOAD_FOLDER,
+                        Project.SHARDS_FOLDER,
+                    )
+                ]
+            for file in files:
+                path = os.path.relpath(
+                    os.path.join(directory, file), self.folder
+                )
+                if path not in ignored:
+                    on_disk[path] = os.stat(os.path.join(directory, file))
+
+        registered = ProjectFile.objects.filter(project=self)
+        if subfolder is not None:
+            registered = registered.filter(
+                path__startswith=os.path.join(subfolder, "")
+            )
+        for project_file in registered:
+            stat = on_disk.pop(project_file.path, None)
+            if stat is None:
+                project_file.delete()
+                blob_store.release(project_file.content_hash)
+            elif (
+                stat.st_size != project_file.size
+                or datetime.datetime.fromtimestamp(stat.st_mtime, tz=pytz.utc)
+                != project_file.modified
+            ):
+                self.register_file(project_file.path)
+        for path in on_disk.keys():
+            self.register_file(path)
+
+    def get_file_names(self):
+        """
+        Get the names of the files in the project folder from the file manifest.
+
+        :return: a list of the names of the input and dictionary files of this project
+        """
+        return list(
+            self.get_files()
+            .exclude(role=ProjectFile.OUTPUT)
+            .values_list("path", flat=True)
+        )
+
+    def get_valid_profiles(self, script):
+        """
+        Get the profiles of a script for which the files in the file manifest of this project meet the requirements.
+
+        :param script: the script
+        :return: a list of valid profiles
+        """
+        return [
+            profile
+            for profile, _ in script.match_profiles(self.get_file_names())
+        ]
+
+    def get_files(self, role=None, extensions=None):
+        """
+        Get the files in the file manifest of this project.
+
+        :param role: only get files with this role, None to get files with any role
+        :param extensions: only get files ending with one of these extensions (without leading dot), None to get files
+        with any extension
+        :return: a QuerySet of ProjectFile objects
+        """
+        files = ProjectFile.objects.filter(project=self)
+        if role is not None:
+            files = files.filter(role=role)
+        if extensions is not None:
+            query = Q(pk__in=[])
+            for extension in extensions:
+                query |= Q(path__endswith="." + extension)
+            files = files.filter(query)
+        return files
+
+    @staticmethod
+    def get_overview(user):
+        """
+        Get the projects of a user with everything needed to render them in one query.
+
+        :param user: the user
+        :return: a QuerySet of the projects of the user with their pipeline and scripts selected
+        """
+        return Project.objects.filter(user=user.id).select_related(
+            "pipeline__fa_script", "pipeline__g2p_script"
+        )
+
     @staticmethod
     def create_project(name, pipeline, user):
         """
@@ -1047,14 +2320,48 @@ class Project(Model):
                     name=name, folder=folder, pipeline=pipeline, user=user
                 )
 
+    def save(self, *args, **kwargs):
+        """
+        Save this project and store its state.
+
+        :param args: arguments
+        :param kwargs: keyword arguments
+        :return: None
+        """
+        self.state = self.get_state()
+        super(Project, self).save(*args, **kwargs)
+
+    def get_state(self):
+        """
+        Get the state to store for this project.
+
+        :return: the next step of this project, the stored state if the next step can not be determined
+        """
+        try:
+            return self.get_next_step()
+        except ValueError:
+            return self.state
+
+    def update_state(self):
+        """
+        Recompute and store the state of this project without saving the other fields.
+
+        :return: the state of this project
+        """
+        self.state = self.get_state()
+        Project.objects.filter(pk=self.pk).update(state=self.state)
+        return self.state
+
     @property
     def status(self):
         """
         GET the status of this project.
 
-        :return: the next step of this project
+        The status is the state stored when this project was last saved or its state was last updated, use
+        get_next_step to compute the status from the current process and the files of this project.
+        :return: the stored state of this project
         """
-        return self.get_next_step()
+        return self.state
 
     def get_next_step(self):
         """
@@ -1081,17 +2388,25 @@ class Project(Model):
         """
         Write content to .oov.dict file in project folder.
 
+        The file is replaced instead of written in place, so other links to the file keep their contents.
         :param content: the content to write to the file
         :param name: the name of the default file to write to
         :return: None
         """
         path = self.get_oov_dict_file_path()
-        if path is not None:
-            with open(path, "w") as file:
-                file.write(content)
-        else:
-            with open(os.path.join(self.folder, name), "w") as file:
+        if path is None:
+            path = os.path.join(self.folder, name)
+        fd, temporary_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
                 file.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        invalidate_file_index(self.folder)
+        self.register_file(os.path.relpath(path, self.folder))
 
     def get_oov_dict_file_contents(self):
         """
@@ -1112,11 +2427,9 @@ class Project(Model):
 
         :return: the file path of the .oov.dict file, or None if such a file does not exist
         """
-        for file_name in os.listdir(self.folder):
-            full_file_path = os.path.join(self.folder, file_name)
-            if os.path.isfile(full_file_path):
-                if file_name.endswith(".oov.dict"):
-                    return full_file_path
+        index = get_file_index(self.folder)
+        for file_name in index.names_ending_with(".oov.dict"):
+            return index.path(file_name)
         return None
 
     def has_non_empty_extension_file(self, extensions, folder=None):
@@ -1136,12 +2449,14 @@ class Project(Model):
             return False
         if type(extensions) is not list:
             raise TypeError("Extensions must be a list type")
-        for file_name in os.listdir(folder):
-            full_file_path = os.path.join(folder, file_name)
-            if os.path.isfile(full_file_path):
-                if file_name.endswith(tuple(extensions)):
-                    if os.stat(full_file_path).st_size != 0:
-                        return True
+        index = get_file_index(folder)
+        for file_name in index.names_ending_with(tuple(extensions)):
+            # Files may be overwritten in place by other processes, so the size of the candidates is checked again.
+            try:
+                if os.stat(index.path(file_name)).st_size != 0:
+                    return True
+            except FileNotFoundError:
+                continue
 
         return False
 
@@ -1149,24 +2464,82 @@ class Project(Model):
         """
         Check if FA has finished.
 
-        :return: True if a .ctm file is present in the project directory, False otherwise
+        :return: True if a .ctm file is present in the project directory, False otherwise
+        """
+        return self.has_non_empty_extension_file(
+            ["ctm"], folder=os.path.join(self.folder, Project.OUTPUT_FOLDER),
+        )
+
+    def get_archive_fingerprint(self, files):
+        """
+        Get a fingerprint of the files of this project that identifies the contents of the downloadable archive.
+
+        The fingerprint includes the content hashes in the file manifest and the current size and modification time of
+        each file, so a file changed on disk without updating the manifest results in a new fingerprint.
+        :param files: a list of ProjectFile objects of this project
+        :return: a SHA-256 hex digest of the files
+        """
+        fingerprint = hashlib.sha256()
+        for file in files:
+            try:
+                stat = os.stat(os.path.join(self.folder, file.path))
+            except FileNotFoundError:
+                continue
+            fingerprint.update(
+                "{}\0{}\0{}\0{}\n".format(
+                    file.path, file.content_hash, stat.st_size, stat.st_mtime_ns
+                ).encode("utf-8")
+            )
+        return fingerprint.hexdigest()
+
+    def create_downloadable_archive(self):
+        """
+        Create a downloadable archive.
+
+        Archives are cached outside of the project folder by a fingerprint of the files of this project, an archive is
+        only built again if the files changed.
+        :return: the filename of the downloadable archive
+        """
+        files = list(self.get_files())
+        return archive_cache.get_or_create(
+            self.get_archive_fingerprint(files),
+            lambda zip_to: zip_files(self.get_archive_members(files), zip_to),
+        )
+
+    def get_downloadable_archive(self):
+        """
+        Get the downloadable archive from the cache, or stream it while it is built.
+
+        A streamed archive is stored in the cache once all of its bytes are generated.
+        :return: a tuple (path, chunks), either with the path of the cached archive and None, or with None and a
+        generator of the bytes of the archive
+        """
+        files = list(self.get_files())
+        key = self.get_archive_fingerprint(files)
+        path = archive_cache.get(key)
+        if path is not None:
+            return path, None
+        return (
+            None,
+            archive_cache.tee(key, iter_zip(self.get_archive_members(files))),
+        )
+
+    def get_archive_members(self, files):
+        """
+        Get the members of the downloadable archive.
+
+        :param files: a list of ProjectFile objects of this project
+        :return: a list of tuples (path, name) with the full path of a file and its path in the project folder
         """
-        return self.has_non_empty_extension_file(
-            ["ctm"], folder=os.path.join(self.folder, Project.OUTPUT_FOLDER),
-        )
+        return [(os.path.join(self.folder, x.path), x.path) for x in files]
 
-    def create_downloadable_archive(self):
+    def get_archive_name(self):
         """
-        Create a downloadable archive.
+        Get the file name under which the downloadable archive of this project is served.
 
-        :return: the filename of the downloadable archive
+        :return: the name of the project folder with a .zip extension
         """
-        _, zip_filename = os.path.split(self.folder)
-        zip_filename = zip_filename + ".zip"
-        return os.path.join(
-            self.folder,
-            zip_dir(self.folder, os.path.join(self.folder, zip_filename)),
-        )
+        return os.path.basename(os.path.normpath(self.folder)) + ".zip"
 
     def can_upload(self):
         """
@@ -1184,6 +2557,18 @@ class Project(Model):
         """
         return self.current_process is None
 
+    @staticmethod
+    def get_shard_count(shards):
+        """
+        Get the number of shards to split the input files of a process into.
+
+        Every shard runs as its own CLAM project at the same time, the outputs of the shards are merged in the output
+        folder of the project.
+        :param shards: the requested number of shards
+        :return: the requested number of shards, at least 1 and at most settings.CLAM_MAX_SHARDS
+        """
+        return max(1, min(int(shards), settings.CLAM_MAX_SHARDS))
+
     def start_fa_script(self, profile, **kwargs):
         """
         Start the FA script with a given profile.
@@ -1204,13 +2589,14 @@ class Project(Model):
         """
         return self.start_script(profile, self.pipeline.g2p_script, **kwargs)
 
-    def start_script(self, profile, script, parameter_values=None):
+    def start_script(self, profile, script, parameter_values=None, shards=1):
         """
         Start a new script and add the process to this project.
 
         :param parameter_values: parameter values in (key, value) format in a dictionary
         :param profile: the profile to start the script with
         :param script: the script to start
+        :param shards: the number of shards to split the input files into, see Project.get_shard_count
         :return: the process with the started script, raises a ValueError if the files in the folder do not match the
         profile, raises an Exception if a CLAM error occurred
         """
@@ -1224,7 +2610,9 @@ class Project(Model):
             raise Profile.IncorrectProfileException
 
         self.current_process = Process.objects.create(
-            script=script, folder=self.folder
+            script=script,
+            folder=self.folder,
+            shard_count=Project.get_shard_count(shards),
         )
         self.save()
         try:
@@ -1236,6 +2624,48 @@ class Project(Model):
             self.cleanup()
             raise e
 
+    def queue_script(self, profile, script, parameter_values=None, shards=1):
+        """
+        Queue a new script for starting and add the process to this project.
+
+        The process is started by a background worker, errors while starting the process are stored on the process.
+        :param parameter_values: parameter values in (key, value) format in a dictionary
+        :param profile: the profile to start the script with
+        :param script: the script to start
+        :param shards: the number of shards to split the input files into, see Project.get_shard_count
+        :return: the queued process, raises a StateException if there already is a process for this project, raises
+        an IncorrectProfileException if the profile does not belong to the script, raises a ParameterException if one
+        or more parameters are not satisfied
+        """
+        parameter_values = (
+            dict() if parameter_values is None else parameter_values
+        )
+
+        if not self.can_start_new_process():
+            raise Project.StateException
+        elif profile.script != script:
+            raise Profile.IncorrectProfileException
+
+        merged_parameters = script.get_parameters_as_dict(
+            preset_parameters=parameter_values
+        )
+        if (
+            len(script.get_unsatisfied_parameters(merged_parameters.keys()))
+            != 0
+        ):
+            raise BaseParameter.ParameterException(
+                "Not all parameters are satisfied"
+            )
+
+        self.current_process = Process.objects.create(
+            script=script,
+            folder=self.folder,
+            shard_count=Project.get_shard_count(shards),
+        )
+        self.save()
+        self.current_process.queue(profile, parameter_values=parameter_values)
+        return self.current_process
+
     def cleanup(self):
         """
         Reset the project to a clean state.
@@ -1251,11 +2681,15 @@ class Project(Model):
         Delete a Project.
 
         :param kwargs: keyword arguments
-        :return: None, deletes a project and removes the folder of that project
+        :return: None, deletes a project, removes the folder of that project and releases the blobs of its files
         """
+        content_hashes = set(self.files.values_list("content_hash", flat=True))
         if os.path.exists(self.folder):
             shutil.rmtree(self.folder, ignore_errors=True)
+        invalidate_file_index(self.folder)
         super(Project, self).delete(**kwargs)
+        for content_hash in content_hashes:
+            blob_store.release(content_hash)
 
     def is_project_script(self, script):
         """
@@ -1283,6 +2717,339 @@ class Project(Model):
         ]
 
 
+class ProjectFile(Model):
+    """
+    Database model for the manifest of files in a project folder.
+
+    Attributes:
+        project                 The project the file belongs to.
+        path                    The path of the file relative to the project folder.
+        size                    The size of the file in bytes.
+        extension               The extension of the file, including all parts after the first dot.
+        content_hash            The SHA-256 hash of the contents of the file.
+        role                    Whether the file is an input file, an output file or a dictionary.
+        modified                The modification time of the file when it was registered.
+    """
+
+    INPUT = "input"
+    OUTPUT = "output"
+    DICTIONARY = "dictionary"
+
+    ROLES = (
+        (INPUT, "Input"),
+        (OUTPUT, "Output"),
+        (DICTIONARY, "Dictionary"),
+    )
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    project = ForeignKey(Project, on_delete=CASCADE, related_name="files")
+    path = CharField(max_length=1024)
+    size = BigIntegerField()
+    extension = CharField(max_length=64, db_index=True)
+    content_hash = CharField(max_length=64)
+    role = CharField(max_length=16, choices=ROLES)
+    modified = DateTimeField()
+
+    def __str__(self):
+        """
+        Convert this object to string.
+
+        :return: the path of this file
+        """
+        return self.path
+
+    @property
+    def name(self):
+        """
+        Get the file name of this file.
+
+        :return: the file name without the folder it is in
+        """
+        return os.path.basename(self.path)
+
+    @staticmethod
+    def get_role(path):
+        """
+        Get the role of a file from its path.
+
+        :param path: the path relative to the project folder
+        :return: OUTPUT for files in the output folder, DICTIONARY for .oov.dict files and INPUT otherwise
+        """
+        if path.split(os.sep)[0] == Project.OUTPUT_FOLDER:
+            return ProjectFile.OUTPUT
+        elif path.endswith(".oov.dict"):
+            return ProjectFile.DICTIONARY
+        else:
+            return ProjectFile.INPUT
+
+    @staticmethod
+    def hash_file(full_path):
+        """
+        Compute the SHA-256 hash of a file.
+
+        :param full_path: the path of the file
+        :return: the hexadecimal SHA-256 hash of the contents of the file
+        """
+        content_hash = hashlib.sha256()
+        with open(full_path, "rb") as file:
+            for chunk in iter(
+                lambda: file.read(ProjectFile.HASH_CHUNK_SIZE), b""
+            ):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    class Meta:
+        """
+        Display configuration for admin pane.
+
+        Order admin list by path.
+        Display plural correctly.
+        """
+
+        ordering = ["path"]
+        unique_together = ("project", "path")
+        verbose_name = "Project file"
+        verbose_name_plural = "Project files"
+
+
+class Batch(Model):
+    """
+    Database model for a batch of projects that are run through their pipeline automatically.
+
+    Attributes:
+        name                    Name of the batch.
+        user                    The user that created the batch.
+        created                 The time the batch was created.
+        finished                The time the last project of the batch finished or failed, None while it is running.
+    """
+
+    name = CharField(max_length=512)
+    user = ForeignKey(User, on_delete=SET_NULL, null=True)
+    created = DateTimeField(auto_now_add=True)
+    finished = DateTimeField(null=True, blank=True, default=None)
+
+    def __str__(self):
+        """
+        Convert this object to string.
+
+        :return: the name of this batch
+        """
+        return self.name
+
+    @staticmethod
+    def create_batch(name, projects, user):
+        """
+        Create a batch that runs the pipelines of projects.
+
+        :param name: the name of the batch
+        :param projects: the projects to run
+        :param user: the user creating the batch
+        :return: the created Batch
+        """
+        with transaction.atomic():
+            batch = Batch.objects.create(name=name, user=user)
+            BatchProject.objects.bulk_create(
+                [
+                    BatchProject(batch=batch, project=project)
+                    for project in projects
+                ]
+            )
+        return batch
+
+    def get_progress(self):
+        """
+        Get the progress and throughput of this batch.
+
+        :return: a dictionary with the number of projects in total, per step, in flight, done and failed, the
+        throughput in finished projects per hour and the estimated number of seconds until the batch is finished (None
+        if it can not be estimated yet)
+        """
+        steps = dict(
+            self.entries.values_list("step").annotate(Count("id")).order_by()
+        )
+        total = sum(steps.values())
+        done = steps.get(BatchProject.DONE, 0)
+        failed = steps.get(BatchProject.FAILED, 0)
+        in_flight = self.entries.filter(
+            step__in=BatchProject.ACTIVE_STEPS, process__isnull=False
+        ).count()
+        end = self.finished if self.finished is not None else timezone.now()
+        elapsed = max((end - self.created).total_seconds(), 1)
+        throughput = (done + failed) / elapsed * 3600
+        remaining = total - done - failed
+        return {
+            "total": total,
+            "steps": {
+                label: steps.get(step, 0) for step, label in BatchProject.STEPS
+            },
+            "in_flight": in_flight,
+            "done": done,
+            "failed": failed,
+            "throughput": throughput,
+            "eta": remaining / throughput * 3600 if throughput > 0 else None,
+            "finished": self.finished is not None,
+        }
+
+    class Meta:
+        """
+        Display configuration for admin pane.
+
+        Order admin list by creation time.
+        Display plural correctly.
+        """
+
+        ordering = ["-created"]
+        verbose_name_plural = "Batches"
+
+
+class BatchProject(Model):
+    """
+    Database model for a project in a batch.
+
+    Attributes:
+        batch                   The batch the project is in.
+        project                 The project.
+        step                    The step of the pipeline the project is in.
+        process                 The process running the current step, None if the step is not started yet.
+        error_message           Message describing why the project failed.
+        started                 The time the first step of the project was started.
+        finished                The time the project finished or failed.
+    """
+
+    ALIGN = 0
+    G2P = 1
+    REALIGN = 2
+    DONE = 3
+    FAILED = 4
+
+    STEPS = (
+        (ALIGN, "Forced alignment"),
+        (G2P, "G2P"),
+        (REALIGN, "Forced alignment with dictionary"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    ACTIVE_STEPS = (ALIGN, G2P, REALIGN)
+
+    batch = ForeignKey(Batch, on_delete=CASCADE, related_name="entries")
+    project = ForeignKey(
+        Project, on_delete=CASCADE, related_name="batch_entries"
+    )
+    step = IntegerField(choices=STEPS, default=ALIGN, db_index=True)
+    process = ForeignKey(
+        Process, on_delete=SET_NULL, null=True, blank=True, default=None
+    )
+    error_message = TextField(blank=True, default="")
+    started = DateTimeField(null=True, blank=True, default=None)
+    finished = DateTimeField(null=True, blank=True, default=None)
+
+    def __str__(self):
+        """
+        Convert this object to string.
+
+        :return: the name of the project and the step it is in
+        """
+        return "{} ({})".format(self.project, self.get_step_display())
+
+    def get_script(self):
+        """
+        Get the script that runs the current step of this project.
+
+        :return: the G2P script of the pipeline of the project for the G2P step, the FA script otherwise
+        """
+        if self.step == BatchProject.G2P:
+            return self.project.pipeline.g2p_script
+        return self.project.pipeline.fa_script
+
+    def fail(self, error_message):
+        """
+        Mark this project as failed and save it to the Database.
+
+        :param error_message: a message describing why the project failed
+        :return: None
+        """
+        self.step = BatchProject.FAILED
+        self.process = None
+        self.error_message = error_message
+        self.finished = timezone.now()
+        self.save()
+
+    def start(self):
+        """
+        Queue the process of the current step of this project.
+
+        The first valid profile of the script is used, the parameters are the defaults and presets of the script.
+        :return: True if the process was queued, False if the project failed to start
+        """
+        script = self.get_script()
+        profiles = self.project.get_valid_profiles(script)
+        if len(profiles) == 0:
+            self.fail(
+                "There are no profiles that can be applied to this project"
+            )
+            return False
+        try:
+            self.process = self.project.queue_script(profiles[0], script)
+        except Exception as e:
+            self.fail(Process.get_start_error_message(e))
+            return False
+        if self.started is None:
+            self.started = timezone.now()
+        self.save()
+        return True
+
+    def advance(self):
+        """
+        Move this project to its next step once the process of the current step finished.
+
+        After forced alignment, G2P runs when the output of the process has words that are missing from the dictionary
+        and forced alignment runs again with the generated dictionary. A failed process fails the project.
+        :return: True if the project moved to another step, False if its process is still running
+        """
+        process = self.process
+        if process is None or process.status not in (
+            STATUS_FINISHED,
+            STATUS_ERROR,
+            STATUS_ERROR_DOWNLOAD,
+        ):
+            return False
+        if self.project.current_process_id == process.id:
+            self.project.cleanup()
+        if process.status != STATUS_FINISHED:
+            self.fail(process.error_message or dict(STATUS)[process.status])
+        elif (
+            self.step == BatchProject.ALIGN
+            and self.project.has_non_empty_extension_file(
+                ["oov"], folder=process.output_folder
+            )
+        ):
+            self.step = BatchProject.G2P
+        elif self.step == BatchProject.G2P:
+            self.step = BatchProject.REALIGN
+        else:
+            self.step = BatchProject.DONE
+            self.finished = timezone.now()
+        if self.step != BatchProject.FAILED:
+            self.process = None
+            self.save()
+        return True
+
+    class Meta:
+        """
+        Display configuration for admin pane.
+
+        Order admin list by batch.
+        Display plural correctly.
+        """
+
+        ordering = ["batch", "id"]
+        unique_together = ("batch", "project")
+        verbose_name = "Batch project"
+        verbose_name_plural = "Batch projects"
+
+
 class BaseParameter(Model):
     """Base model for a parameter object."""
 
@@ -1334,6 +3101,58 @@ class BaseParameter(Model):
         else:
             raise TypeError("Type of parameter {} unknown".format(parameter))
 
+    @staticmethod
+    def get_typed_model(type):
+        """
+        Get the typed parameter model of a type.
+
+        :param type: the type in BaseParameter.TYPES types
+        :return: the typed parameter model class of the type
+        """
+        return {
+            BaseParameter.BOOLEAN_TYPE: BooleanParameter,
+            BaseParameter.STATIC_TYPE: StaticParameter,
+            BaseParameter.STRING_TYPE: StringParameter,
+            BaseParameter.CHOICE_TYPE: ChoiceParameter,
+            BaseParameter.TEXT_TYPE: TextParameter,
+            BaseParameter.INTEGER_TYPE: IntegerParameter,
+            BaseParameter.FLOAT_TYPE: FloatParameter,
+        }[type]
+
+    @staticmethod
+    def remove_parameters(parameters):
+        """
+        Remove parameters together with their typed parameters and choices.
+
+        :param parameters: a list or QuerySet of the BaseParameter objects to remove
+        :return: None
+        """
+        parameter_ids = [x.pk for x in parameters]
+        if len(parameter_ids) == 0:
+            return
+        Choice.objects.filter(
+            corresponding_choice_parameter__base__in=parameter_ids
+        ).delete()
+        for type, _ in BaseParameter.TYPES:
+            BaseParameter.get_typed_model(type).objects.filter(
+                base__in=parameter_ids
+            ).delete()
+        BaseParameter.objects.filter(pk__in=parameter_ids).delete()
+
+    def has_typed_parameter(self):
+        """
+        Check if this parameter has a typed parameter of its type.
+
+        :return: True if a typed parameter of the type of this parameter exists, False otherwise
+        """
+        try:
+            return (
+                getattr(self, ResolvedParameter.TYPED_RELATIONS[self.type])
+                is not None
+            )
+        except (KeyError, ObjectDoesNotExist):
+            return False
+
     def get_typed_parameter(self):
         """
         Get the corresponding typed parameter for this object.
@@ -1407,6 +3226,20 @@ class BaseParameter(Model):
             except parameter_class.DoesNotExist:
                 pass
 
+    def get_choices(self):
+        """
+        Get the choices of this parameter.
+
+        :return: a list of (choice.id, choice.value) tuples, empty if this parameter is not a choice parameter
+        """
+        if self.type != self.CHOICE_TYPE:
+            return []
+        return list(
+            Choice.objects.filter(
+                corresponding_choice_parameter__base=self
+            ).values_list("id", "value")
+        )
+
     def get_corresponding_value(self, value):
         """
         Get and check a value for this parameter.
@@ -1786,3 +3619,213 @@ class FloatParameter(Model):
             self.base.save()
             self.value = value
             self.save()
+
+
+class ResolvedParameter:
+    """
+    Snapshot of a parameter of a script together with its typed value and choices.
+
+    Resolved parameters are plain objects that do not query the database, so they can be cached per script. They
+    behave like BaseParameter objects for building parameter forms and checking parameter values.
+    """
+
+    TYPED_RELATIONS = {
+        BaseParameter.BOOLEAN_TYPE: "booleanparameter",
+        BaseParameter.STATIC_TYPE: "staticparameter",
+        BaseParameter.STRING_TYPE: "stringparameter",
+        BaseParameter.CHOICE_TYPE: "choiceparameter",
+        BaseParameter.TEXT_TYPE: "textparameter",
+        BaseParameter.INTEGER_TYPE: "integerparameter",
+        BaseParameter.FLOAT_TYPE: "floatparameter",
+    }
+
+    VALUE_TYPES = {
+        BaseParameter.BOOLEAN_TYPE: bool,
+        BaseParameter.STRING_TYPE: str,
+        BaseParameter.TEXT_TYPE: str,
+        BaseParameter.INTEGER_TYPE: int,
+        BaseParameter.FLOAT_TYPE: float,
+    }
+
+    def __init__(self, pk, name, type, preset, typed, value, choices):
+        """
+        Initialise a resolved parameter.
+
+        :param pk: the id of the BaseParameter
+        :param name: the name of the parameter
+        :param type: the type of the parameter in BaseParameter.TYPES types
+        :param preset: whether the parameter has a preset
+        :param typed: whether the parameter has a typed parameter
+        :param value: the value of the typed parameter
+        :param choices: a list of (choice.id, choice.value) tuples for choice parameters
+        """
+        self.pk = pk
+        self.name = name
+        self.type = type
+        self.preset = preset
+        self.typed = typed
+        self.value = value
+        self.choices = choices
+
+    @staticmethod
+    def load(script):
+        """
+        Load the resolved parameters of a script.
+
+        :param script: the script to load the parameters of
+        :return: a list of ResolvedParameter objects, loaded with two queries
+        """
+        choices = dict()
+        for choice_id, parameter_id, value in (
+            Choice.objects.filter(
+                corresponding_choice_parameter__base__corresponding_script=script
+            )
+            .order_by("id")
+            .values_list("id", "corresponding_choice_parameter_id", "value")
+        ):
+            choices.setdefault(parameter_id, list()).append((choice_id, value))
+
+        parameters = list()
+        for parameter in (
+            BaseParameter.objects.filter(corresponding_script=script)
+            .select_related(
+                *ResolvedParameter.TYPED_RELATIONS.values(),
+                "choiceparameter__value",
+            )
+            .order_by("id")
+        ):
+            typed = None
+            relation = ResolvedParameter.TYPED_RELATIONS.get(parameter.type)
+            if relation is not None:
+                try:
+                    typed = getattr(parameter, relation)
+                except ObjectDoesNotExist:
+                    pass
+            value = None
+            if (
+                typed is not None
+                and parameter.type == BaseParameter.CHOICE_TYPE
+            ):
+                value = typed.value.value if typed.value is not None else None
+            elif typed is not None:
+                value = typed.value
+            parameters.append(
+                ResolvedParameter(
+                    parameter.pk,
+                    parameter.name,
+                    parameter.type,
+                    parameter.preset,
+                    typed is not None,
+                    value,
+                    choices.get(typed.pk, []) if typed is not None else [],
+                )
+            )
+        return parameters
+
+    def get_default_value(self):
+        """
+        Get the default value of this parameter.
+
+        :return: the default value of this parameter, None if the default value is not set
+        """
+        if not self.preset:
+            return None
+        return self.value
+
+    def get_choices(self):
+        """
+        Get the choices of this parameter.
+
+        :return: a list of (choice.id, choice.value) tuples
+        """
+        return self.choices
+
+    def get_corresponding_value(self, value):
+        """
+        Get and check a value for this parameter.
+
+        :param value: the value for this parameter, for choice types the value can either be the private key or a
+        Choice object
+        :return: the value for this parameter if the instance of the value is matching the parameter type, see
+        BaseParameter.get_corresponding_value. None is returned if the value does not match the parameter
+        """
+        if not self.typed:
+            return None
+        elif self.type == BaseParameter.STATIC_TYPE:
+            return self.value
+        elif self.type == BaseParameter.CHOICE_TYPE:
+            if isinstance(value, Choice):
+                value = value.pk
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+            return dict(self.choices).get(value)
+        elif isinstance(value, self.VALUE_TYPES[self.type]):
+            return value
+        else:
+            return None
+
+    def __str__(self):
+        """
+        Convert this parameter to string.
+
+        :return: the name of this parameter and the private key
+        """
+        return "{} ({})".format(self.name, self.pk)
+
+
+def get_parameter_script_id(instance):
+    """
+    Get the id of the script a parameter, typed parameter or choice belongs to.
+
+    :param instance: a BaseParameter, typed parameter or Choice object
+    :return: the id of the script, None if the object does not belong to a script
+    """
+    if isinstance(instance, BaseParameter):
+        return instance.corresponding_script_id
+    elif isinstance(instance, Choice):
+        return (
+            BaseParameter.objects.filter(
+                choiceparameter=instance.corresponding_choice_parameter_id
+            )
+            .values_list("corresponding_script_id", flat=True)
+            .first()
+        )
+    else:
+        return (
+            BaseParameter.objects.filter(pk=instance.base_id)
+            .values_list("corresponding_script_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=BaseParameter)
+@receiver(post_delete, sender=BaseParameter)
+@receiver(post_save, sender=BooleanParameter)
+@receiver(post_delete, sender=BooleanParameter)
+@receiver(post_save, sender=StaticParameter)
+@receiver(post_delete, sender=StaticParameter)
+@receiver(post_save, sender=StringParameter)
+@receiver(post_delete, sender=StringParameter)
+@receiver(post_save, sender=ChoiceParameter)
+@receiver(post_delete, sender=ChoiceParameter)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+@receiver(post_save, sender=TextParameter)
+@receiver(post_delete, sender=TextParameter)
+@receiver(post_save, sender=IntegerParameter)
+@receiver(post_delete, sender=IntegerParameter)
+@receiver(post_save, sender=FloatParameter)
+@receiver(post_delete, sender=FloatParameter)
+def invalidate_script_parameters(sender, instance, **kwargs):
+    """
+    Invalidate the cached resolved parameters of a script when one of its parameters changes.
+
+    :param sender: the model class
+    :param instance: the parameter, typed parameter or choice that changed
+    :param kwargs: keyword arguments
+    :return: None
+    """
+    if not kwargs.get("raw", False):
+        Script.invalidate_parameters(get_parameter_script_id(instance))
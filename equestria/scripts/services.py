@@ -1,5 +1,19 @@
-import zipfile
+import hashlib
+import heapq
+import json
 import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
 
 
 def zip_dir(zip_directory, zip_to, ignore=None):
@@ -29,3 +43,1560 @@ def zip_dir(zip_directory, zip_to, ignore=None):
     ziph.close()
 
     return ziph.filename
+
+
+def zip_files(files, zip_to):
+    """
+    Zip a list of files.
+
+    :param files: a list of tuples (path, name) with the path of a file and the name to store it under in the archive,
+    files that do not exist are skipped
+    :param zip_to: the file to write the zip to
+    :return: the file name of the zip archive
+    """
+    with zipfile.ZipFile(zip_to, "w", zipfile.ZIP_DEFLATED) as ziph:
+        for path, name in files:
+            if os.path.isfile(path):
+                compress_type, compresslevel = get_zip_compression(name)
+                ziph.write(
+                    path,
+                    name,
+                    compress_type=compress_type,
+                    compresslevel=compresslevel,
+                )
+    return zip_to
+
+
+def get_zip_compression(name):
+    """
+    Get the compression to store a file with in a zip archive.
+
+    Files of which the extension is in settings.ZIP_STORED_EXTENSIONS (already compressed or hardly compressible
+    media) are stored without compression, other files are deflated with settings.ZIP_COMPRESSION_LEVEL.
+    :param name: the name of the file
+    :return: a tuple (compress_type, compresslevel)
+    """
+    if any(
+        has_extension(name.lower(), extension)
+        for extension in settings.ZIP_STORED_EXTENSIONS
+    ):
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, settings.ZIP_COMPRESSION_LEVEL
+
+
+class ZipStreamBuffer:
+    """
+    Unseekable file-like object collecting the bytes a ZipFile writes until they are taken.
+
+    A ZipFile writing to an unseekable file writes the sizes and CRC of each member after its data, so an archive can
+    be sent while it is being written.
+    """
+
+    def __init__(self):
+        """Initialise the ZipStreamBuffer."""
+        self.chunks = list()
+        self.position = 0
+
+    def write(self, data):
+        """
+        Write bytes to this buffer.
+
+        :param data: the bytes to write
+        :return: the number of bytes written
+        """
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        """
+        Get the number of bytes written to this buffer.
+
+        :return: the number of bytes written
+        """
+        return self.position
+
+    def flush(self):
+        """
+        Flush this buffer (nothing to do).
+
+        :return: None
+        """
+        pass
+
+    def take(self):
+        """
+        Take the bytes written since the last call.
+
+        :return: the bytes written since the last call
+        """
+        data = b"".join(self.chunks)
+        self.chunks = list()
+        return data
+
+
+def iter_zip(files, chunk_size=None):
+    """
+    Generate a zip archive of a list of files while it is being written.
+
+    Files are read and compressed in chunks, so memory usage does not depend on the size of the files. Members are
+    stored without the modification time of their file.
+    :param files: a list of tuples (path, name) with the path of a file and the name to store it under in the archive,
+    files that do not exist are skipped
+    :param chunk_size: the number of bytes to read from a file at once, defaults to settings.ZIP_STREAM_CHUNK_SIZE
+    :return: a generator of the bytes of the zip archive
+    """
+    chunk_size = (
+        settings.ZIP_STREAM_CHUNK_SIZE if chunk_size is None else chunk_size
+    )
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path, name in files:
+            if not os.path.isfile(path):
+                continue
+            # ZipFile.open takes the compression of members opened by name from the archive
+            archive.compression, archive.compresslevel = get_zip_compression(
+                name
+            )
+            # ZipFile.open can not switch to ZIP64 after the header of a member is written
+            with open(path, "rb") as source, archive.open(
+                name,
+                "w",
+                force_zip64=os.path.getsize(path) > zipfile.ZIP64_LIMIT,
+            ) as destination:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    destination.write(chunk)
+                    data = buffer.take()
+                    if data:
+                        yield data
+            yield buffer.take()
+    yield buffer.take()
+
+
+FileInfo = namedtuple("FileInfo", ["size", "mtime", "extension"])
+
+
+def get_extension(file_name):
+    """
+    Get the extension of a file name, including all parts after the first dot (e.g. oov.dict for a.oov.dict).
+
+    :param file_name: the file name
+    :return: the extension of the file name without a leading dot, an empty string if the file has no extension
+    """
+    return file_name.lstrip(".").partition(".")[2]
+
+
+def get_suffixes(file_name):
+    """
+    Get all extensions of a file name that start after a dot (e.g. b.oov.dict, oov.dict and dict for a.b.oov.dict).
+
+    :param file_name: the file name
+    :return: a list of extensions without leading dot, longest first
+    """
+    parts = file_name.lstrip(".").split(".")
+    return [".".join(parts[i:]) for i in range(1, len(parts))]
+
+
+def has_extension(file_name, extension):
+    """
+    Check whether a file name has an extension.
+
+    :param file_name: the file name
+    :param extension: the extension, with or without leading dot, possibly consisting of multiple parts (e.g. oov.dict)
+    :return: True if the file name ends with a dot followed by the extension, False otherwise
+    """
+    return file_name.endswith("." + extension.lstrip("."))
+
+
+def split_into_shards(groups, count):
+    """
+    Split groups of related files into shards of about equal size.
+
+    Groups are assigned from large to small to the shard with the smallest total size so far, the files of a group
+    always end up in the same shard.
+    :param groups: a dictionary of group names to tuples (files, size) with a list of file names and their total size
+    :param count: the number of shards to split the groups into
+    :return: a list of at most count non-empty and sorted lists of file names
+    """
+    shards = [(0, index, list()) for index in range(max(1, count))]
+    for name, (files, size) in sorted(
+        groups.items(), key=lambda x: (-x[1][1], x[0])
+    ):
+        total, index, shard = heapq.heappop(shards)
+        shard.extend(files)
+        heapq.heappush(shards, (total + size, index, shard))
+    return [
+        sorted(shard)
+        for _, _, shard in sorted(shards, key=lambda x: x[1])
+        if len(shard) > 0
+    ]
+
+
+def append_file(source, target):
+    """
+    Append the contents of a file to another file.
+
+    A newline is inserted between the two contents if the target file does not end with one, so line-based outputs
+    of CLAM (such as .ctm and .oov files) can be concatenated.
+    :param source: the file to append
+    :param target: the file to append to
+    :return: None
+    """
+    with open(target, "rb+") as out:
+        out.seek(0, os.SEEK_END)
+        if out.tell() > 0:
+            out.seek(-1, os.SEEK_END)
+            if out.read(1) != b"\n":
+                out.write(b"\n")
+        with open(source, "rb") as f:
+            shutil.copyfileobj(f, out)
+
+
+class ProfileMatcher:
+    """
+    Match the files of a project against all profiles of a script in a single pass.
+
+    The input templates of all profiles are grouped in an extension to template lookup, every file is then classified
+    by looking up each of its (multi-dot) extensions.
+    """
+
+    def __init__(self, profiles, templates):
+        """
+        Initialise the ProfileMatcher.
+
+        :param profiles: a list of Profile objects
+        :param templates: a list of InputTemplate objects of these profiles
+        """
+        self.profiles = profiles
+        self.templates = dict()
+        self.by_extension = dict()
+        for template in templates:
+            self.templates.setdefault(
+                template.corresponding_profile_id, list()
+            ).append(template)
+            self.by_extension.setdefault(
+                template.extension.lstrip("."), list()
+            ).append(template)
+
+    def classify(self, file_names):
+        """
+        Assign files to the input templates that accept them.
+
+        :param file_names: a list of file names
+        :return: a dictionary of template ids to lists of file names, in the order of file_names
+        """
+        assignment = dict()
+        for file_name in file_names:
+            for suffix in get_suffixes(file_name):
+                for template in self.by_extension.get(suffix, ()):
+                    assignment.setdefault(template.id, list()).append(file_name)
+        return assignment
+
+    @staticmethod
+    def is_satisfied(template, files):
+        """
+        Check whether the files assigned to an input template satisfy it.
+
+        :param template: the input template
+        :param files: the files assigned to the input template
+        :return: True if a non optional template has at least one file and a unique template has at most one file
+        """
+        if len(files) == 0 and not template.optional:
+            return False
+        elif len(files) > 1 and template.unique:
+            return False
+        else:
+            return True
+
+    def match(self, file_names):
+        """
+        Get the profiles that are satisfied by a list of files.
+
+        :param file_names: a list of file names
+        :return: a list of tuples (profile, assignment) for every valid profile, in which assignment is a dictionary
+        of the template ids of the profile to the file names assigned to them
+        """
+        assignment = self.classify(file_names)
+        matches = list()
+        for profile in self.profiles:
+            templates = self.templates.get(profile.id, list())
+            profile_assignment = {
+                template.id: assignment.get(template.id, list())
+                for template in templates
+            }
+            if all(
+                ProfileMatcher.is_satisfied(
+                    template, profile_assignment[template.id]
+                )
+                for template in templates
+            ):
+                matches.append((profile, profile_assignment))
+        return matches
+
+
+class FileIndex:
+    """
+    Index of the files directly inside a folder.
+
+    Maps every file name to a FileInfo with the size, modification time and extension of the file at the time the
+    folder was scanned. Names are kept in the order in which the folder was listed.
+    """
+
+    def __init__(self, folder, files):
+        """
+        Initialise the FileIndex.
+
+        :param folder: the folder that was indexed
+        :param files: an (ordered) dictionary of file names to FileInfo objects
+        """
+        self.folder = folder
+        self.files = files
+
+    @staticmethod
+    def scan(folder):
+        """
+        Scan a folder and create an index of the files in it.
+
+        :param folder: the folder to scan
+        :return: a FileIndex of the files in the folder, raises a FileNotFoundError if the folder does not exist
+        """
+        files = OrderedDict()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # The file was removed while scanning.
+                    continue
+                files[entry.name] = FileInfo(
+                    stat.st_size, stat.st_mtime, get_extension(entry.name)
+                )
+        return FileIndex(folder, files)
+
+    def names(self):
+        """
+        Get the names of all files in the folder.
+
+        :return: a list of file names
+        """
+        return list(self.files.keys())
+
+    def names_ending_with(self, suffixes):
+        """
+        Get the names of the files ending with a suffix.
+
+        :param suffixes: a suffix or a tuple of suffixes
+        :return: a list of file names ending with (one of) the suffix(es)
+        """
+        return [name for name in self.files.keys() if name.endswith(suffixes)]
+
+    def path(self, name):
+        """
+        Get the full path of a file in the folder.
+
+        :param name: the file name
+        :return: the path of the file
+        """
+        return os.path.join(self.folder, name)
+
+    def __contains__(self, name):
+        """
+        Check whether a file is in the folder.
+
+        :param name: the file name
+        :return: True if the file is in the index, False otherwise
+        """
+        return name in self.files
+
+    def __iter__(self):
+        """
+        Iterate over the file names in the folder.
+
+        :return: an iterator over the file names
+        """
+        return iter(self.files.keys())
+
+    def __len__(self):
+        """
+        Get the number of files in the folder.
+
+        :return: the number of files in the index
+        """
+        return len(self.files)
+
+
+class FileIndexCache:
+    """
+    Process-wide cache of FileIndex objects per folder.
+
+    An index is reused as long as the modification time of its folder does not change, which happens whenever a file
+    is added, removed or renamed. Code that changes the contents of a file in place should call invalidate(). Indexes
+    scanned within RACY_WINDOW seconds of the last folder modification are scanned again on the next request, as a
+    change in the same timestamp tick would not change the modification time.
+    """
+
+    RACY_WINDOW = 1
+
+    def __init__(self, max_size=None):
+        """
+        Initialise the FileIndexCache.
+
+        :param max_size: the maximum number of folders to keep an index of, defaults to settings.FILE_INDEX_CACHE_SIZE
+        """
+        self.max_size = (
+            settings.FILE_INDEX_CACHE_SIZE if max_size is None else max_size
+        )
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, folder):
+        """
+        Get the index of a folder, scanning the folder if there is no valid index cached.
+
+        :param folder: the folder
+        :return: a FileIndex of the folder, raises a FileNotFoundError if the folder does not exist
+        """
+        key = os.path.abspath(folder)
+        mtime = os.stat(key).st_mtime_ns
+        with self.lock:
+            cached = self.indexes.get(key)
+            if cached is not None and cached[0] == mtime:
+                self.indexes.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        scanned_at = time.time_ns()
+        index = FileIndex.scan(folder)
+        if scanned_at - mtime > self.RACY_WINDOW * 10 ** 9:
+            with self.lock:
+                self.indexes[key] = (mtime, index)
+                self.indexes.move_to_end(key)
+                while len(self.indexes) > self.max_size:
+                    self.indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, folder):
+        """
+        Remove the index of a folder from the cache.
+
+        :param folder: the folder
+        :return: None
+        """
+        with self.lock:
+            self.indexes.pop(os.path.abspath(folder), None)
+
+    def clear(self):
+        """
+        Remove all indexes from the cache.
+
+        :return: None
+        """
+        with self.lock:
+            self.indexes.clear()
+
+
+file_index_cache = FileIndexCache()
+
+
+def get_file_index(folder):
+    """
+    Get the (cached) index of the files in a folder.
+
+    :param folder: the folder
+    :return: a FileIndex of the folder, raises a FileNotFoundError if the folder does not exist
+    """
+    return file_index_cache.get(folder)
+
+
+def invalidate_file_index(folder):
+    """
+    Invalidate the cached index of a folder after changing files in it.
+
+    :param folder: the folder
+    :return: None
+    """
+    file_index_cache.invalidate(folder)
+
+
+class ArchiveCache:
+    """
+    Cache of built archives on disk, keyed by a fingerprint of their contents.
+
+    Archives are stored as <key>.zip in the cache folder, outside of the folders they are built from. The modification
+    time of an archive is updated whenever it is used, archives that are not used for max_age seconds are evicted and
+    the least recently used archives are evicted when the cache grows larger than max_size bytes.
+    """
+
+    EXTENSION = ".zip"
+
+    def __init__(self, folder=None, max_age=None, max_size=None):
+        """
+        Initialise the ArchiveCache.
+
+        :param folder: the folder to store the archives in, defaults to settings.ARCHIVE_CACHE_FOLDER or an archives
+        folder in settings.DOWNLOAD_DIR
+        :param max_age: the number of seconds after which an unused archive is evicted, defaults to
+        settings.ARCHIVE_CACHE_MAX_AGE
+        :param max_size: the maximum total size of the archives in bytes, defaults to settings.ARCHIVE_CACHE_MAX_SIZE
+        """
+        self.folder = folder
+        self.max_age = max_age
+        self.max_size = max_size
+
+    def get_folder(self):
+        """
+        Get the folder the archives are stored in, creating it if it does not exist.
+
+        :return: the path of the cache folder
+        """
+        folder = self.folder
+        if folder is None:
+            folder = settings.ARCHIVE_CACHE_FOLDER or os.path.join(
+                settings.DOWNLOAD_DIR, "archives"
+            )
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def get_path(self, key):
+        """
+        Get the path of the archive with a key.
+
+        :param key: the key of the archive
+        :return: the path the archive is stored at
+        """
+        return os.path.join(self.get_folder(), key + self.EXTENSION)
+
+    def get(self, key):
+        """
+        Get a cached archive and mark it as used.
+
+        :param key: the key of the archive
+        :return: the path of the archive, None if the archive is not cached
+        """
+        path = self.get_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_create(self, key, build):
+        """
+        Get a cached archive, building and storing it if it is not cached.
+
+        The archive is built in a temporary file that replaces the cached archive atomically, so concurrent requests
+        never read a partially written archive.
+        :param key: the key of the archive
+        :param build: a function that writes the archive to the path it receives
+        :return: the path of the archive
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+        path = self.get_path(key)
+        fd, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        os.close(fd)
+        try:
+            build(temporary_path)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def tee(self, key, chunks):
+        """
+        Pass through the bytes of an archive while storing them in the cache.
+
+        The archive is stored in the cache only when all bytes passed through, an interrupted archive is removed.
+        :param key: the key of the archive
+        :param chunks: an iterable of the bytes of the archive
+        :return: a generator of the bytes of the archive
+        """
+        path = self.get_path(key)
+        fd, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    yield chunk
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """
+        Remove archives that are too old and the least recently used archives if the cache is too large.
+
+        :param keep: the path of an archive that must not be evicted
+        :return: a list of the paths of the evicted archives
+        """
+        max_age = (
+            settings.ARCHIVE_CACHE_MAX_AGE
+            if self.max_age is None
+            else self.max_age
+        )
+        max_size = (
+            settings.ARCHIVE_CACHE_MAX_SIZE
+            if self.max_size is None
+            else self.max_size
+        )
+        archives = list()
+        with os.scandir(self.get_folder()) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(self.EXTENSION):
+                    stat = entry.stat()
+                    archives.append((stat.st_mtime, stat.st_size, entry.path))
+        archives.sort()
+
+        evicted = list()
+        now = time.time()
+        total_size = sum(size for _, size, _ in archives)
+        for mtime, size, path in archives:
+            if path == keep:
+                continue
+            if now - mtime > max_age or total_size > max_size:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+                evicted.append(path)
+        return evicted
+
+
+archive_cache = ArchiveCache()
+
+
+class ResultCache:
+    """
+    Cache of the output files of CLAM runs on disk, keyed by a fingerprint of the script, parameters and inputs.
+
+    The output files of a run are copied to a <key> folder in the cache folder. The modification time of a folder is
+    updated whenever its outputs are used and the least recently used outputs are evicted when the cache grows larger
+    than max_size bytes.
+    """
+
+    def __init__(self, folder=None, max_size=None):
+        """
+        Initialise the ResultCache.
+
+        :param folder: the folder to store the outputs in, defaults to settings.RESULT_CACHE_FOLDER or a results folder
+        in settings.DOWNLOAD_DIR
+        :param max_size: the maximum total size of the outputs in bytes, defaults to settings.RESULT_CACHE_MAX_SIZE
+        """
+        self.folder = folder
+        self.max_size = max_size
+
+    def get_folder(self):
+        """
+        Get the folder the outputs are stored in, creating it if it does not exist.
+
+        :return: the path of the cache folder
+        """
+        folder = self.folder
+        if folder is None:
+            folder = settings.RESULT_CACHE_FOLDER or os.path.join(
+                settings.DOWNLOAD_DIR, "results"
+            )
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def get_path(self, key):
+        """
+        Get the folder of the outputs with a key.
+
+        :param key: the key of the outputs
+        :return: the path of the folder the outputs are stored in
+        """
+        return os.path.join(self.get_folder(), key)
+
+    def restore(self, key, folder):
+        """
+        Copy cached outputs to a folder and mark them as used.
+
+        :param key: the key of the outputs
+        :param folder: the folder to copy the outputs to, existing files with the same name are replaced
+        :return: a list of the paths of the restored files relative to folder, None if the outputs are not cached
+        """
+        path = self.get_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        restored = list()
+        for directory, _, files in os.walk(path):
+            for file in files:
+                name = os.path.relpath(os.path.join(directory, file), path)
+                target = os.path.join(folder, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                fd, temporary_path = tempfile.mkstemp(
+                    dir=os.path.dirname(target), suffix=".tmp"
+                )
+                os.close(fd)
+                try:
+                    shutil.copyfile(
+                        os.path.join(directory, file), temporary_path
+                    )
+                    os.replace(temporary_path, target)
+                except BaseException:
+                    if os.path.exists(temporary_path):
+                        os.remove(temporary_path)
+                    raise
+                restored.append(name)
+        return restored
+
+    def store(self, key, folder, names):
+        """
+        Copy outputs to the cache.
+
+        The outputs are copied to a temporary folder that is moved into place at once, so concurrent restores never
+        read partially stored outputs.
+        :param key: the key of the outputs
+        :param folder: the folder the outputs are in
+        :param names: the paths of the output files relative to folder
+        :return: None
+        """
+        path = self.get_path(key)
+        if os.path.isdir(path):
+            return
+        temporary_folder = tempfile.mkdtemp(
+            dir=self.get_folder(), suffix=".tmp"
+        )
+        try:
+            for name in names:
+                target = os.path.join(temporary_folder, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(folder, name), target)
+            os.rename(temporary_folder, path)
+        except OSError:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self.evict(keep=path)
+
+    @staticmethod
+    def get_size(folder):
+        """
+        Get the total size of the files in a folder.
+
+        :param folder: the folder
+        :return: the total size in bytes of the files in the folder and its subfolders
+        """
+        return sum(
+            os.path.getsize(os.path.join(directory, file))
+            for directory, _, files in os.walk(folder)
+            for file in files
+        )
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used outputs if the cache is too large.
+
+        :param keep: the path of outputs that must not be evicted
+        :return: a list of the paths of the evicted outputs
+        """
+        max_size = (
+            settings.RESULT_CACHE_MAX_SIZE
+            if self.max_size is None
+            else self.max_size
+        )
+        results = list()
+        with os.scandir(self.get_folder()) as entries:
+            for entry in entries:
+                if entry.is_dir() and not entry.name.endswith(".tmp"):
+                    results.append(
+                        (
+                            entry.stat().st_mtime,
+                            ResultCache.get_size(entry.path),
+                            entry.path,
+                        )
+                    )
+        results.sort()
+
+        evicted = list()
+        total_size = sum(size for _, size, _ in results)
+        for _, size, path in results:
+            if total_size <= max_size:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            evicted.append(path)
+        return evicted
+
+
+result_cache = ResultCache()
+
+
+class BlobStore:
+    """
+    Content-addressed store of files, keyed by the SHA-256 hash of their contents.
+
+    Files in project folders are hard links to the blob with the same contents, so a file that is uploaded to many
+    projects takes up disk space only once. The link count of a blob is its reference count: a blob that is only linked
+    from the store itself is no longer used and is removed when it is released. Files are never linked when the store
+    is on another file system than the file, in which case the file keeps its own copy.
+    """
+
+    FOLDER = "#blobs"
+
+    def __init__(self, folder=None):
+        """
+        Initialise the BlobStore.
+
+        :param folder: the folder to store the blobs in, defaults to settings.BLOB_STORE_FOLDER or a #blobs folder (not
+        a valid user name) in settings.USER_DATA_FOLDER
+        """
+        self.folder = folder
+
+    def get_folder(self):
+        """
+        Get the folder the blobs are stored in.
+
+        :return: the path of the store folder
+        """
+        if self.folder is not None:
+            return self.folder
+        return settings.BLOB_STORE_FOLDER or os.path.join(
+            settings.USER_DATA_FOLDER, BlobStore.FOLDER
+        )
+
+    def get_path(self, content_hash):
+        """
+        Get the path of the blob with a hash.
+
+        :param content_hash: the hexadecimal SHA-256 hash of the contents of the blob
+        :return: the path the blob is stored at
+        """
+        return os.path.join(self.get_folder(), content_hash[:2], content_hash)
+
+    @staticmethod
+    def is_hash(content_hash):
+        """
+        Check whether a string is a SHA-256 hash as used for the names of blobs.
+
+        :param content_hash: the string to check
+        :return: True if the string is a hexadecimal SHA-256 hash, False otherwise
+        """
+        return re.fullmatch(r"[0-9a-f]{64}", content_hash) is not None
+
+    def has(self, content_hash):
+        """
+        Check whether a blob is stored.
+
+        :param content_hash: the hexadecimal SHA-256 hash of the contents of the blob
+        :return: True if the blob is stored, False otherwise
+        """
+        return BlobStore.is_hash(content_hash) and os.path.isfile(
+            self.get_path(content_hash)
+        )
+
+    def add(self, path, content_hash):
+        """
+        Share a file through the store.
+
+        The file becomes the blob if no blob with its hash is stored, otherwise the file is replaced by a link to the
+        stored blob.
+        :param path: the path of the file
+        :param content_hash: the hexadecimal SHA-256 hash of the contents of the file
+        :return: True if the file is linked to the blob, False if the file could not be linked
+        """
+        blob = self.get_path(content_hash)
+        try:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            if os.path.samefile(path, blob):
+                return True
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        try:
+            os.link(path, blob)
+            return True
+        except FileExistsError:
+            return self.link(content_hash, path)
+        except OSError:
+            return False
+
+    def link(self, content_hash, path):
+        """
+        Link a stored blob to a path, replacing the file at the path.
+
+        :param content_hash: the hexadecimal SHA-256 hash of the contents of the blob
+        :param path: the path to link the blob to
+        :return: True if the blob is linked, False if the blob is not stored or can not be linked
+        """
+        if not BlobStore.is_hash(content_hash):
+            return False
+        temporary_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            os.link(self.get_path(content_hash), temporary_path)
+        except OSError:
+            return False
+        try:
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        return True
+
+    def release(self, content_hash):
+        """
+        Remove a blob if it is no longer linked from any file.
+
+        :param content_hash: the hexadecimal SHA-256 hash of the contents of the blob
+        :return: True if the blob is removed, False otherwise
+        """
+        if not BlobStore.is_hash(content_hash):
+            return False
+        blob = self.get_path(content_hash)
+        try:
+            if os.stat(blob).st_nlink > 1:
+                return False
+            os.remove(blob)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def collect(self):
+        """
+        Remove all blobs that are no longer linked from any file.
+
+        :return: the number of removed blobs
+        """
+        removed = 0
+        try:
+            folders = list(os.scandir(self.get_folder()))
+        except FileNotFoundError:
+            return removed
+        for folder in folders:
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if self.release(entry.name):
+                        removed += 1
+        return removed
+
+
+blob_store = BlobStore()
+
+
+class FilteredZipExtractor:
+    """
+    Extract only the accepted members of a zip archive, each streamed straight to its final path.
+
+    Members are extracted to the target folder under their base name (directories in the archive are flattened), a
+    member replaces an existing file with the same name only once it is completely written. The number of members and
+    the total uncompressed size of the accepted members are checked against limits before anything is written.
+    """
+
+    class LimitExceeded(Exception):
+        """Exception to be thrown when an archive has too many members or is too large when uncompressed."""
+
+        pass
+
+    def __init__(self, accept, max_size=None, max_members=None):
+        """
+        Initialise the FilteredZipExtractor.
+
+        :param accept: a function that receives the base name of a member and returns whether to extract it
+        :param max_size: the maximum total uncompressed size in bytes of the accepted members, defaults to
+        settings.UPLOAD_ZIP_MAX_SIZE
+        :param max_members: the maximum number of members in the archive, defaults to settings.UPLOAD_ZIP_MAX_MEMBERS
+        """
+        self.accept = accept
+        self.max_size = (
+            settings.UPLOAD_ZIP_MAX_SIZE if max_size is None else max_size
+        )
+        self.max_members = (
+            settings.UPLOAD_ZIP_MAX_MEMBERS
+            if max_members is None
+            else max_members
+        )
+
+    def extract(self, file, folder):
+        """
+        Extract the accepted members of a zip archive to a folder.
+
+        :param file: the zip archive, a path or a seekable file-like object
+        :param folder: the folder to extract the members to
+        :return: a tuple (extracted, skipped) with lists of the base names of the extracted and the skipped members,
+        raises a LimitExceeded exception if the archive exceeds the limits and a zipfile.BadZipFile if the file is not a
+        zip archive
+        """
+        with zipfile.ZipFile(file) as archive:
+            members = [x for x in archive.infolist() if not x.is_dir()]
+            if len(members) > self.max_members:
+                raise FilteredZipExtractor.LimitExceeded(
+                    "The archive contains more than {} files".format(
+                        self.max_members
+                    )
+                )
+            accepted = list()
+            skipped = list()
+            for member in members:
+                name = os.path.basename(member.filename)
+                if name and self.accept(name):
+                    accepted.append((member, name))
+                elif name:
+                    skipped.append(name)
+            if sum(member.file_size for member, _ in accepted) > self.max_size:
+                raise FilteredZipExtractor.LimitExceeded(
+                    "The files in the archive are larger than {} bytes".format(
+                        self.max_size
+                    )
+                )
+
+            extracted = list()
+            for member, name in accepted:
+                fd, temporary_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as destination, archive.open(
+                        member
+                    ) as source:
+                        shutil.copyfileobj(source, destination)
+                    os.replace(temporary_path, os.path.join(folder, name))
+                except BaseException:
+                    if os.path.exists(temporary_path):
+                        os.remove(temporary_path)
+                    raise
+                extracted.append(name)
+        return extracted, skipped
+
+
+class ChunkedUpload:
+    """
+    A file that is uploaded in chunks, written in place to a preallocated file.
+
+    Every upload has its own folder with a JSON file describing the upload, the (sparse) data file of the final size and
+    a marker file for every received chunk. Chunks can be written concurrently and in any order as every chunk is
+    written at its own offset. The folder of an upload is derived from the name, size and modification time of the
+    uploaded file, so an interrupted upload of the same file is resumed by only sending the missing chunks.
+    """
+
+    INFO_FILE = "info.json"
+    DATA_FILE = "data"
+    CHUNKS_FOLDER = "chunks"
+    COMPLETE_FOLDER = "complete"
+    READ_SIZE = 64 * 1024
+
+    class InvalidChunk(Exception):
+        """Exception to be thrown when a chunk does not fit in the upload."""
+
+        pass
+
+    def __init__(self, folder):
+        """
+        Initialise the ChunkedUpload.
+
+        :param folder: the folder of the upload
+        """
+        self.folder = folder
+        self._info = None
+
+    @staticmethod
+    def get_upload_id(name, size, modified=None):
+        """
+        Get the identifier of the upload of a file.
+
+        :param name: the name of the file
+        :param size: the size of the file in bytes
+        :param modified: the modification time of the file as reported by the client, None if unknown
+        :return: a hexadecimal identifier that is the same for every upload of the same file
+        """
+        return hashlib.sha256(
+            json.dumps([name, size, modified]).encode("utf-8")
+        ).hexdigest()[:32]
+
+    @staticmethod
+    def start(root, name, size, chunk_size=None, modified=None):
+        """
+        Start or resume the upload of a file.
+
+        :param root: the folder to keep the uploads in
+        :param name: the name of the file
+        :param size: the size of the file in bytes
+        :param chunk_size: the size of the chunks in bytes, defaults to settings.UPLOAD_CHUNK_SIZE, ignored when an
+        upload of the file already exists
+        :param modified: the modification time of the file as reported by the client, None if unknown
+        :return: the ChunkedUpload of the file
+        """
+        chunk_size = (
+            settings.UPLOAD_CHUNK_SIZE if chunk_size is None else chunk_size
+        )
+        upload_id = ChunkedUpload.get_upload_id(name, size, modified)
+        folder = os.path.join(root, upload_id)
+        if os.path.isdir(folder):
+            return ChunkedUpload(folder)
+
+        os.makedirs(root, exist_ok=True)
+        temporary_folder = tempfile.mkdtemp(dir=root, suffix=".tmp")
+        try:
+            os.mkdir(
+                os.path.join(temporary_folder, ChunkedUpload.CHUNKS_FOLDER)
+            )
+            with open(
+                os.path.join(temporary_folder, ChunkedUpload.DATA_FILE), "wb"
+            ) as file:
+                file.truncate(size)
+            with open(
+                os.path.join(temporary_folder, ChunkedUpload.INFO_FILE), "w"
+            ) as file:
+                json.dump(
+                    {"name": name, "size": size, "chunk_size": chunk_size}, file
+                )
+            os.rename(temporary_folder, folder)
+        except OSError:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+            if not os.path.isdir(folder):
+                raise
+        return ChunkedUpload(folder)
+
+    @staticmethod
+    def get(root, upload_id):
+        """
+        Get an existing upload.
+
+        :param root: the folder the uploads are kept in
+        :param upload_id: the identifier of the upload
+        :return: the ChunkedUpload, None if there is no upload with this identifier
+        """
+        if re.fullmatch(r"[0-9a-f]{32}", upload_id) is None:
+            return None
+        folder = os.path.join(root, upload_id)
+        if not os.path.isdir(folder):
+            return None
+        return ChunkedUpload(folder)
+
+    @staticmethod
+    def remove_expired(root, max_age=None):
+        """
+        Remove the uploads that have not received a chunk for some time.
+
+        :param root: the folder the uploads are kept in
+        :param max_age: the number of seconds after which an upload expires, defaults to settings.UPLOAD_CHUNK_EXPIRY
+        :return: None
+        """
+        max_age = settings.UPLOAD_CHUNK_EXPIRY if max_age is None else max_age
+        try:
+            entries = list(os.scandir(root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir() and entry.stat().st_mtime < time.time() - max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @property
+    def upload_id(self):
+        """
+        Get the identifier of this upload.
+
+        :return: the identifier of this upload
+        """
+        return os.path.basename(self.folder)
+
+    @property
+    def info(self):
+        """
+        Get the description of this upload.
+
+        :return: a dictionary with the name, size and chunk_size of this upload
+        """
+        if self._info is None:
+            with open(
+                os.path.join(self.folder, ChunkedUpload.INFO_FILE)
+            ) as file:
+                self._info = json.load(file)
+        return self._info
+
+    @property
+    def name(self):
+        """
+        Get the name of the uploaded file.
+
+        :return: the name of the uploaded file
+        """
+        return self.info["name"]
+
+    def get_data_path(self):
+        """
+        Get the path of the file the chunks are written to.
+
+        :return: the path of the data file
+        """
+        return os.path.join(self.folder, ChunkedUpload.DATA_FILE)
+
+    def get_chunk_count(self):
+        """
+        Get the number of chunks of this upload.
+
+        :return: the number of chunks, an empty file consists of a single empty chunk
+        """
+        return max(1, -(-self.info["size"] // self.info["chunk_size"]))
+
+    def get_chunk_range(self, index):
+        """
+        Get the position of a chunk in the uploaded file.
+
+        :param index: the index of the chunk
+        :return: a tuple (offset, length) of the chunk, raises an InvalidChunk exception if the index is out of range
+        """
+        if not 0 <= index < self.get_chunk_count():
+            raise ChunkedUpload.InvalidChunk(
+                "Chunk {} is out of range".format(index)
+            )
+        offset = index * self.info["chunk_size"]
+        return offset, min(self.info["chunk_size"], self.info["size"] - offset)
+
+    def get_received(self):
+        """
+        Get the chunks of this upload that are received.
+
+        :return: a sorted list of the indices of the received chunks
+        """
+        return sorted(
+            int(x)
+            for x in os.listdir(
+                os.path.join(self.folder, ChunkedUpload.CHUNKS_FOLDER)
+            )
+            if x.isdigit()
+        )
+
+    def is_complete(self):
+        """
+        Check whether all chunks of this upload are received.
+
+        :return: True if all chunks are received, False otherwise
+        """
+        return len(self.get_received()) == self.get_chunk_count()
+
+    def write_chunk(self, index, stream):
+        """
+        Write a chunk to its offset in the data file.
+
+        The chunk is only marked as received once it is completely written, a chunk can be written again.
+        :param index: the index of the chunk
+        :param stream: a file-like object to read the chunk from
+        :return: None, raises an InvalidChunk exception if the index is out of range, the stream does not contain
+        exactly the bytes of the chunk or the upload is already completed
+        """
+        offset, length = self.get_chunk_range(index)
+        if os.path.exists(
+            os.path.join(self.folder, ChunkedUpload.COMPLETE_FOLDER)
+        ):
+            raise ChunkedUpload.InvalidChunk("The upload is already completed")
+        fd = os.open(self.get_data_path(), os.O_WRONLY)
+        try:
+            written = 0
+            while written <= length:
+                data = stream.read(
+                    min(ChunkedUpload.READ_SIZE, length - written + 1)
+                )
+                if not data:
+                    break
+                if written + len(data) > length:
+                    written += len(data)
+                    break
+                os.pwrite(fd, data, offset + written)
+                written += len(data)
+        finally:
+            os.close(fd)
+        if written != length:
+            raise ChunkedUpload.InvalidChunk(
+                "Chunk {} must be {} bytes".format(index, length)
+            )
+        open(
+            os.path.join(self.folder, ChunkedUpload.CHUNKS_FOLDER, str(index)),
+            "w",
+        ).close()
+        os.utime(self.folder)
+
+    def claim(self):
+        """
+        Claim the completion of this upload, only a single request can complete an upload.
+
+        :return: True if the completion is claimed, False if it was already claimed
+        """
+        try:
+            os.mkdir(os.path.join(self.folder, ChunkedUpload.COMPLETE_FOLDER))
+        except FileExistsError:
+            return False
+        return True
+
+    def discard(self):
+        """
+        Remove this upload and all of its data.
+
+        :return: None
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class StreamingZipExtractor:
+    """
+    Extract a zip archive while its bytes are arriving.
+
+    Bytes are passed to feed() in order, every member is written to the target directory as soon as all of its bytes
+    are received. The offset attribute is the position in the archive at which the first incomplete member starts, an
+    interrupted extraction can be resumed by creating a new extractor with that offset and feeding it the remaining
+    bytes of the archive.
+    """
+
+    LOCAL_HEADER = struct.Struct("<4sHHHHHLLLHH")
+    LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+    DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+    END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+
+    HEADER = 0
+    DATA = 1
+    DESCRIPTOR = 2
+    DONE = 3
+
+    class UnsupportedArchive(Exception):
+        """Exception to be thrown when an archive can not be extracted while streaming."""
+
+        pass
+
+    def __init__(self, target_directory, offset=0):
+        """
+        Initialise the StreamingZipExtractor.
+
+        :param target_directory: the directory to extract the archive to
+        :param offset: the position in the archive of the first byte that will be fed, must be the start of a member
+        """
+        self.target_directory = target_directory
+        self.offset = offset
+        self.position = offset
+        self.buffer = bytearray()
+        self.state = self.HEADER
+        self.extracted = list()
+        self.member = None
+        self.file = None
+        self.decompressor = None
+        self.remaining = 0
+        self.crc = 0
+
+    @property
+    def done(self):
+        """
+        Check whether all members of the archive are extracted.
+
+        :return: True if the central directory of the archive was reached, False otherwise
+        """
+        return self.state == self.DONE
+
+    def feed(self, data):
+        """
+        Feed the next bytes of the archive to this extractor.
+
+        :param data: the bytes following the previously fed bytes
+        :return: None, raises a zipfile.BadZipFile if the archive is corrupt and an UnsupportedArchive if the archive
+        can not be extracted while streaming
+        """
+        if self.done:
+            return
+        self.buffer += data
+        progress = True
+        while progress and not self.done:
+            if self.state == self.HEADER:
+                progress = self._read_header()
+            elif self.state == self.DATA:
+                progress = self._read_data()
+            else:
+                progress = self._read_descriptor()
+
+    def abort(self):
+        """
+        Remove the partially extracted member, if any.
+
+        :return: None
+        """
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.file.name)
+            self.file = None
+
+    def close(self):
+        """
+        Finish the extraction.
+
+        :return: a list of the names of the extracted members, raises a zipfile.BadZipFile if the archive ended before
+        the central directory was reached
+        """
+        self.abort()
+        if not self.done:
+            raise zipfile.BadZipFile("Archive ended unexpectedly")
+        return self.extracted
+
+    def _consume(self, length):
+        data = bytes(self.buffer[:length])
+        del self.buffer[:length]
+        self.position += len(data)
+        return data
+
+    def _read_header(self):
+        if len(self.buffer) < 4:
+            return False
+        if bytes(self.buffer[:4]) in self.END_SIGNATURES:
+            self.state = self.DONE
+            self.offset = self.position
+            return False
+        if bytes(self.buffer[:4]) != self.LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile("Bad local file header")
+        if len(self.buffer) < self.LOCAL_HEADER.size:
+            return False
+        (
+            _,
+            _,
+            flags,
+            method,
+            _,
+            _,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = self.LOCAL_HEADER.unpack(self.buffer[: self.LOCAL_HEADER.size])
+        header_length = self.LOCAL_HEADER.size + name_length + extra_length
+        if len(self.buffer) < header_length:
+            return False
+        header = self._consume(header_length)
+        name = header[self.LOCAL_HEADER.size :][:name_length]
+        extra = header[self.LOCAL_HEADER.size + name_length :]
+        name = name.decode("utf-8" if flags & 0x800 else "cp437")
+        zip64 = False
+        while len(extra) >= 4:
+            header_id, length = struct.unpack("<HH", extra[:4])
+            if header_id == 0x0001:
+                zip64 = True
+                fields = extra[4 : 4 + length]
+                if size == 0xFFFFFFFF and len(fields) >= 8:
+                    (size,) = struct.unpack("<Q", fields[:8])
+                    fields = fields[8:]
+                if compressed_size == 0xFFFFFFFF and len(fields) >= 8:
+                    (compressed_size,) = struct.unpack("<Q", fields[:8])
+            extra = extra[4 + length :]
+
+        if flags & 0x1:
+            raise self.UnsupportedArchive("Encrypted members are not supported")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise self.UnsupportedArchive(
+                "Compression method {} is not supported".format(method)
+            )
+        streamed = bool(flags & 0x8)
+        if streamed and method == zipfile.ZIP_STORED:
+            raise self.UnsupportedArchive(
+                "Stored members without sizes are not supported"
+            )
+
+        self.member = {
+            "name": name,
+            "crc": crc,
+            "streamed": streamed,
+            "zip64": zip64,
+        }
+        self.remaining = compressed_size
+        self.crc = 0
+        self.decompressor = (
+            zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        )
+        path = self._get_target_path(name)
+        if name.endswith("/") or path is None:
+            if path is not None:
+                os.makedirs(path, exist_ok=True)
+            self.file = None
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(path + ".part", "wb")
+        self.member["path"] = path
+        self.state = self.DATA
+        return True
+
+    def _get_target_path(self, name):
+        parts = [
+            part
+            for part in name.replace("\\", "/").split("/")
+            if part not in ("", ".", "..")
+        ]
+        if not parts:
+            return None
+        path = os.path.join(self.target_directory, *parts)
+        return path + "/" if name.endswith("/") else path
+
+    def _write(self, data):
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+        self.crc = zlib.crc32(data, self.crc)
+        if self.file is not None:
+            self.file.write(data)
+
+    def _read_data(self):
+        if self.member["streamed"]:
+            if not self.buffer:
+                return False
+            data = self._consume(len(self.buffer))
+            self._write(data)
+            if self.decompressor.eof:
+                unused = self.decompressor.unused_data
+                self.buffer[0:0] = unused
+                self.position -= len(unused)
+                self.state = self.DESCRIPTOR
+            return True
+        if self.remaining > 0 and not self.buffer:
+            return False
+        data = self._consume(min(self.remaining, len(self.buffer)))
+        self.remaining -= len(data)
+        self._write(data)
+        if self.remaining == 0:
+            if self.decompressor is not None:
+                data = self.decompressor.flush()
+                self.crc = zlib.crc32(data, self.crc)
+                if self.file is not None:
+                    self.file.write(data)
+            self._finish_member(self.member["crc"])
+        return True
+
+    def _read_descriptor(self):
+        size_length = 8 if self.member["zip64"] else 4
+        if len(self.buffer) < 4:
+            return False
+        signature = bytes(self.buffer[:4]) == self.DATA_DESCRIPTOR_SIGNATURE
+        length = 4 + 2 * size_length + (4 if signature else 0)
+        if len(self.buffer) < length:
+            return False
+        descriptor = self._consume(length)
+        if signature:
+            descriptor = descriptor[4:]
+        (crc,) = struct.unpack("<L", descriptor[:4])
+        self._finish_member(crc)
+        return True
+
+    def _finish_member(self, crc):
+        if self.crc != crc:
+            raise zipfile.BadZipFile(
+                "Bad CRC-32 for file {}".format(self.member["name"])
+            )
+        if self.file is not None:
+            self.file.close()
+            os.replace(self.file.name, self.member["path"])
+            self.extracted.append(self.member["name"])
+            self.file = None
+        self.member = None
+        self.decompressor = None
+        self.offset = self.position
+        self.state = self.HEADER
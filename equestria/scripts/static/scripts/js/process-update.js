@@ -3,20 +3,34 @@ PROCESS_DJANGO_STATUS = document.getElementById("process-django-status");
 PROCESS_CONTINUE = document.getElementById("process-continue-button");
 CONSOLE_OUTPUT = document.getElementById("console_output");
 
+let LOG_CURSOR = 0;
+// Number of seconds the server holds a status request open until the process changes.
+const LONG_POLL_WAIT = 15;
+// Number of milliseconds to wait before requesting the status again after a failed request.
+const RETRY_TIMEOUT = 5000;
+
 function get_status(callback /*, args */) {
     let args = Array.prototype.slice.call(arguments, 2);
     let data = {
-        'csrfmiddlewaretoken': CSRF_TOKEN,
+        'since': LOG_CURSOR,
+        'wait': LONG_POLL_WAIT,
     };
     jQuery(function ($) {
         $.ajax({
-            type: 'POST', url: PROCESS_STATUS_URL, data, dataType: 'json', asynch: true, success:
-            function (returned_data) {
+            type: 'GET', url: PROCESS_STATUS_URL, data, dataType: 'json', ifModified: true, asynch: true, success:
+            function (returned_data, text_status, request) {
+                    if (text_status === "notmodified") {
+                        // The server asks to wait when too many status requests are held open.
+                        let retry_after = parseInt(request.getResponseHeader("Retry-After"));
+                        setTimeout(main_loop, retry_after > 0 ? retry_after * 1000 : 0);
+                        return;
+                    }
                     args.unshift(returned_data);
                     callback.apply(this, args);
                 }
         }).fail(function () {
             console.error("Error while getting information about process.");
+            setTimeout(main_loop, RETRY_TIMEOUT);
         });
     });
 }
@@ -33,15 +47,29 @@ function enable_continue() {
     PROCESS_CONTINUE.style.display = "";
 }
 
-function update_console_output(messages) {
-    let text = "";
+function format_megabytes(bytes) {
+    return (bytes / (1024 * 1024)).toFixed(1) + " MB";
+}
+
+function get_upload_message(upload) {
+    if (upload === undefined || upload.files_total == 0) {
+        return "Uploading";
+    }
+    return "Uploading (" + upload.files_done + " of " + upload.files_total + " files, " +
+        format_megabytes(upload.bytes_done) + " of " + format_megabytes(upload.bytes_total) + ")";
+}
+
+function update_console_output(messages, cursor) {
     for (let i = 0; i < messages.length; i++) {
+        let text = "";
         if (messages[i].time != 'None') {
             text += messages[i].time + ' ';
         }
-        text += messages[i].message + '<br>';
+        text += messages[i].message;
+        CONSOLE_OUTPUT.appendChild(document.createTextNode(text));
+        CONSOLE_OUTPUT.appendChild(document.createElement("br"));
     }
-    CONSOLE_OUTPUT.innerHTML = text;
+    LOG_CURSOR = cursor;
 }
 
 function update_page(returned_data) {
@@ -51,7 +79,7 @@ function update_page(returned_data) {
     }
     else if (returned_data.status == 1) {
         disable_continue();
-        set_status_message("Uploading");
+        set_status_message(get_upload_message(returned_data.upload));
     }
     else if (returned_data.status == 2) {
         disable_continue();
@@ -69,9 +97,19 @@ function update_page(returned_data) {
         enable_continue();
         set_status_message("Done");
     }
-    else if (returned_data.status == -1) {
+    else if (returned_data.status == 6) {
         disable_continue();
-        set_status_message("An error occurred, please try again later");
+        set_status_message("Queued for starting");
+    }
+    else if (returned_data.status == -1) {
+        if (returned_data.error_message) {
+            enable_continue();
+            set_status_message(returned_data.error_message);
+        }
+        else {
+            disable_continue();
+            set_status_message("An error occurred, please try again later");
+        }
     }
     else if (returned_data.status == -2) {
         disable_continue();
@@ -80,12 +118,22 @@ function update_page(returned_data) {
     else {
         set_status_message("Webserver request returned unknown status code.");
     }
-    update_console_output(returned_data.log);
+    update_console_output(returned_data.log, returned_data.cursor);
+}
+
+function is_final_status(status) {
+    return status == 5 || status == -1 || status == -2;
+}
+
+function update_page_and_wait(returned_data) {
+    update_page(returned_data);
+    if (!is_final_status(returned_data.status)) {
+        main_loop();
+    }
 }
 
 function main_loop() {
-    get_status(update_page);
-    setTimeout(main_loop, 5000);
+    get_status(update_page_and_wait);
 }
 
 $(document).ready(function() {
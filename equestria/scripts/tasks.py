@@ -1,13 +1,45 @@
 """Module to handle tasks I guess."""
+import logging
+import time
+from collections import Counter
+
+import clam.common.data
+import clam.common.status
 from background_task import background
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
 import scripts.models
+from scripts.clam_client import AsyncCLAMPool, get_clam_metadata
+
+
+def get_next_script(process):
+    """
+    Get the script that has to run after a process is finished.
+
+    :param process: the process that is finished
+    :return: the G2P script if the process ran the FA script of its project, the FA script otherwise. None if the
+    process does not belong to a project
+    """
+    try:
+        project = scripts.models.Project.objects.get(current_process=process)
+        if process.script == project.pipeline.fa_script:
+            return project.pipeline.g2p_script
+        else:
+            return project.pipeline.fa_script
+    except scripts.models.Project.DoesNotExist:
+        return None
 
 
 @background(schedule=1)
 def update_script(process_id):
     """
-    Spawn a background task to update a script's status.
+    Spawn a background task to update a script's status once.
 
+    Nothing queues this task anymore, running processes are polled by poll_running_processes. It only exists so the
+    update_script tasks that were queued before poll_running_processes was deployed can still run, it performs a
+    single update step and does not reschedule itself. It can be removed once no such tasks are left.
     :param process_id: the id of the process to update (this is not the process itself as it is not JSON serializable)
     :return: None
     """
@@ -15,19 +47,301 @@ def update_script(process_id):
     status = process.get_status()
     if status == scripts.models.STATUS_RUNNING:
         if not process.clam_update():
-            process.status = scripts.models.STATUS_ERROR
-            return
-
-        update_script(process_id)
+            process.set_status(scripts.models.STATUS_ERROR)
     elif status == scripts.models.STATUS_WAITING:
+        process.download_and_delete(next_script=get_next_script(process))
+
+
+@background(schedule=0)
+def start_process(process_id):
+    """
+    Spawn a background task to start a queued process.
+
+    Creating the project on CLAM, uploading the input files and starting CLAM is done by this task instead of during
+    the request that queued the process.
+    :param process_id: the id of the queued process
+    :return: None
+    """
+    process = scripts.models.Process.objects.get(id=process_id)
+    process.start_queued()
+
+
+@background(schedule=0)
+def download_process(process_id):
+    """
+    Spawn a background task to download the output of a process that CLAM finished.
+
+    :param process_id: the id of the process to download
+    :return: None
+    """
+    process = scripts.models.Process.objects.get(id=process_id)
+    process.download_and_delete(next_script=get_next_script(process))
+
+
+def get_due_processes():
+    """
+    Get the running processes that are due for polling.
+
+    :return: a QuerySet of running processes of which the next poll time has passed
+    """
+    return scripts.models.Process.objects.filter(
+        Q(next_poll__isnull=True) | Q(next_poll__lte=timezone.now()),
+        status=scripts.models.STATUS_RUNNING,
+        shard_count=1,
+    )
+
+
+def seconds_until_next_poll(maximum):
+    """
+    Get the number of seconds until the next running process is due for polling.
+
+    :param maximum: the maximum number of seconds to return
+    :return: the number of seconds until the first running process is due, at most maximum
+    """
+    next_poll = scripts.models.Process.objects.filter(
+        status=scripts.models.STATUS_RUNNING, shard_count=1
+    ).aggregate(Min("next_poll"))["next_poll__min"]
+    if next_poll is None:
+        return maximum
+    return max(0, min(maximum, (next_poll - timezone.now()).total_seconds()))
+
+
+def is_permanent_poll_error(error):
+    """
+    Check whether a failed status request can not be resolved by retrying it.
+
+    :param error: the exception raised by the status request
+    :return: True if the project does not exist on CLAM or CLAM reported an error for it, False otherwise
+    """
+    return isinstance(
+        error, (clam.common.data.NotFound, clam.common.data.ParameterError)
+    )
+
+
+def poll_running_processes():
+    """
+    Poll the status of all running processes that are due in one cycle.
+
+    The status requests are issued concurrently from one event loop, with one CLAM client per Script and a bounded
+    number of requests per host. Status transitions and next poll times are written in bulk and a download task is
+    queued for every process that CLAM finished. Failed requests are retried in later cycles, a process only fails
+    after settings.CLAM_POLL_MAX_FAILURES consecutive failures or when CLAM reports an error for its project.
+    :return: a tuple (finished, failed) with lists of the ids of processes that finished or failed in this cycle
+    """
+    processes = list(
+        get_due_processes().select_related("script").order_by("script_id", "id")
+    )
+    finished = list()
+    failed = list()
+    polled = list()
+    with AsyncCLAMPool() as pool:
+        requested = list()
+        calls = list()
+        for process in processes:
+            try:
+                client = pool.get_client(process.script)
+            except Exception as e:
+                logging.error(e)
+                if process.register_poll_failure():
+                    failed.append(process.id)
+                else:
+                    polled.append(process)
+                continue
+            requested.append(process)
+            calls.append(client.get(process.clam_id))
+        results = pool.run(calls)
+
+    for process, data in zip(requested, results):
+        if isinstance(data, Exception):
+            logging.error(data)
+            if process.register_poll_failure(
+                permanent=is_permanent_poll_error(data)
+            ):
+                failed.append(process.id)
+            else:
+                polled.append(process)
+            continue
+        if data.errors:
+            logging.error(
+                "CLAM reported an error for {}: {}".format(
+                    process, data.errormsg
+                )
+            )
+            failed.append(process.id)
+            continue
+        process.poll_failures = 0
+        new_messages = process.update_log_messages_from_xml(data.xml)
+        if data.status == clam.common.status.DONE:
+            finished.append(process.id)
+        else:
+            process.schedule_next_poll(
+                reset=new_messages > 0
+                or scripts.models.Process.is_near_completion(data)
+            )
+            polled.append(process)
+
+    with transaction.atomic():
+        scripts.models.Process.objects.bulk_update(
+            polled, ["next_poll", "poll_interval", "poll_failures"]
+        )
+        scripts.models.Process.objects.filter(
+            id__in=finished, status=scripts.models.STATUS_RUNNING
+        ).update(status=scripts.models.STATUS_WAITING, poll_failures=0)
+        scripts.models.Process.objects.filter(
+            id__in=failed, status=scripts.models.STATUS_RUNNING
+        ).update(status=scripts.models.STATUS_ERROR)
+        for process_id in finished:
+            download_process(process_id)
+
+    return finished, failed
+
+
+def update_sharded_processes():
+    """
+    Finish the running processes of which all shards finished and fail those of which a shard failed.
+
+    Processes of which the input files are split into shards are not polled on CLAM themselves, their status follows
+    from the status of their shards.
+    :return: a list of the ids of the processes that were finished or failed in this cycle
+    """
+    updated = list()
+    for process in scripts.models.Process.objects.filter(
+        status=scripts.models.STATUS_RUNNING, shard_count__gt=1
+    ).order_by("id"):
         try:
-            project = scripts.models.Project.objects.get(
-                current_process=process
+            if process.update_from_shards():
+                updated.append(process.id)
+        except Exception as e:
+            logging.error(
+                "Error while updating the shards of {}: {}".format(process, e)
             )
-            if process.script == project.pipeline.fa_script:
-                next_script = project.pipeline.g2p_script
-            else:
-                next_script = project.pipeline.fa_script
-        except scripts.models.Project.DoesNotExist:
-            next_script = None
-        process.download_and_delete(next_script=next_script)
+    return updated
+
+
+def fetch_clam_metadata(clamclient):
+    """
+    Fetch the CLAM data with the profiles and parameters of a CLAM service and time the request.
+
+    :param clamclient: the CLAM client of the service
+    :return: a tuple (clam_data, duration) with the CLAM data and the number of seconds it took to fetch it
+    """
+    start = time.monotonic()
+    data = get_clam_metadata(
+        clamclient, scripts.models.Process.get_random_clam_id()
+    )
+    return data, time.monotonic() - start
+
+
+def sync_scripts(force=False):
+    """
+    Sync the profiles and parameters of all scripts with their CLAM servers.
+
+    The CLAM data of all scripts is fetched concurrently and only applied to the scripts of which the fingerprint of
+    the profiles and parameters changed.
+    :param force: whether to apply the CLAM data even if its fingerprint did not change
+    :return: a tuple (changed, failed) with lists of the ids of scripts that changed or could not be synced
+    """
+    script_list = list(scripts.models.Script.objects.order_by("id"))
+    changed = list()
+    failed = list()
+    with AsyncCLAMPool() as pool:
+        requested = list()
+        calls = list()
+        for script in script_list:
+            try:
+                client = pool.get_client(script)
+            except Exception as e:
+                logging.error(e)
+                failed.append(script.id)
+                continue
+            requested.append(script)
+            calls.append(client.run(fetch_clam_metadata, client.clamclient))
+        results = pool.run(calls)
+
+    for script, result in zip(requested, results):
+        if isinstance(result, Exception):
+            logging.error(
+                "Error while syncing script {}: {}".format(script, result)
+            )
+            failed.append(script.id)
+            continue
+        data, duration = result
+        try:
+            if script.sync(data, duration, force=force):
+                changed.append(script.id)
+        except Exception as e:
+            logging.error("Error while syncing script {}: {}".format(script, e))
+            failed.append(script.id)
+    return changed, failed
+
+
+def get_in_flight_per_host():
+    """
+    Get the number of processes that occupy each CLAM host.
+
+    :return: a Counter with the number of queued, running and downloading processes per CLAM hostname, processes that
+    are split into shards are counted by their shards
+    """
+    return Counter(
+        scripts.models.Process.objects.filter(
+            status__in=scripts.models.IN_FLIGHT_STATUSES, shard_count=1
+        ).values_list("script__hostname", flat=True)
+    )
+
+
+def schedule_batches(max_in_flight_per_host=None):
+    """
+    Advance the projects of all batches and start new processes while the CLAM hosts have room for them.
+
+    Projects of which the process finished move on to the next step of their pipeline, after which projects are
+    started in the order their batches were created until every CLAM host runs max_in_flight_per_host processes. A project
+    that raises an error while advancing or starting fails, the other projects are scheduled as usual.
+    :param max_in_flight_per_host: the number of processes to keep in flight per CLAM host, defaults to
+    settings.BATCH_MAX_IN_FLIGHT_PER_HOST
+    :return: a tuple (advanced, started) with lists of the ids of the batch projects that moved to another step or
+    were started in this cycle
+    """
+    if max_in_flight_per_host is None:
+        max_in_flight_per_host = settings.BATCH_MAX_IN_FLIGHT_PER_HOST
+    BatchProject = scripts.models.BatchProject
+
+    advanced = list()
+    for entry in BatchProject.objects.filter(
+        step__in=BatchProject.ACTIVE_STEPS, process__isnull=False
+    ).select_related("process", "project"):
+        try:
+            if entry.advance():
+                advanced.append(entry.id)
+        except Exception as e:
+            logging.error("Error while advancing {}: {}".format(entry, e))
+            entry.fail("Error while advancing the project: {}".format(e))
+
+    in_flight = get_in_flight_per_host()
+    started = list()
+    for entry in (
+        BatchProject.objects.filter(
+            step__in=BatchProject.ACTIVE_STEPS, process__isnull=True
+        )
+        .select_related(
+            "project__pipeline__fa_script", "project__pipeline__g2p_script"
+        )
+        .order_by("batch_id", "id")
+    ):
+        try:
+            hostname = entry.get_script().hostname
+            if (
+                in_flight[hostname] >= max_in_flight_per_host
+                or not entry.project.can_start_new_process()
+            ):
+                continue
+            if entry.start():
+                in_flight[hostname] += 1
+                started.append(entry.id)
+        except Exception as e:
+            logging.error("Error while starting {}: {}".format(entry, e))
+            entry.fail("Error while starting the project: {}".format(e))
+
+    scripts.models.Batch.objects.filter(finished__isnull=True).exclude(
+        entries__step__in=BatchProject.ACTIVE_STEPS
+    ).update(finished=timezone.now())
+    return advanced, started
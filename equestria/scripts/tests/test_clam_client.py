@@ -0,0 +1,302 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import clam.common.client
+import clam.common.data
+import clam.common.formats
+import clam.common.status
+from django.test import SimpleTestCase, TestCase
+from scripts.clam_client import (
+    AsyncCLAMPool,
+    CLAMClientPool,
+    PooledCLAMClient,
+    client_pool,
+)
+from scripts.models import Script
+
+_statusxml = """<?xml version="1.0" encoding="UTF-8"?>
+<clam id="standin" name="Stand-in CLAM" baseurl="http://localhost/" project="{}" user="anonymous">
+    <status code="1" message="Running" completion="50">
+        <log time="12/Feb/2018 09:15:32">Started</log>
+    </status>
+</clam>"""
+
+
+class StandInCLAMHandler(BaseHTTPRequestHandler):
+    """Request handler answering status requests like a CLAM server would."""
+
+    delay = 0.2
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        with StandInCLAMHandler.lock:
+            StandInCLAMHandler.in_flight += 1
+            StandInCLAMHandler.max_in_flight = max(
+                StandInCLAMHandler.max_in_flight, StandInCLAMHandler.in_flight
+            )
+        time.sleep(self.delay)
+        body = _statusxml.format(self.path.strip("/")).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with StandInCLAMHandler.lock:
+            StandInCLAMHandler.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DummyScript:
+    """Script-like object returning a CLAM client for the stand-in server."""
+
+    def __init__(self, pk, hostname):
+        self.pk = pk
+        self.hostname = hostname
+
+    def get_clam_server(self):
+        return clam.common.client.CLAMClient(self.hostname)
+
+
+class StandInCLAMServerMixin:
+    """Run a stand-in CLAM server during every test."""
+
+    def setUp(self):
+        StandInCLAMHandler.in_flight = 0
+        StandInCLAMHandler.max_in_flight = 0
+        self.server = ThreadingHTTPServer(("localhost", 0), StandInCLAMHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.hostname = "http://localhost:{}/".format(
+            self.server.server_address[1]
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class TestAsyncCLAMPool(StandInCLAMServerMixin, SimpleTestCase):
+    """Test the asynchronous CLAM client layer against a local stand-in CLAM server."""
+
+    def test_get_status(self):
+        """Test that status requests are parsed into CLAM data."""
+        with AsyncCLAMPool() as pool:
+            client = pool.get_client(DummyScript(1, self.hostname))
+            results = pool.run(
+                [client.get("project{}".format(i)) for i in range(3)]
+            )
+        self.assertEqual(len(results), 3)
+        for i, data in enumerate(results):
+            self.assertEqual(data.status, clam.common.status.RUNNING)
+            self.assertEqual(data.project, "project{}".format(i))
+
+    def test_concurrency_limit_per_host(self):
+        """Test that requests run concurrently but never exceed the per host limit."""
+        with AsyncCLAMPool(max_connections_per_host=2) as pool:
+            client = pool.get_client(DummyScript(1, self.hostname))
+            other = pool.get_client(DummyScript(2, self.hostname))
+            self.assertIsNot(client, other)
+            self.assertIs(
+                client, pool.get_client(DummyScript(1, self.hostname))
+            )
+            start = time.time()
+            results = pool.run(
+                [client.get("project{}".format(i)) for i in range(3)]
+                + [other.get("project{}".format(i)) for i in range(3)]
+            )
+            duration = time.time() - start
+        self.assertFalse(any(isinstance(x, Exception) for x in results))
+        self.assertEqual(StandInCLAMHandler.max_in_flight, 2)
+        self.assertLess(duration, 6 * StandInCLAMHandler.delay)
+
+    def test_exceptions_are_returned(self):
+        """Test that a failing request does not cancel the other requests."""
+        with AsyncCLAMPool() as pool:
+            client = pool.get_client(DummyScript(1, self.hostname))
+            broken = pool.get_client(DummyScript(2, "http://localhost:1/"))
+            results = pool.run([client.get("project"), broken.get("project")])
+        self.assertEqual(results[0].status, clam.common.status.RUNNING)
+        self.assertIsInstance(results[1], Exception)
+
+
+class TestCLAMClientPool(StandInCLAMServerMixin, TestCase):
+    """Test the process-wide pool of keep-alive CLAM clients."""
+
+    def setUp(self):
+        super(TestCLAMClientPool, self).setUp()
+        StandInCLAMHandler.delay = 0
+        self.script = Script.objects.create(
+            name="standin", hostname=self.hostname
+        )
+
+    def tearDown(self):
+        StandInCLAMHandler.delay = 0.2
+        client_pool.clear()
+        super(TestCLAMClientPool, self).tearDown()
+
+    def test_client_is_reused(self):
+        """Test that the same client is returned for the same script."""
+        pool = CLAMClientPool()
+        client = pool.get_client(self.script)
+        self.assertIsInstance(client, PooledCLAMClient)
+        self.assertIs(client, pool.get_client(self.script))
+        statistics = pool.statistics()
+        self.assertEqual(statistics["hits"], 1)
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["hit_rate"], 0.5)
+
+    def test_pooled_client_requests(self):
+        """Test that status requests are sent through the session of the client."""
+        pool = CLAMClientPool()
+        for i in range(3):
+            data = pool.get_client(self.script).get("project{}".format(i))
+            self.assertEqual(data.status, clam.common.status.RUNNING)
+            self.assertEqual(data.project, "project{}".format(i))
+        statistics = pool.statistics()
+        self.assertEqual(statistics["requests"], 3)
+
+    def test_upload_error(self):
+        """Test that a rejected upload raises the error parsed from the CLAM response."""
+        client = PooledCLAMClient(self.hostname)
+        self.addCleanup(client.close)
+        template = clam.common.data.InputTemplate(
+            "text",
+            clam.common.formats.PlainTextFormat,
+            "Text",
+            extension="txt",
+        )
+        response = MagicMock(
+            status_code=403,
+            text="<clamupload><upload><error>Bad file</error></upload></clamupload>",
+        )
+        with tempfile.NamedTemporaryFile(suffix=".txt") as file:
+            with patch.object(
+                client.session, "request", return_value=response
+            ) as request:
+                with self.assertRaises(clam.common.data.UploadError):
+                    client.addinputfile(
+                        "project", template, file.name, language="nl"
+                    )
+        request.assert_called_once()
+        method, url = request.call_args[0]
+        self.assertEqual(method, "POST")
+        self.assertTrue(
+            url.endswith("project/input/{}".format(os.path.basename(file.name)))
+        )
+        self.assertEqual(
+            dict(request.call_args[1]["data"].fields)["language"], "nl"
+        )
+        self.assertEqual(client.request_count, 1)
+
+    def test_upload_authenticated(self):
+        """Test that uploads with authentication send the file and metadata file as a form with a shared auth object."""
+        client = PooledCLAMClient(
+            self.hostname, "user", "password", basicauth=False
+        )
+        self.addCleanup(client.close)
+        self.assertIs(
+            client.initrequest()["auth"], client.initrequest()["auth"]
+        )
+        template = clam.common.data.InputTemplate(
+            "text",
+            clam.common.formats.PlainTextFormat,
+            "Text",
+            extension="txt",
+        )
+        response = MagicMock(
+            status_code=200, text="<clamupload><upload></upload></clamupload>"
+        )
+        with tempfile.NamedTemporaryFile(
+            suffix=".txt"
+        ) as file, tempfile.NamedTemporaryFile() as metafile:
+            with patch.object(
+                client.session, "request", return_value=response
+            ) as request:
+                self.assertTrue(
+                    client.addinputfile(
+                        "project",
+                        template,
+                        file.name,
+                        filename="a.txt",
+                        metafile=metafile.name,
+                    )
+                )
+        kwargs = request.call_args[1]
+        self.assertIs(kwargs["auth"], client.auth)
+        self.assertEqual(kwargs["data"], {"inputtemplate": "text"})
+        self.assertEqual(
+            [(x, y[0]) for x, y in kwargs["files"]],
+            [("file", "a.txt"), ("metafile", ".a.txt.METADATA")],
+        )
+
+    def test_request_errors(self):
+        """Test that error responses raise the exceptions CLAMClient raises."""
+        client = PooledCLAMClient(self.hostname)
+        self.addCleanup(client.close)
+        with patch.object(
+            client.session,
+            "request",
+            return_value=MagicMock(status_code=403, text="Forbidden"),
+        ):
+            with self.assertRaises(clam.common.data.PermissionDenied):
+                client.get("project")
+        with patch.object(
+            client.session,
+            "request",
+            return_value=MagicMock(status_code=405, text=""),
+        ):
+            with self.assertRaisesRegex(clam.common.data.ServerError, "DELETE"):
+                client.request("project", "DELETE")
+
+    def test_host_slots(self):
+        """Test that clients of the same host share their slots and downloads hold a slot until they are consumed."""
+        pool = CLAMClientPool()
+        other = Script.objects.create(name="other", hostname=self.hostname)
+        client = pool.get_client(self.script)
+        self.assertIs(client.slots, pool.get_client(other).slots)
+
+        client = PooledCLAMClient(
+            self.hostname, slots=threading.BoundedSemaphore(1)
+        )
+        self.addCleanup(client.close)
+        response = MagicMock(status_code=200)
+        response.iter_content.return_value = iter([b"a", b"b"])
+        with patch.object(client.session, "request", return_value=response):
+            offset, chunks = client.iter_archive("project")
+            self.assertFalse(client.slots.acquire(blocking=False))
+            self.assertEqual(list(chunks), [b"a", b"b"])
+        response.close.assert_called_once()
+        self.assertTrue(client.slots.acquire(blocking=False))
+        client.slots.release()
+
+        with patch.object(
+            client.session,
+            "request",
+            return_value=MagicMock(status_code=404, text="Not found"),
+        ):
+            with self.assertRaises(clam.common.data.NotFound):
+                client.iter_archive("project")
+            with self.assertRaises(clam.common.data.NotFound):
+                client.downloadarchive("project", io.BytesIO())
+        self.assertTrue(client.slots.acquire(blocking=False))
+
+    def test_invalidated_on_save(self):
+        """Test that saving a script invalidates its clients."""
+        client = self.script.get_clam_server()
+        self.assertIs(client, self.script.get_clam_server())
+        self.script.username = "user"
+        self.script.password = "password"
+        self.script.save()
+        new_client = self.script.get_clam_server()
+        self.assertIsNot(client, new_client)
+        self.assertTrue(new_client.authenticated)
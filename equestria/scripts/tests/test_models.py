@@ -8,11 +8,22 @@ from scripts.models import (
     FloatParameter,
     TextParameter,
     StringParameter,
+    BooleanParameter,
+    ChoiceParameter,
+    Choice,
 )
 import os
 import multiprocessing
 from django.core.exceptions import ValidationError
 from unittest.mock import patch
+from scripts.services import FileIndex, FileInfo, get_extension
+
+
+def file_index(names):
+    """Create a file index of the given file names in a non-existing folder."""
+    return FileIndex(
+        "test", {name: FileInfo(0, 0, get_extension(name)) for name in names},
+    )
 
 
 class ScriptModelTest(TestCase):
@@ -117,7 +128,7 @@ class ScriptModelTest(TestCase):
         name = "File with extension txt"
         self.assertEquals(self.input_template.__str__(), name)
 
-    @patch("os.listdir", return_value="")
+    @patch("scripts.models.get_file_index", return_value=file_index(""))
     def test_input_template_is_valid_no_files_not_optional_not_unique(
         self, a=""
     ):
@@ -135,7 +146,7 @@ class ScriptModelTest(TestCase):
         )
         self.assertEquals(self.input_template.is_valid("test"), False)
 
-    @patch("os.listdir", return_value="")
+    @patch("scripts.models.get_file_index", return_value=file_index(""))
     def test_input_template_is_valid_no_files_optional_not_unique(self, a=""):
         """Test for no files."""
         self.input_template = InputTemplate.objects.create(
@@ -151,7 +162,10 @@ class ScriptModelTest(TestCase):
         )
         self.assertEquals(self.input_template.is_valid("test"), True)
 
-    @patch("os.listdir", return_value=["a.txt", "b.txt"])
+    @patch(
+        "scripts.models.get_file_index",
+        return_value=file_index(["a.txt", "b.txt"]),
+    )
     def test_input_template_is_valid_some_files_not_optional_not_unique(
         self, a=""
     ):
@@ -169,7 +183,10 @@ class ScriptModelTest(TestCase):
         )
         self.assertEquals(self.input_template.is_valid("test"), True)
 
-    @patch("os.listdir", return_value=["a.txt", "b.txt"])
+    @patch(
+        "scripts.models.get_file_index",
+        return_value=file_index(["a.txt", "b.txt"]),
+    )
     def test_input_template_is_valid_some_files_not_optional_unique(self, a=""):
         """Test valid with some files and unique."""
         self.input_template = InputTemplate.objects.create(
@@ -185,7 +202,7 @@ class ScriptModelTest(TestCase):
         )
         self.assertEquals(self.input_template.is_valid("test"), False)
 
-    @patch("os.listdir", return_value=[])
+    @patch("scripts.models.get_file_index", return_value=file_index([]))
     def test_input_template_is_valid_for_no_files_not_optional_not_unique(
         self, a=""
     ):
@@ -203,7 +220,10 @@ class ScriptModelTest(TestCase):
         )
         self.assertEquals(self.input_template.is_valid_for("test"), False)
 
-    @patch("os.listdir", return_value=["a.txt", "b.txt", "c.wav"])
+    @patch(
+        "scripts.models.get_file_index",
+        return_value=file_index(["a.txt", "b.txt", "c.wav"]),
+    )
     def test_input_template_is_valid_for_some_files_not_optional_not_unique(
         self, a=""
     ):
@@ -326,3 +346,73 @@ class ScriptModelTest(TestCase):
         sp.set_preset("Fluttershy")
         self.assertEquals("Fluttershy", sp.get_value())
         self.assertEquals("Fluttershy", sp.value)
+
+
+class ResolvedParameterTest(TestCase):
+    """Tests the cached resolved parameters of a script."""
+
+    def setUp(self):
+        """Create a script with a boolean and a choice parameter."""
+        self.script = Script.objects.create(name="script", hostname="na")
+        base = BaseParameter.objects.create(
+            name="boolean",
+            corresponding_script=self.script,
+            preset=True,
+            type=BaseParameter.BOOLEAN_TYPE,
+        )
+        BooleanParameter.objects.create(base=base, value=True)
+        base = BaseParameter.objects.create(
+            name="choice",
+            corresponding_script=self.script,
+            type=BaseParameter.CHOICE_TYPE,
+        )
+        self.choice_parameter = ChoiceParameter.objects.create(base=base)
+        self.choice = Choice.objects.create(
+            corresponding_choice_parameter=self.choice_parameter, value="a"
+        )
+        self.script.refresh_from_db()
+
+    def test_resolved_parameters_cached(self):
+        """Test that the parameters are loaded once and then read from the cache."""
+        with self.assertNumQueries(2):
+            self.script.get_resolved_parameters()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.script.get_default_parameter_values(), {"boolean": True}
+            )
+            self.assertEqual(
+                [x.name for x in self.script.get_variable_parameters()],
+                ["choice"],
+            )
+            self.assertEqual(
+                self.script.construct_variable_parameter_values(
+                    {"choice": str(self.choice.pk), "boolean": "no"}
+                ),
+                {"choice": "a"},
+            )
+            self.assertEqual(
+                len(self.script.get_unsatisfied_parameters(["boolean"])), 1
+            )
+
+    def test_resolved_parameters_invalidated(self):
+        """Test that changing a parameter invalidates the cached parameters."""
+        parameter = self.script.get_variable_parameters()[0]
+        self.assertEqual(parameter.get_choices(), [(self.choice.pk, "a")])
+        Choice.objects.create(
+            corresponding_choice_parameter=self.choice_parameter, value="b"
+        )
+        self.script.refresh_from_db()
+        parameter = self.script.get_variable_parameters()[0]
+        self.assertEqual([x for _, x in parameter.get_choices()], ["a", "b"])
+
+    def test_save_keeps_parameters_version(self):
+        """Test that saving an outdated script does not restore an old parameters version."""
+        script = Script.objects.get(pk=self.script.pk)
+        Script.invalidate_parameters(self.script.pk)
+        script.name = "renamed"
+        script.save()
+        self.script.refresh_from_db()
+        self.assertEqual(self.script.name, "renamed")
+        self.assertEqual(
+            self.script.parameters_version, script.parameters_version + 1
+        )
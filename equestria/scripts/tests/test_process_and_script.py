@@ -1,15 +1,22 @@
 import clam.common.parameters
 import clam.common.status
 import datetime
+import io
+import json
 import os
 import pathlib
 import pytz
 import shutil
+import tempfile
+import zipfile
 from unittest.mock import patch
 
+from background_task.models import Task
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from scripts.models import (
     Script,
     Process,
@@ -19,11 +26,17 @@ from scripts.models import (
     Profile,
     InputTemplate,
     BooleanParameter,
+    Choice,
     STATUS_CREATED,
     STATUS_RUNNING,
+    STATUS_WAITING,
     STATUS_FINISHED,
+    STATUS_QUEUED,
+    STATUS_ERROR,
     Project,
 )
+from scripts.services import StreamingZipExtractor
+from scripts.tasks import get_due_processes, update_sharded_processes
 
 _umodel = get_user_model()
 _clamID = 1
@@ -95,6 +108,55 @@ class DummyClamServer:
             self.unique = True
             self.acceptarchive = True
 
+    class DummyClamProfile:
+        """This dummy profile object mocks a clam profile object"""
+
+        def __init__(self, input):
+            self.input = input
+
+    class DummyRefreshData:
+        """This dummy Clam data object mocks the clam data of a refresh"""
+
+        def __init__(self, parameters, profiles, project="refresh"):
+            self.parameters = parameters
+            self.profiles = profiles
+            self.xml = (
+                '<clam project="{}"><profiles>{}</profiles>'
+                "<parameters>{}</parameters></clam>".format(
+                    project,
+                    "".join(
+                        '<input id="{}"/>'.format(x.id)
+                        for profile in profiles
+                        for x in profile.input
+                    ),
+                    "".join(
+                        '<{} id="{}"/>'.format(x.__class__.__name__, name)
+                        for name, x in parameters.items()
+                    ),
+                )
+            )
+
+        def passparameters(self):
+            return {name: None for name in self.parameters.keys()}
+
+        def parameter(self, name):
+            return self.parameters[name]
+
+    class DummyRefreshClam:
+        """This dummy Clam client returns clam data for a refresh"""
+
+        def __init__(self, data):
+            self.data = data
+
+        def create(self, id):
+            pass
+
+        def get(self, id):
+            return self.data
+
+        def delete(self, id):
+            pass
+
     class DummyClamStatus:
         """This dummy Clam status object mocks a clam status object"""
 
@@ -238,6 +300,92 @@ class Test_ProcessMethods(TestCase):
             alleq = alleq and (msg in logmessages[c].message)
         self.assertEquals(alleq, True)
 
+    def test_xml_feed_incremental(self):
+        """Tests that only log messages after the high-water mark are added"""
+        teststr = self.readXML("xmlmock.xml")
+        self.assertEqual(
+            self.dummyProcess.update_log_messages_from_xml(teststr), 2
+        )
+        self.assertEqual(
+            self.dummyProcess.update_log_messages_from_xml(teststr), 0
+        )
+        newer = teststr.replace(
+            "<status>", '<status>\n<log time="later">Another message</log>'
+        )
+        self.assertEqual(
+            self.dummyProcess.update_log_messages_from_xml(newer), 1
+        )
+        logmessages = self.dummyProcess.get_status_messages()
+        self.assertEqual(len(logmessages), 3)
+        self.assertEqual(logmessages[2].message, "Another message")
+        self.assertEqual(logmessages[2].index, 2)
+        self.assertEqual(
+            Process.objects.get(pk=self.dummyProcess.pk).log_high_water, 3
+        )
+
+    def test_xml_feed_shards(self):
+        """Tests that the log messages of shards are added to the log of their parent"""
+        teststr = self.readXML("xmlmock.xml")
+        self.dummyProcess.shard_count = 2
+        self.dummyProcess.save()
+        shards = [
+            Process.objects.create(
+                script=self.dummyscript,
+                folder=self.folder,
+                parent=self.dummyProcess,
+            )
+            for _ in range(2)
+        ]
+        shards[1].update_log_messages_from_xml(teststr)
+        shards[0].update_log_messages_from_xml(teststr)
+        shards[0].update_log_messages_from_xml(teststr)
+        logmessages = list(self.dummyProcess.get_status_messages())
+        self.assertEqual([x.index for x in logmessages], [0, 1, 2, 3])
+        self.assertEqual(
+            [x.message.split(":")[0] for x in logmessages],
+            ["Shard 2 of 2"] * 2 + ["Shard 1 of 2"] * 2,
+        )
+        self.assertEqual(
+            [x.message for x in logmessages[:2]],
+            [
+                "Shard 2 of 2: {}".format(x.message)
+                for x in shards[1].get_status_messages()
+            ],
+        )
+        self.assertEqual(
+            Process.objects.get(pk=self.dummyProcess.pk).log_high_water, 4
+        )
+
+    def test_xml_feed_rerun(self):
+        """Tests that the log messages of a re-run are stored from the start"""
+        self.make_tempdir()
+        self.writeFile(f"somefile{_templatevars['extension']}")
+        teststr = self.readXML("xmlmock.xml")
+        self.dummyProcess.update_log_messages_from_xml(teststr)
+        self.dummyProcess.update_log_messages_from_xml(
+            teststr.replace(
+                "<status>", '<status>\n<log time="later">Old message</log>'
+            )
+        )
+        self.assertEqual(self.dummyProcess.log_high_water, 3)
+
+        self.dummyProcess.cleanup()
+        with patch.object(
+            self.dummyscript,
+            "get_clam_server",
+            new=DummyClamServer.spawn_dummyClam,
+        ):
+            self.assertTrue(self.dummyProcess.start(self.dummyprofile))
+        self.assertEqual(self.dummyProcess.log_high_water, 0)
+        self.assertEqual(len(self.dummyProcess.get_status_messages()), 0)
+
+        self.assertEqual(
+            self.dummyProcess.update_log_messages_from_xml(teststr), 2
+        )
+        self.assertEqual(
+            [x.index for x in self.dummyProcess.get_status_messages()], [0, 1]
+        )
+
     def test_timeparseNoException(self):
         """Tests whether the timeparse works"""
         dummydate = r"12/Feb/2018 09:15:32"
@@ -587,6 +735,205 @@ class Test_ProcessMethods(TestCase):
             _dummyParameterInputs,
         )
 
+    def refresh_dummyscript(self, parameters, profiles):
+        """Refresh the dummy script with CLAM data of the given parameters and profiles"""
+        data = DummyClamServer.DummyRefreshData(parameters, profiles)
+        with patch.object(
+            self.dummyscript,
+            "get_clam_server",
+            new=lambda: DummyClamServer.DummyRefreshClam(data),
+        ):
+            self.dummyscript.refresh()
+
+    def test_refresh(self):
+        """
+        Tests that a refresh creates the parameters and profiles of the CLAM data
+        """
+        self.refresh_dummyscript(
+            _dummyClamParams,
+            [
+                DummyClamServer.DummyClamProfile(
+                    [DummyClamServer.DummyTemplate()]
+                )
+            ],
+        )
+        self.assertEqual(
+            sorted(x.name for x in self.dummyscript.get_parameters()),
+            sorted(_dummyClamParams.keys()),
+        )
+        self.assertEqual(
+            list(
+                Choice.objects.filter(
+                    corresponding_choice_parameter__base__corresponding_script=self.dummyscript
+                ).values_list("value", flat=True)
+            ),
+            ["sure", "whatever"],
+        )
+        profile = Profile.objects.get(script=self.dummyscript)
+        self.assertEqual([x.template_id for x in profile.templates], ["someId"])
+
+    def test_refresh_unchanged(self):
+        """
+        Tests that a refresh without changes leaves all rows and presets alone
+        """
+        profiles = [
+            DummyClamServer.DummyClamProfile([DummyClamServer.DummyTemplate()])
+        ]
+        self.refresh_dummyscript(_dummyClamParams, profiles)
+        BaseParameter.objects.get(
+            corresponding_script=self.dummyscript, name="bool"
+        ).get_typed_parameter().set_preset(True)
+        parameters = sorted(
+            self.dummyscript.get_parameters().values_list("id", flat=True)
+        )
+        templates = list(InputTemplate.objects.values_list("id", flat=True))
+        choices = list(Choice.objects.values_list("id", flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.refresh_dummyscript(_dummyClamParams, profiles)
+        self.assertLess(len(queries), 20)
+        self.assertEqual(
+            sorted(
+                self.dummyscript.get_parameters().values_list("id", flat=True)
+            ),
+            parameters,
+        )
+        self.assertEqual(
+            list(InputTemplate.objects.values_list("id", flat=True)), templates
+        )
+        self.assertEqual(
+            list(Choice.objects.values_list("id", flat=True)), choices
+        )
+        self.assertEqual(
+            self.dummyscript.get_default_parameter_values(), {"bool": True}
+        )
+
+    def test_refresh_changed(self):
+        """
+        Tests that a refresh only applies the differences with the CLAM data
+        """
+        template = DummyClamServer.DummyTemplate()
+        self.refresh_dummyscript(
+            _dummyClamParams, [DummyClamServer.DummyClamProfile([template])]
+        )
+        choice_parameter = BaseParameter.objects.get(
+            corresponding_script=self.dummyscript, name="choice"
+        ).get_typed_parameter()
+        choice_parameter.set_preset("whatever")
+        kept = BaseParameter.objects.get(
+            corresponding_script=self.dummyscript, name="string"
+        )
+        template_id = InputTemplate.objects.get(template_id="someId").pk
+
+        parameters = dict(_dummyClamParams)
+        del parameters["text"]
+        parameters["float"] = clam.common.parameters.IntegerParameter("a", "a")
+        parameters["choice"] = clam.common.parameters.ChoiceParameter(
+            "a", "a", "description", choices=["sure", "other"]
+        )
+        template.label = "otherlabel"
+        other_template = DummyClamServer.DummyTemplate()
+        other_template.id = "otherId"
+        self.refresh_dummyscript(
+            parameters,
+            [
+                DummyClamServer.DummyClamProfile([template]),
+                DummyClamServer.DummyClamProfile([other_template]),
+            ],
+        )
+
+        self.assertEqual(
+            sorted(x.name for x in self.dummyscript.get_parameters()),
+            sorted(parameters.keys()),
+        )
+        self.assertTrue(BaseParameter.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(
+            BaseParameter.objects.get(
+                corresponding_script=self.dummyscript, name="float"
+            ).type,
+            BaseParameter.INTEGER_TYPE,
+        )
+        self.assertEqual(
+            list(
+                Choice.objects.filter(
+                    corresponding_choice_parameter=choice_parameter
+                ).values_list("value", flat=True)
+            ),
+            ["sure", "other"],
+        )
+        self.assertFalse(
+            BaseParameter.objects.get(pk=choice_parameter.base_id).preset
+        )
+        template = InputTemplate.objects.get(template_id="someId")
+        self.assertEqual(template.pk, template_id)
+        self.assertEqual(template.label, "otherlabel")
+        self.assertEqual(
+            Profile.objects.filter(script=self.dummyscript).count(), 2
+        )
+
+    def test_refresh_changed_type_preset(self):
+        """
+        Tests that the preset of a parameter that changed type is kept if it is valid for the new type
+        """
+        profiles = [
+            DummyClamServer.DummyClamProfile([DummyClamServer.DummyTemplate()])
+        ]
+        self.refresh_dummyscript(_dummyClamParams, profiles)
+        for name, value in (("text", "more text"), ("float", 2.2)):
+            BaseParameter.objects.get(
+                corresponding_script=self.dummyscript, name=name
+            ).get_typed_parameter().set_preset(value)
+
+        parameters = dict(_dummyClamParams)
+        parameters["text"] = clam.common.parameters.StringParameter("a", "a")
+        parameters["float"] = clam.common.parameters.IntegerParameter("a", "a")
+        self.refresh_dummyscript(parameters, profiles)
+
+        self.assertEqual(
+            BaseParameter.objects.get(
+                corresponding_script=self.dummyscript, name="text"
+            ).type,
+            BaseParameter.STRING_TYPE,
+        )
+        self.assertEqual(
+            self.dummyscript.get_default_parameter_values(),
+            {"text": "more text"},
+        )
+
+    def test_sync_unchanged_fingerprint(self):
+        """
+        Tests that a sync only applies CLAM data of which the fingerprint changed
+        """
+        profiles = [
+            DummyClamServer.DummyClamProfile([DummyClamServer.DummyTemplate()])
+        ]
+        data = DummyClamServer.DummyRefreshData(_dummyClamParams, profiles)
+        self.assertTrue(self.dummyscript.sync(data, 0.5))
+        self.assertEqual(
+            self.dummyscript.clam_fingerprint,
+            Script.get_clam_fingerprint(data),
+        )
+        self.assertIsNotNone(self.dummyscript.last_synced)
+        self.assertGreaterEqual(self.dummyscript.last_sync_duration, 0.5)
+
+        data = DummyClamServer.DummyRefreshData(
+            _dummyClamParams, profiles, project="other"
+        )
+        with patch.object(
+            self.dummyscript, "update_parameters_from_clam_data"
+        ) as update:
+            self.assertFalse(self.dummyscript.sync(data))
+            self.assertTrue(self.dummyscript.sync(data, force=True))
+        self.assertEqual(update.call_count, 1)
+
+        parameters = dict(_dummyClamParams)
+        del parameters["text"]
+        data = DummyClamServer.DummyRefreshData(parameters, profiles)
+        self.assertTrue(self.dummyscript.sync(data))
+        self.assertFalse(
+            self.dummyscript.get_parameters().filter(name="text").exists()
+        )
+
     def test_template_from_data(self):
         """
         Tests the creation of template data. Only fails if exception is thrown
@@ -623,3 +970,445 @@ class Test_ProcessMethods(TestCase):
         ):
             res = self.dummyProcess.download_archive_and_decompress()
         self.assertEquals(res, True)
+
+    def test_schedule_next_poll(self):
+        """
+        Tests the exponential backoff of the polling interval
+        """
+        self.dummyProcess.schedule_next_poll()
+        self.assertEqual(
+            self.dummyProcess.poll_interval, settings.CLAM_POLL_MIN_INTERVAL
+        )
+        for _ in range(64):
+            self.dummyProcess.schedule_next_poll()
+        self.assertEqual(
+            self.dummyProcess.poll_interval, settings.CLAM_POLL_MAX_INTERVAL
+        )
+        self.dummyProcess.schedule_next_poll(reset=True)
+        self.assertEqual(
+            self.dummyProcess.poll_interval, settings.CLAM_POLL_MIN_INTERVAL
+        )
+
+    def test_is_near_completion(self):
+        """
+        Tests whether the CLAM completion percentage is interpreted
+        """
+        status = DummyClamServer.DummyClamStatus("")
+        status.completion = "95"
+        self.assertTrue(Process.is_near_completion(status))
+        status.completion = "10"
+        self.assertFalse(Process.is_near_completion(status))
+        status.completion = None
+        self.assertFalse(Process.is_near_completion(status))
+
+    def test_download_archive_and_decompress_resume(self):
+        """
+        Tests that an interrupted streamed download resumes at the stored offset
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("first.ctm", _dummyvars["filecontent"] * 100)
+            archive.writestr("second.oov", _dummyvars["filecontent"])
+        data = buffer.getvalue()
+
+        class StreamingClamServer(DummyClamServer):
+            offsets = []
+
+            def iter_archive(self, id, archiveformat, offset=0):
+                StreamingClamServer.offsets.append(offset)
+                if len(StreamingClamServer.offsets) == 1:
+
+                    def interrupted():
+                        yield data[: data.index(b"second.oov") + 12]
+                        raise ConnectionError("Connection reset")
+
+                    return 0, interrupted()
+                return offset, iter([data[offset:]])
+
+        self.make_tempdir()
+        with patch.object(
+            self.dummyscript, "get_clam_server", new=StreamingClamServer,
+        ):
+            self.assertFalse(
+                self.dummyProcess.download_archive_and_decompress()
+            )
+            offset = Process.objects.get(
+                pk=self.dummyProcess.pk
+            ).download_offset
+            self.assertGreater(offset, 0)
+            self.assertTrue(self.dummyProcess.download_archive_and_decompress())
+        self.assertEqual(StreamingClamServer.offsets, [0, offset])
+        self.assertEqual(self.dummyProcess.download_offset, 0)
+        self.assertEqual(
+            self.readFile(os.path.join(Project.OUTPUT_FOLDER, "second.oov")),
+            _dummyvars["filecontent"],
+        )
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.folder, Project.OUTPUT_FOLDER, "first.ctm")
+            )
+        )
+
+    def test_download_offset_reset(self):
+        """
+        Tests that the offset of an interrupted download is reset by a full download and a new CLAM project
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("first.ctm", _dummyvars["filecontent"] * 100)
+            archive.writestr("second.oov", _dummyvars["filecontent"])
+        data = buffer.getvalue()
+
+        class InterruptedClamServer(DummyClamServer):
+            def iter_archive(self, id, archiveformat, offset=0):
+                if offset > 0:
+                    raise StreamingZipExtractor.UnsupportedArchive("Resume")
+
+                def interrupted():
+                    yield data[: data.index(b"second.oov") + 12]
+                    raise ConnectionError("Connection reset")
+
+                return 0, interrupted()
+
+        DummyClamServer.targetfolder = self.folder
+        self.make_tempdir()
+        with patch.object(
+            self.dummyscript, "get_clam_server", new=InterruptedClamServer,
+        ):
+            self.assertFalse(
+                self.dummyProcess.download_archive_and_decompress()
+            )
+            self.assertGreater(self.dummyProcess.download_offset, 0)
+            self.assertTrue(self.dummyProcess.download_archive_and_decompress())
+            self.assertEqual(
+                Process.objects.get(pk=self.dummyProcess.pk).download_offset, 0
+            )
+
+            self.assertFalse(
+                self.dummyProcess.download_archive_and_decompress()
+            )
+            self.assertGreater(self.dummyProcess.download_offset, 0)
+            self.dummyProcess.set_clam_id(Process.get_random_clam_id())
+            self.assertEqual(
+                Process.objects.get(pk=self.dummyProcess.pk).download_offset, 0
+            )
+
+    @override_settings(CLAM_RETRY_DELAY=0)
+    def test_upload_input_templates_progress(self):
+        """
+        Tests that all files are uploaded, failed uploads are retried and progress is stored
+        """
+        self.make_tempdir()
+        for i in range(5):
+            self.writeFile(f"file{i}{_templatevars['extension']}")
+
+        class FlakyClamServer(DummyClamServer):
+            uploaded = []
+            failed = []
+
+            def addinputfile(self, id, templateid, path):
+                if path not in FlakyClamServer.failed:
+                    FlakyClamServer.failed.append(path)
+                    raise ConnectionError("Connection reset")
+                FlakyClamServer.uploaded.append(path)
+
+        with patch.object(
+            self.dummyscript, "get_clam_server", new=FlakyClamServer,
+        ):
+            self.dummyProcess.upload_input_templates([self.dummytemplate])
+        self.assertEqual(len(FlakyClamServer.uploaded), 5)
+        process = Process.objects.get(pk=self.dummyProcess.pk)
+        self.assertEqual(
+            process.get_upload_progress(),
+            {
+                "files_done": 5,
+                "files_total": 5,
+                "bytes_done": 5 * len(_dummyvars["filecontent"]),
+                "bytes_total": 5 * len(_dummyvars["filecontent"]),
+            },
+        )
+
+    @override_settings(CLAM_RETRY_DELAY=0)
+    def test_upload_input_templates_failure(self):
+        """
+        Tests that an upload failing on every attempt raises an exception
+        """
+        self.make_tempdir()
+        self.writeFile(f"somefile{_templatevars['extension']}")
+        with patch.object(
+            self.dummyscript, "get_clam_server", new=DummyClamServer,
+        ):
+            with patch.object(
+                DummyClamServer,
+                "addinputfile",
+                side_effect=ConnectionError("Connection reset"),
+            ) as mock_upload:
+                with self.assertRaises(ConnectionError):
+                    self.dummyProcess.upload_input_templates(
+                        [self.dummytemplate]
+                    )
+        self.assertEqual(mock_upload.call_count, settings.CLAM_RETRIES + 1)
+        self.assertEqual(
+            Process.objects.get(pk=self.dummyProcess.pk).upload_files_done, 0
+        )
+
+    def test_queue_and_start_queued(self):
+        """
+        Tests that a queued process is started by a background task with the profile and parameters it was queued with
+        """
+        self.make_tempdir()
+        self.spawn_dummyparam()
+        self.writeFile(f"somefile{_templatevars['extension']}")
+        self.dummyProcess.queue(
+            self.dummyprofile, {self.dummybaseparam.name: True}
+        )
+        process = Process.objects.get(pk=self.dummyProcess.pk)
+        self.assertEqual(process.status, STATUS_QUEUED)
+        self.assertEqual(process.profile, self.dummyprofile)
+        self.assertTrue(
+            Task.objects.filter(
+                task_name="scripts.tasks.start_process"
+            ).exists()
+        )
+        with patch.object(
+            self.dummyscript,
+            "get_clam_server",
+            new=DummyClamServer.spawn_dummyClam,
+        ):
+            self.assertTrue(self.dummyProcess.start_queued())
+        self.assertEqual(self.dummyProcess.status, STATUS_RUNNING)
+        self.assertFalse(self.dummyProcess.start_queued())
+
+    def test_start_queued_error(self):
+        """
+        Tests that an error while starting a queued process is stored on the process
+        """
+        self.make_tempdir()
+        self.spawn_dummyparam(False)
+        self.dummyProcess.queue(self.dummyprofile)
+        with patch.object(
+            self.dummyscript,
+            "get_clam_server",
+            new=DummyClamServer.spawn_dummyClam,
+        ):
+            self.assertFalse(self.dummyProcess.start_queued())
+        process = Process.objects.get(pk=self.dummyProcess.pk)
+        self.assertEqual(process.status, STATUS_ERROR)
+        self.assertEqual(
+            process.error_message, "Not all script parameters are filled in"
+        )
+        self.assertEqual(process.get_status_string(), process.error_message)
+
+    def test_result_cache(self):
+        """
+        Tests that an identical run restores the cached outputs instead of running on CLAM
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("somefile.ctm", _dummyvars["filecontent"])
+        data = buffer.getvalue()
+
+        class CachingClamServer(DummyClamServer):
+            created = []
+
+            def create(self, id):
+                CachingClamServer.created.append(id)
+
+            def iter_archive(self, id, archiveformat, offset=0):
+                return offset, iter([data[offset:]])
+
+        cache_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_folder)
+        self.make_tempdir()
+        self.writeFile(f"somefile{_templatevars['extension']}")
+        Script.objects.filter(pk=self.dummyscript.pk).update(
+            clam_fingerprint="fingerprint"
+        )
+        self.dummyscript.refresh_from_db()
+
+        def run():
+            process = Process.objects.create(
+                script=self.dummyscript, folder=self.folder
+            )
+            with patch.object(
+                self.dummyscript, "get_clam_server", new=CachingClamServer
+            ):
+                self.assertTrue(process.start(self.dummyprofile))
+                if process.status == STATUS_RUNNING:
+                    process.status = STATUS_WAITING
+                    self.assertTrue(process.download_and_delete())
+            return process
+
+        with override_settings(RESULT_CACHE_FOLDER=cache_folder):
+            first = run()
+            self.assertEqual(len(CachingClamServer.created), 1)
+            os.remove(
+                os.path.join(self.folder, Project.OUTPUT_FOLDER, "somefile.ctm")
+            )
+
+            second = run()
+            self.assertEqual(len(CachingClamServer.created), 1)
+            self.assertEqual(second.status, STATUS_FINISHED)
+            self.assertIsNone(second.clam_id)
+            self.assertEqual(second.result_key, first.result_key)
+            self.assertEqual(
+                self.readFile(
+                    os.path.join(Project.OUTPUT_FOLDER, "somefile.ctm")
+                ),
+                _dummyvars["filecontent"],
+            )
+
+            self.writeFile(f"other{_templatevars['extension']}")
+            run()
+            self.assertEqual(len(CachingClamServer.created), 2)
+
+    def start_sharded_process(self):
+        """Start a process of which the input files are split into two shards."""
+        self.make_tempdir()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        InputTemplate.objects.create(
+            template_id="text",
+            format="",
+            accept_archive=False,
+            extension="txt",
+            optional=False,
+            unique=False,
+            corresponding_profile=self.dummyprofile,
+        )
+        InputTemplate.objects.create(
+            template_id="dictionary",
+            format="",
+            accept_archive=False,
+            extension="dict",
+            optional=True,
+            unique=True,
+            corresponding_profile=self.dummyprofile,
+        )
+        for name in ["a", "b", "c"]:
+            self.writeFile(f"{name}{_templatevars['extension']}")
+            self.writeFile(f"{name}.txt")
+        self.writeFile("words.dict")
+        process = Process.objects.create(
+            script=self.dummyscript, folder=self.folder, shard_count=2
+        )
+        with patch("scripts.models.start_process") as mock_start:
+            self.assertTrue(process.start(self.dummyprofile))
+        shards = list(process.shards.order_by("id"))
+        self.assertEqual(mock_start.call_count, 2)
+        return process, shards
+
+    def test_start_sharded(self):
+        """
+        Tests that the input files are split into shards that run as separate CLAM projects and are merged afterwards
+        """
+        process, shards = self.start_sharded_process()
+        self.assertEqual(process.status, STATUS_RUNNING)
+        self.assertEqual(len(shards), 2)
+        shard_files = [json.loads(shard.shard_files) for shard in shards]
+        for files in shard_files:
+            self.assertIn("words.dict", files)
+            for name in ["a", "b", "c"]:
+                self.assertEqual(
+                    f"{name}{_templatevars['extension']}" in files,
+                    f"{name}.txt" in files,
+                )
+        self.assertEqual(sum(len(files) for files in shard_files), 8)
+        self.assertEqual(
+            list(get_due_processes().values_list("id", flat=True)), []
+        )
+
+        with patch("scripts.models.Script.get_clam_server") as mock_server:
+            for shard in shards:
+                self.assertEqual(shard.status, STATUS_QUEUED)
+                self.assertTrue(shard.start_queued())
+            self.assertEqual(mock_server.return_value.create.call_count, 2)
+            self.assertEqual(
+                mock_server.return_value.addinputfile.call_count, 8
+            )
+            self.assertEqual(process.get_upload_progress()["files_done"], 8)
+
+            for index, (shard, files) in enumerate(zip(shards, shard_files)):
+                os.makedirs(shard.output_folder)
+                for file in files:
+                    if file.endswith(".txt"):
+                        with open(
+                            os.path.join(
+                                shard.output_folder, file[:-4] + ".ctm"
+                            ),
+                            "w",
+                        ) as f:
+                            f.write(file)
+                with open(
+                    os.path.join(shard.output_folder, "all.oov"), "w"
+                ) as f:
+                    f.write(f"word{index}\n")
+                shard.finish_download()
+                process.refresh_from_db()
+                self.assertEqual(
+                    process.status,
+                    STATUS_RUNNING if index == 0 else STATUS_FINISHED,
+                )
+
+        for name in ["a", "b", "c"]:
+            self.assertEqual(
+                self.readFile(
+                    os.path.join(Project.OUTPUT_FOLDER, f"{name}.ctm")
+                ),
+                f"{name}.txt",
+            )
+        self.assertEqual(
+            self.readFile(os.path.join(Project.OUTPUT_FOLDER, "all.oov")),
+            "word0\nword1\n",
+        )
+        self.assertFalse(
+            any(os.path.exists(shard.output_folder) for shard in shards)
+        )
+
+    def test_sharded_failure(self):
+        """
+        Tests that a failing shard fails its process and stops the other shards
+        """
+        process, shards = self.start_sharded_process()
+        Process.objects.filter(pk=shards[0].pk).update(
+            status=STATUS_ERROR, error_message="Something went wrong"
+        )
+        self.assertEqual(update_sharded_processes(), [process.id])
+        process.refresh_from_db()
+        self.assertEqual(process.status, STATUS_ERROR)
+        self.assertEqual(
+            process.error_message, "Shard 1 of 2 failed: Something went wrong"
+        )
+        self.assertEqual(
+            Process.objects.get(pk=shards[1].pk).status, STATUS_ERROR
+        )
+        self.assertEqual(update_sharded_processes(), [])
+
+    def test_sharded_full_archive_download(self):
+        """
+        Tests that a shard extracts a fully downloaded archive to its own output folder
+        """
+        process, shards = self.start_sharded_process()
+
+        class ArchiveClamServer(DummyClamServer):
+            def downloadarchive(self, id, target, ext):
+                with zipfile.ZipFile(target, "w") as archive:
+                    archive.writestr("all.oov", "word\n")
+
+        shard = shards[0]
+        shard.clam_id = Process.get_random_clam_id()
+        shard.status = STATUS_WAITING
+        with patch(
+            "scripts.models.Script.get_clam_server",
+            return_value=ArchiveClamServer(),
+        ):
+            self.assertTrue(shard.download_and_delete())
+        self.assertTrue(
+            os.path.isfile(os.path.join(shard.output_folder, "all.oov"))
+        )
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.folder, Project.OUTPUT_FOLDER, "all.oov")
+            )
+        )
+        process.refresh_from_db()
+        self.assertEqual(process.status, STATUS_RUNNING)
@@ -1,10 +1,26 @@
-from django.test import TestCase
-from scripts.models import Script, Pipeline, Project, Process
+from django.test import TestCase, override_settings
+from scripts.models import (
+    Script,
+    Pipeline,
+    Project,
+    Process,
+    Profile,
+    ProjectFile,
+    InputTemplate,
+    STATUS_QUEUED,
+)
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
+import hashlib
 import shutil
 import os
 import inspect
+import io
+import tempfile
+import zipfile
+from unittest.mock import patch
+from scripts.services import zip_files
 
 _proj_name = "Testing project"
 _umodel = get_user_model()
@@ -47,6 +63,20 @@ class Test_ProjectMethods(TestCase):
         )
         if os.path.exists(self.folder):
             shutil.rmtree(self.folder)  # Recursively destroy the file
+        self.archive_folder = tempfile.mkdtemp()
+        self.archive_settings = override_settings(
+            ARCHIVE_CACHE_FOLDER=self.archive_folder
+        )
+        self.archive_settings.enable()
+        self.addCleanup(self.archive_settings.disable)
+        self.addCleanup(shutil.rmtree, self.archive_folder)
+        self.blob_folder = tempfile.mkdtemp(dir=settings.USER_DATA_FOLDER)
+        self.blob_settings = override_settings(
+            BLOB_STORE_FOLDER=self.blob_folder
+        )
+        self.blob_settings.enable()
+        self.addCleanup(self.blob_settings.disable)
+        self.addCleanup(shutil.rmtree, self.blob_folder)
 
     def writeFile(self, name):
         """Adds a specific file to the user associated project directory"""
@@ -126,6 +156,7 @@ class Test_ProjectMethods(TestCase):
         frame = inspect.currentframe().f_code.co_name
         proj = self.create_project(frame)
         proj.current_process = Process.objects.create(script=self.G2P_script)
+        proj.save()
         self.assertEquals(proj.status, Project.G2P_RUNNING)
 
     def test_property_fa(self):
@@ -133,6 +164,7 @@ class Test_ProjectMethods(TestCase):
         frame = inspect.currentframe().f_code.co_name
         proj = self.create_project(frame)
         proj.current_process = Process.objects.create(script=self.FA_script)
+        proj.save()
         self.assertEquals(proj.status, Project.FA_RUNNING)
 
     def test_property_checkdictionary(self):
@@ -143,6 +175,8 @@ class Test_ProjectMethods(TestCase):
             self.writeFile(_dummyvars["fafile"])
         except:
             self.fail("Failed to write file in {0}".format(frame))
+        self.assertEquals(proj.status, Project.UPLOADING)
+        proj.update_state()
         self.assertEquals(proj.status, Project.CHECK_DICTIONARY)
 
     def test_property_uploading(self):
@@ -237,10 +271,253 @@ class Test_ProjectMethods(TestCase):
     def test_createCompressedArchive(self):
         frame = inspect.currentframe().f_code.co_name
         proj = self.create_project(frame)
-        proj.create_downloadable_archive()
+        archive = proj.create_downloadable_archive()
+        self.assertEqual(os.path.exists(archive), True)
+        self.assertFalse(archive.startswith(self.folder))
+        self.assertEqual(
+            proj.get_archive_name(), "{0}{1}".format(_proj_name, ".zip")
+        )
+
+    def test_queueScript(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        profile = Profile.objects.create(script=self.FA_script)
+        process = proj.queue_script(profile, self.FA_script)
+        self.assertEqual(proj.current_process, process)
+        self.assertEqual(process.status, STATUS_QUEUED)
+        with self.assertRaises(Project.StateException):
+            proj.queue_script(profile, self.FA_script)
+
+    def test_queueScript_incorrectProfile(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        profile = Profile.objects.create(script=self.FA_script2)
+        with self.assertRaises(Profile.IncorrectProfileException):
+            proj.queue_script(profile, self.FA_script)
+        self.assertIsNone(proj.current_process)
+
+    def test_registerFile(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.writeFile("a.wav")
+        project_file = proj.register_file("a.wav")
+        self.assertEqual(project_file.size, len(_dummyvars["filecontent"]))
+        self.assertEqual(project_file.extension, "wav")
+        self.assertEqual(project_file.role, ProjectFile.INPUT)
+        self.assertEqual(
+            project_file.content_hash,
+            hashlib.sha256(_dummyvars["filecontent"].encode()).hexdigest(),
+        )
+        proj.unregister_file("a.wav")
+        self.assertEqual(proj.get_files().count(), 0)
+
+    def test_registerFile_deduplicated(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        other = Project.create_project(
+            frame + "_other", self.test_pipeline, self.dummy
+        )
+        self.writeFile("a.wav")
+        with open(os.path.join(other.folder, "b.wav"), "w") as f:
+            f.write(_dummyvars["filecontent"])
+        proj.register_file("a.wav")
+        other.register_file("b.wav")
+        content_hash = hashlib.sha256(
+            _dummyvars["filecontent"].encode()
+        ).hexdigest()
+        blob = os.path.join(self.blob_folder, content_hash[:2], content_hash)
+        self.assertTrue(
+            os.path.samefile(os.path.join(self.folder, "a.wav"), blob)
+        )
+        self.assertTrue(
+            os.path.samefile(os.path.join(other.folder, "b.wav"), blob)
+        )
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+
+        other.delete()
+        self.assertEqual(os.stat(blob).st_nlink, 2)
+        os.remove(os.path.join(self.folder, "a.wav"))
+        proj.unregister_file("a.wav")
+        self.assertFalse(os.path.exists(blob))
+
+    def test_move_corresponding_files_deduplicated(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        other = Project.create_project(
+            frame + "_other", self.test_pipeline, self.dummy
+        )
+        self.addCleanup(other.delete)
+        self.writeFile("a.tg")
+        with open(os.path.join(other.folder, "a.tg"), "w") as f:
+            f.write(_dummyvars["filecontent"])
+        proj.register_file("a.tg")
+        other.register_file("a.tg")
+        content_hash = hashlib.sha256(
+            _dummyvars["filecontent"].encode()
+        ).hexdigest()
+        blob = os.path.join(self.blob_folder, content_hash[:2], content_hash)
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+
+        output_folder = os.path.join(self.folder, Project.OUTPUT_FOLDER)
+        os.makedirs(output_folder, exist_ok=True)
+        with open(os.path.join(output_folder, "a.tg"), "w") as f:
+            f.write("overwritten")
+        template = InputTemplate.objects.create(
+            template_id="textgrid",
+            format="",
+            extension="tg",
+            optional=True,
+            unique=False,
+            accept_archive=False,
+        )
+        self.assertEqual(
+            template.move_corresponding_files(output_folder, self.folder),
+            ["a.tg"],
+        )
+        proj.register_file("a.tg")
+
+        self.assertEqual(self.readFile("a.tg"), "overwritten")
+        with open(os.path.join(other.folder, "a.tg")) as f:
+            self.assertEqual(f.read(), _dummyvars["filecontent"])
+        with open(blob) as f:
+            self.assertEqual(f.read(), _dummyvars["filecontent"])
+        self.assertEqual(os.stat(blob).st_nlink, 2)
+        self.assertEqual(
+            [x for x in os.listdir(self.folder) if x.endswith(".tmp")], []
+        )
+
+    def test_syncFiles(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.writeFile("a.wav")
+        self.writeFile("a.oov.dict")
+        self.writeFile(_dummyvars["fafile"])
+        ProjectFile.objects.create(
+            project=proj,
+            path="removed.wav",
+            size=0,
+            extension="wav",
+            content_hash="",
+            role=ProjectFile.INPUT,
+            modified=timezone.now(),
+        )
+        proj.sync_files()
+        self.assertEqual(
+            list(proj.get_files().values_list("path", "role")),
+            [
+                ("a.oov.dict", ProjectFile.DICTIONARY),
+                ("a.wav", ProjectFile.INPUT),
+                (_dummyvars["fafile"], ProjectFile.OUTPUT),
+            ],
+        )
+        self.assertEqual(sorted(proj.get_file_names()), ["a.oov.dict", "a.wav"])
         self.assertEqual(
-            os.path.exists(
-                os.path.join(self.folder, "{0}{1}".format(_proj_name, ".zip"))
-            ),
-            True,
+            [x.path for x in proj.get_files(extensions=["dict"])],
+            ["a.oov.dict"],
         )
+
+    def test_createCompressedArchive_manifest(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.writeFile("a.wav")
+        self.writeFile("unregistered.wav")
+        proj.register_file("a.wav")
+        with zipfile.ZipFile(proj.create_downloadable_archive()) as archive:
+            self.assertEqual(archive.namelist(), ["a.wav"])
+
+    def test_createCompressedArchive_cached(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.writeFile("a.wav")
+        proj.register_file("a.wav")
+        with patch("scripts.models.zip_files", wraps=zip_files) as zip_mock:
+            archive = proj.create_downloadable_archive()
+            self.assertEqual(proj.create_downloadable_archive(), archive)
+            self.assertEqual(zip_mock.call_count, 1)
+
+            self.writeFile("b.wav")
+            proj.register_file("b.wav")
+            other = proj.create_downloadable_archive()
+            self.assertNotEqual(other, archive)
+            self.assertEqual(zip_mock.call_count, 2)
+        with zipfile.ZipFile(other) as archive:
+            self.assertEqual(archive.namelist(), ["a.wav", "b.wav"])
+
+    def test_getDownloadableArchive_streamed(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.writeFile("a.wav")
+        proj.register_file("a.wav")
+        path, chunks = proj.get_downloadable_archive()
+        self.assertIsNone(path)
+        data = b"".join(chunks)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), ["a.wav"])
+
+        path, chunks = proj.get_downloadable_archive()
+        self.assertIsNone(chunks)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_getValidProfiles(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        profiles = [
+            Profile.objects.create(script=self.FA_script) for _ in range(3)
+        ]
+        for profile, extension in zip(profiles, ["wav", "oov.dict", "ctm"]):
+            InputTemplate.objects.create(
+                template_id=extension,
+                format="format",
+                label=extension,
+                extension=extension,
+                optional=False,
+                unique=False,
+                accept_archive=False,
+                corresponding_profile=profile,
+            )
+        self.writeFile("a.wav")
+        self.writeFile("a.oov.dict")
+        proj.sync_files()
+        with self.assertNumQueries(3):
+            valid_profiles = proj.get_valid_profiles(self.FA_script)
+        self.assertEqual(valid_profiles, profiles[:2])
+        self.assertEqual(
+            self.FA_script.get_valid_profiles(self.folder), profiles[:2]
+        )
+
+    def test_state(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        self.assertEqual(proj.state, Project.UPLOADING)
+        profile = Profile.objects.create(script=self.FA_script)
+        proj.queue_script(profile, self.FA_script)
+        self.assertEqual(
+            Project.objects.get(pk=proj.pk).state, Project.FA_RUNNING
+        )
+        self.writeFile(_dummyvars["fafile"])
+        proj.cleanup()
+        self.assertEqual(
+            Project.objects.get(pk=proj.pk).state, Project.CHECK_DICTIONARY
+        )
+
+    def test_state_after_download(self):
+        frame = inspect.currentframe().f_code.co_name
+        proj = self.create_project(frame)
+        process = Process.objects.create(script=self.FA_script)
+        Project.objects.filter(pk=proj.pk).update(current_process=process)
+        with self.assertNumQueries(0):
+            self.assertEqual(proj.status, Project.UPLOADING)
+        process.finish_download()
+        self.assertEqual(
+            Project.objects.get(pk=proj.pk).status, Project.FA_RUNNING
+        )
+
+    def test_getOverview(self):
+        frame = inspect.currentframe().f_code.co_name
+        self.create_project(frame)
+        with self.assertNumQueries(1):
+            projects = list(Project.get_overview(self.dummy))
+            self.assertEqual(projects[0].state, Project.UPLOADING)
+            self.assertEqual(projects[0].pipeline.fa_script, self.FA_script)
+            self.assertEqual(projects[0].pipeline.g2p_script, self.G2P_script)
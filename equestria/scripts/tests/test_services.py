@@ -1,5 +1,10 @@
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
 from unittest.mock import patch
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from scripts.services import *
 import os
 from equestria.settings.base import BASE_DIR
@@ -22,3 +27,589 @@ class TestServices(TestCase):
         assert mockZipw.call_count == 0
         assert mockZipc.call_count == 0
         assert mockzippie.call_count == 1
+
+
+class TestStreamingZipExtractor(TestCase):
+    """Test extracting zip archives while they are streamed."""
+
+    def setUp(self):
+        """Set up an archive with stored, deflated and streamed members."""
+        self.directory = tempfile.mkdtemp()
+        self.contents = {
+            "stored.txt": b"stored content",
+            "deflated.ctm": b"deflated content " * 1000,
+            "folder/nested.oov": b"nested content",
+            "empty.log": b"",
+        }
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("stored.txt", self.contents["stored.txt"])
+            archive.writestr(
+                "deflated.ctm",
+                self.contents["deflated.ctm"],
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            archive.writestr(
+                "folder/nested.oov",
+                self.contents["folder/nested.oov"],
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            archive.writestr("empty.log", self.contents["empty.log"])
+        self.archive = buffer.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertExtracted(self):
+        for name, content in self.contents.items():
+            with open(os.path.join(self.directory, name), "rb") as file:
+                self.assertEqual(file.read(), content)
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                self.assertFalse(file.endswith(".part"))
+
+    def feed(self, extractor, data, chunk_size=7):
+        for i in range(0, len(data), chunk_size):
+            extractor.feed(data[i : i + chunk_size])
+
+    def test_extract_in_chunks(self):
+        """Test that all members are extracted when the archive is fed in small chunks."""
+        extractor = StreamingZipExtractor(self.directory)
+        self.feed(extractor, self.archive)
+        self.assertTrue(extractor.done)
+        self.assertEqual(sorted(extractor.close()), sorted(self.contents))
+        self.assertExtracted()
+
+    def test_extract_streamed_members(self):
+        """Test members with a data descriptor (written to a non-seekable stream)."""
+
+        class Unseekable(io.RawIOBase):
+            def __init__(self):
+                self.data = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, b):
+                self.data += b
+                return len(b)
+
+        stream = Unseekable()
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in self.contents.items():
+                archive.writestr(name, content)
+        extractor = StreamingZipExtractor(self.directory)
+        self.feed(extractor, bytes(stream.data), chunk_size=3)
+        extractor.close()
+        self.assertExtracted()
+
+    def test_resume(self):
+        """Test that an interrupted extraction can be resumed at the stored offset."""
+        extractor = StreamingZipExtractor(self.directory)
+        self.feed(extractor, self.archive[: len(self.archive) // 2])
+        extractor.abort()
+        self.assertFalse(extractor.done)
+        offset = extractor.offset
+        self.assertGreater(offset, 0)
+        extractor = StreamingZipExtractor(self.directory, offset=offset)
+        self.feed(extractor, self.archive[offset:])
+        extractor.close()
+        self.assertExtracted()
+
+    def test_truncated_archive(self):
+        """Test that a truncated archive raises an error."""
+        extractor = StreamingZipExtractor(self.directory)
+        self.feed(extractor, self.archive[:40])
+        with self.assertRaises(zipfile.BadZipFile):
+            extractor.close()
+
+    def test_corrupt_archive(self):
+        """Test that corrupt member data raises an error."""
+        archive = bytearray(self.archive)
+        archive[30 + len("stored.txt")] ^= 0xFF
+        extractor = StreamingZipExtractor(self.directory)
+        with self.assertRaises(zipfile.BadZipFile):
+            self.feed(extractor, bytes(archive))
+
+
+class TestFileIndex(TestCase):
+    """Test the cached index of the files in a folder."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.folder, "output"))
+        for name, content in [("a.wav", "12"), ("a.oov.dict", "")]:
+            with open(os.path.join(self.folder, name), "w") as f:
+                f.write(content)
+        self.cache = FileIndexCache(max_size=1)
+        # Make the folder old enough to be cached.
+        os.utime(self.folder, (0, 0))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_scan(self):
+        """Test that only files are indexed with their size and multi-dot extension."""
+        index = FileIndex.scan(self.folder)
+        self.assertEqual(sorted(index.names()), ["a.oov.dict", "a.wav"])
+        self.assertEqual(index.files["a.wav"].size, 2)
+        self.assertEqual(index.files["a.oov.dict"].extension, "oov.dict")
+        self.assertEqual(index.names_ending_with(".dict"), ["a.oov.dict"])
+        self.assertNotIn("output", index)
+
+    def test_cached_until_folder_changes(self):
+        """Test that the index is reused until a file is added to the folder."""
+        index = self.cache.get(self.folder)
+        self.assertIs(index, self.cache.get(self.folder))
+        self.assertEqual(self.cache.hits, 1)
+
+        with open(os.path.join(self.folder, "b.wav"), "w") as f:
+            f.write("new")
+        os.utime(self.folder, (1, 1))
+        new_index = self.cache.get(self.folder)
+        self.assertIsNot(index, new_index)
+        self.assertIn("b.wav", new_index)
+
+    def test_invalidate(self):
+        """Test that an invalidated index is scanned again."""
+        index = self.cache.get(self.folder)
+        self.cache.invalidate(self.folder)
+        self.assertIsNot(index, self.cache.get(self.folder))
+
+    def test_recently_changed_folder_not_cached(self):
+        """Test that the index of a folder that just changed is not cached."""
+        os.utime(self.folder)
+        index = self.cache.get(self.folder)
+        self.assertIsNot(index, self.cache.get(self.folder))
+
+
+class TestIterZip(TestCase):
+    """Test the streaming zip generator."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.files = list()
+        for name, content in [
+            ("a.txt", b"text " * 1000),
+            ("b.WAV", b"audio" * 1000),
+        ]:
+            with open(os.path.join(self.folder, name), "wb") as f:
+                f.write(content)
+            self.files.append((os.path.join(self.folder, name), name))
+        self.files.append((os.path.join(self.folder, "missing"), "missing"))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_iter_zip(self):
+        """Test that the generated archive is streamed in chunks and contains all existing files."""
+        chunks = list(iter_zip(self.files, chunk_size=1024))
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(archive.namelist(), ["a.txt", "b.WAV"])
+            self.assertEqual(archive.read("a.txt"), b"text " * 1000)
+            self.assertEqual(archive.read("b.WAV"), b"audio" * 1000)
+            self.assertEqual(
+                archive.getinfo("a.txt").compress_type, zipfile.ZIP_DEFLATED
+            )
+            self.assertEqual(
+                archive.getinfo("b.WAV").compress_type, zipfile.ZIP_STORED
+            )
+
+    def test_iter_zip_compression_level(self):
+        """Test that files are deflated with the configured compression level."""
+        sizes = dict()
+        for level in (0, 9):
+            with override_settings(ZIP_COMPRESSION_LEVEL=level):
+                data = b"".join(iter_zip(self.files, chunk_size=1024))
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                sizes[level] = archive.getinfo("a.txt").compress_size
+        self.assertGreaterEqual(sizes[0], len(b"text " * 1000))
+        self.assertLess(sizes[9], sizes[0])
+
+    def test_iter_zip_large_file(self):
+        """Test that files larger than the ZIP64 limit are stored as ZIP64 members."""
+        with patch("zipfile.ZIP64_LIMIT", 1024):
+            data = b"".join(iter_zip(self.files, chunk_size=1024))
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                self.assertEqual(archive.read("a.txt"), b"text " * 1000)
+                self.assertEqual(archive.read("b.WAV"), b"audio" * 1000)
+
+    def test_archive_cache_tee(self):
+        """Test that a streamed archive is only cached once it is complete."""
+        cache = ArchiveCache(self.folder, max_age=60, max_size=1024 * 1024)
+        chunks = cache.tee("a", iter_zip(self.files, chunk_size=1024))
+        next(chunks)
+        chunks.close()
+        self.assertIsNone(cache.get("a"))
+        self.assertFalse(
+            any(x.endswith(".tmp") for x in os.listdir(self.folder))
+        )
+
+        data = b"".join(cache.tee("a", iter_zip(self.files, chunk_size=1024)))
+        with open(cache.get("a"), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+
+class TestFilteredZipExtractor(TestCase):
+    """Test the extraction of the accepted members of a zip archive."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.archive = io.BytesIO()
+        with zipfile.ZipFile(self.archive, "w") as archive:
+            archive.writestr("a.wav", b"a" * 10)
+            archive.writestr("sub/b.wav", b"b" * 10)
+            archive.writestr("sub/c.txt", b"c")
+            archive.writestr("empty/", b"")
+        with open(os.path.join(self.folder, "b.wav"), "wb") as f:
+            f.write(b"old")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def extractor(self, **kwargs):
+        """Create an extractor accepting wav files."""
+        return FilteredZipExtractor(
+            lambda name: name.endswith(".wav"), **kwargs
+        )
+
+    def test_extract(self):
+        """Test that only accepted members are written, flattened and replacing existing files."""
+        extracted, skipped = self.extractor(max_size=20, max_members=3).extract(
+            self.archive, self.folder
+        )
+        self.assertEqual(extracted, ["a.wav", "b.wav"])
+        self.assertEqual(skipped, ["c.txt"])
+        self.assertEqual(sorted(os.listdir(self.folder)), ["a.wav", "b.wav"])
+        with open(os.path.join(self.folder, "b.wav"), "rb") as f:
+            self.assertEqual(f.read(), b"b" * 10)
+
+    def test_limits(self):
+        """Test that archives exceeding the limits are rejected before anything is written."""
+        with self.assertRaises(FilteredZipExtractor.LimitExceeded):
+            self.extractor(max_size=19, max_members=3).extract(
+                self.archive, self.folder
+            )
+        with self.assertRaises(FilteredZipExtractor.LimitExceeded):
+            self.extractor(max_size=20, max_members=2).extract(
+                self.archive, self.folder
+            )
+        self.assertEqual(os.listdir(self.folder), ["b.wav"])
+
+
+class TestChunkedUpload(TestCase):
+    """Test uploads that are written in chunks."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_out_of_order(self):
+        """Test that chunks written in any order assemble the file."""
+        upload = ChunkedUpload.start(self.folder, "a.wav", 10, chunk_size=4)
+        self.assertEqual(upload.get_chunk_count(), 3)
+        upload.write_chunk(2, io.BytesIO(b"89"))
+        upload.write_chunk(0, io.BytesIO(b"0123"))
+        self.assertEqual(upload.get_received(), [0, 2])
+        self.assertFalse(upload.is_complete())
+        upload.write_chunk(1, io.BytesIO(b"4567"))
+        self.assertTrue(upload.is_complete())
+        with open(upload.get_data_path(), "rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+
+    def test_resume(self):
+        """Test that starting the upload of the same file resumes it."""
+        upload = ChunkedUpload.start(self.folder, "a.wav", 10, chunk_size=4)
+        upload.write_chunk(1, io.BytesIO(b"4567"))
+        resumed = ChunkedUpload.start(self.folder, "a.wav", 10, chunk_size=8)
+        self.assertEqual(resumed.upload_id, upload.upload_id)
+        self.assertEqual(resumed.info["chunk_size"], 4)
+        self.assertEqual(resumed.get_received(), [1])
+        self.assertNotEqual(
+            ChunkedUpload.start(self.folder, "a.wav", 11).upload_id,
+            upload.upload_id,
+        )
+        self.assertEqual(
+            ChunkedUpload.get(self.folder, upload.upload_id).name, "a.wav"
+        )
+        self.assertIsNone(ChunkedUpload.get(self.folder, "../a"))
+
+    def test_invalid_chunk(self):
+        """Test that chunks that do not fit are not marked as received."""
+        upload = ChunkedUpload.start(self.folder, "a.wav", 10, chunk_size=4)
+        for index, data in [(0, b"012"), (0, b"01234"), (2, b"8"), (3, b"")]:
+            with self.assertRaises(ChunkedUpload.InvalidChunk):
+                upload.write_chunk(index, io.BytesIO(data))
+        self.assertEqual(upload.get_received(), [])
+
+    def test_claim(self):
+        """Test that an upload can only be completed once."""
+        upload = ChunkedUpload.start(self.folder, "a.wav", 0)
+        upload.write_chunk(0, io.BytesIO(b""))
+        self.assertTrue(upload.is_complete())
+        self.assertTrue(upload.claim())
+        self.assertFalse(upload.claim())
+        with self.assertRaises(ChunkedUpload.InvalidChunk):
+            upload.write_chunk(0, io.BytesIO(b""))
+
+    def test_remove_expired(self):
+        """Test that uploads that did not receive chunks are removed."""
+        upload = ChunkedUpload.start(self.folder, "a.wav", 10)
+        ChunkedUpload.remove_expired(self.folder, max_age=60)
+        self.assertTrue(os.path.isdir(upload.folder))
+        os.utime(upload.folder, (0, 0))
+        ChunkedUpload.remove_expired(self.folder, max_age=60)
+        self.assertFalse(os.path.isdir(upload.folder))
+
+
+class TestResultCache(TestCase):
+    """Test the cache of the outputs of CLAM runs."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.outputs = os.path.join(self.folder, "outputs")
+        os.makedirs(os.path.join(self.outputs, "sub"))
+        for name in ["a.ctm", os.path.join("sub", "b.ctm")]:
+            with open(os.path.join(self.outputs, name), "wb") as f:
+                f.write(b"12345")
+        self.cache = ResultCache(
+            os.path.join(self.folder, "cache"), max_size=20
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_store_and_restore(self):
+        """Test that stored outputs are restored to another folder."""
+        self.assertIsNone(self.cache.restore("key", self.folder))
+        self.cache.store("key", self.outputs, ["a.ctm", "sub/b.ctm"])
+        target = os.path.join(self.folder, "target")
+        self.assertEqual(
+            sorted(self.cache.restore("key", target)), ["a.ctm", "sub/b.ctm"]
+        )
+        with open(os.path.join(target, "sub", "b.ctm"), "rb") as f:
+            self.assertEqual(f.read(), b"12345")
+
+    def test_evict_least_recently_used(self):
+        """Test that the least recently used outputs are evicted when the cache is too large."""
+        self.cache.store("first", self.outputs, ["a.ctm", "sub/b.ctm"])
+        self.cache.store("second", self.outputs, ["a.ctm", "sub/b.ctm"])
+        os.utime(self.cache.get_path("second"), (0, 0))
+        self.cache.restore("first", os.path.join(self.folder, "target"))
+        self.cache.store("third", self.outputs, ["a.ctm", "sub/b.ctm"])
+        self.assertFalse(os.path.exists(self.cache.get_path("second")))
+        self.assertTrue(os.path.exists(self.cache.get_path("first")))
+        self.assertTrue(os.path.exists(self.cache.get_path("third")))
+
+
+class TestBlobStore(TestCase):
+    """Test the content-addressed store of files."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.folder, "blobs"))
+        self.hash = hashlib.sha256(b"content").hexdigest()
+        for name in ["a.wav", "b.wav"]:
+            with open(os.path.join(self.folder, name), "wb") as f:
+                f.write(b"content")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_add(self):
+        """Test that files with the same contents are linked to a single blob."""
+        a = os.path.join(self.folder, "a.wav")
+        b = os.path.join(self.folder, "b.wav")
+        self.assertTrue(self.store.add(a, self.hash))
+        self.assertTrue(self.store.has(self.hash))
+        self.assertTrue(self.store.add(b, self.hash))
+        self.assertTrue(self.store.add(b, self.hash))
+        self.assertTrue(os.path.samefile(a, b))
+        self.assertEqual(os.stat(self.store.get_path(self.hash)).st_nlink, 3)
+
+    def test_link_and_release(self):
+        """Test that blobs are linked and only removed once no file links to them."""
+        a = os.path.join(self.folder, "a.wav")
+        c = os.path.join(self.folder, "c.wav")
+        self.assertFalse(self.store.link(self.hash, c))
+        self.store.add(a, self.hash)
+        self.assertTrue(self.store.link(self.hash, c))
+        with open(c, "rb") as f:
+            self.assertEqual(f.read(), b"content")
+        os.remove(a)
+        self.assertFalse(self.store.release(self.hash))
+        os.remove(c)
+        self.assertEqual(self.store.collect(), 1)
+        self.assertFalse(self.store.has(self.hash))
+        self.assertFalse(self.store.release(""))
+        self.assertFalse(self.store.link("../a", c))
+
+
+class TestArchiveCache(TestCase):
+    """Test the cache of built archives."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = ArchiveCache(self.folder, max_age=60, max_size=10)
+        self.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def build(self, size):
+        """Get a build function writing an archive of a number of bytes."""
+
+        def build(path):
+            self.builds += 1
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+
+        return build
+
+    def test_get_or_create(self):
+        """Test that an archive is only built if it is not cached."""
+        self.assertIsNone(self.cache.get("a"))
+        path = self.cache.get_or_create("a", self.build(4))
+        self.assertEqual(path, os.path.join(self.folder, "a.zip"))
+        self.assertEqual(self.cache.get_or_create("a", self.build(4)), path)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(os.listdir(self.folder), ["a.zip"])
+
+    def test_failed_build(self):
+        """Test that a failing build does not leave a (partial) archive behind."""
+
+        def build(path):
+            raise ValueError("Build failed")
+
+        with self.assertRaises(ValueError):
+            self.cache.get_or_create("a", build)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_evict_by_size(self):
+        """Test that the least recently used archives are evicted when the cache is too large."""
+        a = self.cache.get_or_create("a", self.build(4))
+        b = self.cache.get_or_create("b", self.build(4))
+        os.utime(a, (1000, 1000))
+        os.utime(b, (2000, 2000))
+        self.cache.get("a")
+        self.cache.get_or_create("c", self.build(4))
+        self.assertEqual(sorted(os.listdir(self.folder)), ["a.zip", "c.zip"])
+
+    def test_evict_by_age(self):
+        """Test that archives that are not used for max_age seconds are evicted."""
+        a = self.cache.get_or_create("a", self.build(1))
+        os.utime(a, (0, 0))
+        self.assertEqual(self.cache.evict(), [a])
+        self.assertIsNone(self.cache.get("a"))
+
+
+class TestProfileMatcher(TestCase):
+    """Test matching files against all profiles of a script in one pass."""
+
+    class Template:
+        """Input template stand-in."""
+
+        def __init__(
+            self, id, profile, extension, optional=False, unique=False
+        ):
+            self.id = id
+            self.corresponding_profile_id = profile
+            self.extension = extension
+            self.optional = optional
+            self.unique = unique
+
+    class Profile:
+        """Profile stand-in."""
+
+        def __init__(self, id):
+            self.id = id
+
+    def setUp(self):
+        self.profiles = [self.Profile(1), self.Profile(2), self.Profile(3)]
+        self.matcher = ProfileMatcher(
+            self.profiles,
+            [
+                self.Template(1, 1, "wav"),
+                self.Template(2, 1, "txt"),
+                self.Template(3, 2, "wav", unique=True),
+                self.Template(4, 2, "oov.dict"),
+                self.Template(5, 3, ".dict", optional=True),
+            ],
+        )
+
+    def test_suffixes(self):
+        """Test that all multi-dot extensions of a file name are found."""
+        self.assertEqual(
+            get_suffixes("a.b.oov.dict"), ["b.oov.dict", "oov.dict", "dict"]
+        )
+        self.assertEqual(get_suffixes("noextension"), [])
+
+    def test_classify(self):
+        """Test that files are assigned to every template accepting them."""
+        assignment = self.matcher.classify(["a.wav", "a.txt", "a.oov.dict"])
+        self.assertEqual(
+            assignment,
+            {
+                1: ["a.wav"],
+                2: ["a.txt"],
+                3: ["a.wav"],
+                4: ["a.oov.dict"],
+                5: ["a.oov.dict"],
+            },
+        )
+
+    def test_match(self):
+        """Test that the valid profiles are returned with their file assignment."""
+        matches = self.matcher.match(["a.wav", "b.wav", "a.txt", "a.oov.dict"])
+        self.assertEqual(
+            [(profile.id, assignment) for profile, assignment in matches],
+            [
+                (1, {1: ["a.wav", "b.wav"], 2: ["a.txt"]}),
+                (3, {5: ["a.oov.dict"]}),
+            ],
+        )
+
+    def test_match_dot_boundary(self):
+        """Test that an extension only matches after a dot."""
+        matches = self.matcher.match(["a.xwav", "a.txt"])
+        self.assertEqual([profile.id for profile, _ in matches], [3])
+
+
+class TestShards(TestCase):
+    """Test splitting files into shards and merging their outputs."""
+
+    def test_split_into_shards(self):
+        """Test that related files stay together and shards are balanced by size."""
+        groups = {
+            "a": (["a.wav", "a.txt"], 50),
+            "b": (["b.wav", "b.txt"], 30),
+            "c": (["c.wav", "c.txt"], 20),
+            "d": (["d.wav", "d.txt"], 10),
+        }
+        self.assertEqual(
+            split_into_shards(groups, 2),
+            [
+                ["a.txt", "a.wav", "d.txt", "d.wav"],
+                ["b.txt", "b.wav", "c.txt", "c.wav"],
+            ],
+        )
+        self.assertEqual(len(split_into_shards(groups, 8)), 4)
+        self.assertEqual(len(split_into_shards(groups, 0)), 1)
+
+    def test_append_file(self):
+        """Test that files are concatenated with a newline in between."""
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        source = os.path.join(folder, "source.oov")
+        target = os.path.join(folder, "target.oov")
+        with open(source, "w") as f:
+            f.write("second\n")
+        with open(target, "w") as f:
+            f.write("first")
+        append_file(source, target)
+        append_file(source, target)
+        with open(target) as f:
+            self.assertEqual(f.read(), "first\nsecond\nsecond\n")
@@ -1,53 +1,377 @@
-import time
-from django.test import TestCase
-from scripts.models import *
-import os
-from scripts.tasks import *
-from unittest.mock import patch, Mock
-from background_task import background
-from background_task.tasks import tasks
-from scripts.tasks import update_script
-
-
-class TestTasks(TestCase):
-    """Test the background tasks in tasks.py."""
-
-    fixtures = [
-        "simple_pipelines.json",
-    ]
-
-    def setUp(self):
-        """Set up the data needed to perform tests below."""
-        self.process1 = Process.objects.create(
-            script=Script.objects.all()[0],
-            folder=os.path.abspath(os.path.dirname(__file__)),
-        )
-        self.id1 = self.process1.get_random_clam_id()
-        self.process1.set_clam_id(self.id1)
-        self.process1.set_status(STATUS_WAITING)
-        self.process2 = Process.objects.create(
-            script=Script.objects.all()[1],
-            folder=os.path.abspath(os.path.dirname(__file__)),
-        )
-        self.id2 = self.process2.get_random_clam_id()
-        self.process2.set_clam_id(self.id2)
-        self.process2.set_status(STATUS_RUNNING)
-
-    @patch(
-        "scripts.models.Process.get_status",
-        side_effect=[
-            scripts.models.STATUS_RUNNING,
-            scripts.models.STATUS_WAITING,
-        ],
-    )
-    @patch("scripts.models.Process.clam_update")
-    @patch("scripts.models.Process.download_and_delete")
-    def test_update_script(self, mockWaiting, mockRunning, mockStatus):
-        """Tests the update_script function."""
-        update_script.now(1)
-        assert mockWaiting.call_count == 0
-        assert mockRunning.call_count == 1
-        update_script.now(1)
-        assert mockWaiting.call_count == 1
-        assert mockRunning.call_count == 1
-        update_script(1)
+import shutil
+import tempfile
+import time
+from django.test import TestCase
+from scripts.models import *
+import os
+from scripts.tasks import *
+from unittest.mock import patch, Mock
+from background_task import background
+from background_task.tasks import tasks
+from scripts.tasks import update_script
+from django.contrib.auth import get_user_model
+
+
+class TestTasks(TestCase):
+    """Test the background tasks in tasks.py."""
+
+    fixtures = [
+        "simple_pipelines.json",
+    ]
+
+    def setUp(self):
+        """Set up the data needed to perform tests below."""
+        self.process1 = Process.objects.create(
+            script=Script.objects.all()[0],
+            folder=os.path.abspath(os.path.dirname(__file__)),
+        )
+        self.id1 = self.process1.get_random_clam_id()
+        self.process1.set_clam_id(self.id1)
+        self.process1.set_status(STATUS_WAITING)
+        self.process2 = Process.objects.create(
+            script=Script.objects.all()[1],
+            folder=os.path.abspath(os.path.dirname(__file__)),
+        )
+        self.id2 = self.process2.get_random_clam_id()
+        self.process2.set_clam_id(self.id2)
+        self.process2.set_status(STATUS_RUNNING)
+
+    @patch(
+        "scripts.models.Process.get_status",
+        side_effect=[
+            scripts.models.STATUS_RUNNING,
+            scripts.models.STATUS_WAITING,
+        ],
+    )
+    @patch("scripts.models.Process.clam_update")
+    @patch("scripts.models.Process.download_and_delete")
+    def test_update_script(self, mockWaiting, mockRunning, mockStatus):
+        """Tests the update_script function."""
+        update_script.now(1)
+        assert mockWaiting.call_count == 0
+        assert mockRunning.call_count == 1
+        update_script.now(1)
+        assert mockWaiting.call_count == 1
+        assert mockRunning.call_count == 1
+        update_script(1)
+
+    @patch("scripts.tasks.download_process")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_poll_running_processes(self, mockServer, mockDownload):
+        """Test that one poll cycle moves finished processes to waiting."""
+        status = Mock(
+            status=clam.common.status.DONE, xml="<clam></clam>", errors=False
+        )
+        mockServer.return_value.get.return_value = status
+        process3 = Process.objects.create(
+            script=Script.objects.all()[1],
+            folder=os.path.abspath(os.path.dirname(__file__)),
+            clam_id=Process.get_random_clam_id(),
+            status=STATUS_RUNNING,
+        )
+        finished, failed = poll_running_processes()
+        self.assertEqual(finished, [self.process2.id, process3.id])
+        self.assertEqual(failed, [])
+        self.assertEqual(mockServer.call_count, 1)
+        self.assertEqual(mockServer.return_value.get.call_count, 2)
+        self.assertEqual(mockDownload.call_count, 2)
+        self.assertEqual(
+            Process.objects.get(id=self.process2.id).status, STATUS_WAITING
+        )
+        self.assertEqual(
+            Process.objects.get(id=self.process1.id).status, STATUS_WAITING
+        )
+
+    @patch("scripts.tasks.download_process")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_poll_running_processes_error(self, mockServer, mockDownload):
+        """Test that a process only fails after repeatedly failing CLAM requests."""
+        mockServer.return_value.get.side_effect = ValueError("CLAM is down")
+        for attempt in range(settings.CLAM_POLL_MAX_FAILURES - 1):
+            finished, failed = poll_running_processes()
+            self.assertEqual((finished, failed), ([], []))
+            process = Process.objects.get(id=self.process2.id)
+            self.assertEqual(process.status, STATUS_RUNNING)
+            self.assertEqual(process.poll_failures, attempt + 1)
+            Process.objects.filter(id=self.process2.id).update(
+                next_poll=timezone.now()
+            )
+        finished, failed = poll_running_processes()
+        self.assertEqual(finished, [])
+        self.assertEqual(failed, [self.process2.id])
+        self.assertEqual(mockDownload.call_count, 0)
+        self.assertEqual(
+            Process.objects.get(id=self.process2.id).status, STATUS_ERROR
+        )
+
+    @patch("scripts.tasks.download_process")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_poll_running_processes_recovers(self, mockServer, mockDownload):
+        """Test that a successful CLAM request resets the number of failures."""
+        status = Mock(
+            status=clam.common.status.RUNNING,
+            xml="",
+            completion=0,
+            errors=False,
+        )
+        mockServer.return_value.get.side_effect = [
+            ValueError("CLAM is down"),
+            status,
+        ]
+        poll_running_processes()
+        self.assertEqual(
+            Process.objects.get(id=self.process2.id).poll_failures, 1
+        )
+        Process.objects.filter(id=self.process2.id).update(
+            next_poll=timezone.now()
+        )
+        self.assertEqual(poll_running_processes(), ([], []))
+        process = Process.objects.get(id=self.process2.id)
+        self.assertEqual(process.poll_failures, 0)
+        self.assertEqual(process.status, STATUS_RUNNING)
+
+    @patch("scripts.tasks.download_process")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_poll_running_processes_not_found(self, mockServer, mockDownload):
+        """Test that a process fails immediately when its project does not exist on CLAM."""
+        mockServer.return_value.get.side_effect = clam.common.data.NotFound(
+            "Not found"
+        )
+        self.assertEqual(poll_running_processes(), ([], [self.process2.id]))
+        self.assertEqual(
+            Process.objects.get(id=self.process2.id).status, STATUS_ERROR
+        )
+
+    @patch("scripts.tasks.download_process")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_poll_running_processes_backoff(self, mockServer, mockDownload):
+        """Test that processes are only polled when due and back off without activity."""
+        status = Mock(
+            status=clam.common.status.RUNNING,
+            xml="",
+            completion=0,
+            errors=False,
+        )
+        mockServer.return_value.get.return_value = status
+        poll_running_processes()
+        process = Process.objects.get(id=self.process2.id)
+        self.assertEqual(process.poll_interval, settings.CLAM_POLL_MIN_INTERVAL)
+        self.assertIsNotNone(process.next_poll)
+        poll_running_processes()
+        self.assertEqual(mockServer.return_value.get.call_count, 1)
+
+        Process.objects.filter(id=self.process2.id).update(
+            next_poll=timezone.now()
+        )
+        poll_running_processes()
+        process = Process.objects.get(id=self.process2.id)
+        self.assertEqual(
+            process.poll_interval,
+            settings.CLAM_POLL_MIN_INTERVAL * settings.CLAM_POLL_BACKOFF_FACTOR,
+        )
+        self.assertLessEqual(
+            seconds_until_next_poll(3600), process.poll_interval
+        )
+
+    @patch("scripts.tasks.get_clam_metadata")
+    @patch("scripts.models.Script.get_clam_server")
+    def test_sync_scripts(self, mockServer, mockMetadata):
+        """Test that scripts are only updated when their CLAM data changed."""
+        data = Mock(
+            xml="<clam><profiles/><parameters/></clam>",
+            profiles=[],
+            passparameters=Mock(return_value={}),
+        )
+        mockMetadata.return_value = data
+        script_ids = list(
+            Script.objects.order_by("id").values_list("id", flat=True)
+        )
+        changed, failed = sync_scripts()
+        self.assertEqual(changed, script_ids)
+        self.assertEqual(failed, [])
+        self.assertEqual(mockMetadata.call_count, len(script_ids))
+        for script in Script.objects.all():
+            self.assertEqual(
+                script.clam_fingerprint, Script.get_clam_fingerprint(data)
+            )
+            self.assertIsNotNone(script.last_sync_duration)
+
+        mockMetadata.side_effect = [ValueError("CLAM is down")] + [data] * (
+            len(script_ids) - 1
+        )
+        changed, failed = sync_scripts()
+        self.assertEqual(changed, [])
+        self.assertEqual(len(failed), 1)
+
+
+class TestScheduleBatches(TestCase):
+    """Test the scheduling of the projects of batches."""
+
+    fixtures = [
+        "simple_pipelines.json",
+    ]
+
+    def setUp(self):
+        """Set up a batch with three projects on the same CLAM host."""
+        self.user = get_user_model().objects.create_user("batchUser")
+        self.pipeline = Pipeline.objects.get(pk=1)
+        self.projects = [
+            Project.objects.create(
+                name="project{}".format(i),
+                folder=os.path.abspath(os.path.dirname(__file__)),
+                pipeline=self.pipeline,
+                user=self.user,
+            )
+            for i in range(3)
+        ]
+        self.batch = Batch.create_batch("batch", self.projects, self.user)
+
+    def queue_script(self, project, profile, script, parameter_values=None):
+        """Stand-in for Project.queue_script that only creates a queued process."""
+        project.current_process = Process.objects.create(
+            script=script, folder=project.folder, status=STATUS_QUEUED
+        )
+        project.save()
+        return project.current_process
+
+    def finish(self, entry_id, status=STATUS_FINISHED):
+        """Set the status of the process of a batch project."""
+        Process.objects.filter(batchproject__id=entry_id).update(status=status)
+
+    @patch("scripts.models.Project.has_non_empty_extension_file")
+    @patch("scripts.models.Project.get_valid_profiles")
+    def test_schedule_batches(self, mockProfiles, mockOOV):
+        """Test that projects are started within the host limit and move through their pipeline."""
+        mockProfiles.return_value = [Mock(script=self.pipeline.fa_script)]
+        oov = iter([True, False])
+        mockOOV.side_effect = lambda extensions, folder=None: (
+            extensions == ["oov"] and next(oov)
+        )
+        entry_ids = list(
+            self.batch.entries.order_by("id").values_list("id", flat=True)
+        )
+        with patch(
+            "scripts.models.Project.queue_script",
+            autospec=True,
+            side_effect=self.queue_script,
+        ):
+            advanced, started = schedule_batches(max_in_flight_per_host=2)
+            self.assertEqual(advanced, [])
+            self.assertEqual(started, entry_ids[:2])
+            self.assertEqual(self.batch.get_progress()["in_flight"], 2)
+
+            advanced, started = schedule_batches(max_in_flight_per_host=2)
+            self.assertEqual((advanced, started), ([], []))
+
+            self.finish(entry_ids[0])
+            self.finish(entry_ids[1], status=STATUS_ERROR)
+            advanced, started = schedule_batches(max_in_flight_per_host=2)
+            self.assertEqual(advanced, entry_ids[:2])
+            self.assertEqual(started, [entry_ids[0], entry_ids[2]])
+            entry = BatchProject.objects.get(id=entry_ids[0])
+            self.assertEqual(entry.step, BatchProject.G2P)
+            self.assertEqual(entry.process.script, self.pipeline.g2p_script)
+            entry = BatchProject.objects.get(id=entry_ids[1])
+            self.assertEqual(entry.step, BatchProject.FAILED)
+            self.assertEqual(entry.error_message, "Error")
+
+            self.finish(entry_ids[0])
+            self.finish(entry_ids[2])
+            schedule_batches(max_in_flight_per_host=2)
+            self.assertEqual(
+                BatchProject.objects.get(id=entry_ids[0]).step,
+                BatchProject.REALIGN,
+            )
+            self.assertEqual(
+                BatchProject.objects.get(id=entry_ids[2]).step,
+                BatchProject.DONE,
+            )
+
+            self.finish(entry_ids[0])
+            schedule_batches(max_in_flight_per_host=2)
+        progress = Batch.objects.get(id=self.batch.id).get_progress()
+        self.assertEqual(progress["done"], 2)
+        self.assertEqual(progress["failed"], 1)
+        self.assertTrue(progress["finished"])
+        self.assertEqual(progress["eta"], 0)
+        self.assertEqual(list(oov), [])
+
+    def test_advance_oov(self):
+        """Test that G2P only runs after forced alignment when its output has words missing from the dictionary."""
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        entries = list()
+        for name, oov_file in (
+            ("oov", os.path.join(Project.OUTPUT_FOLDER, "a.oov")),
+            ("no_oov", "a.oov"),
+        ):
+            project_folder = os.path.join(folder, name)
+            os.makedirs(os.path.join(project_folder, Project.OUTPUT_FOLDER))
+            with open(os.path.join(project_folder, oov_file), "w") as file:
+                file.write("word\n")
+            project = Project.objects.create(
+                name=name,
+                folder=project_folder,
+                pipeline=self.pipeline,
+                user=self.user,
+            )
+            batch = Batch.create_batch(name, [project], self.user)
+            entry = batch.entries.get()
+            entry.process = Process.objects.create(
+                script=self.pipeline.fa_script,
+                folder=project_folder,
+                status=STATUS_FINISHED,
+            )
+            entry.save()
+            entries.append(entry)
+
+        for entry in entries:
+            self.assertTrue(entry.advance())
+        self.assertEqual(entries[0].step, BatchProject.G2P)
+        self.assertEqual(entries[1].step, BatchProject.DONE)
+
+    def test_schedule_batches_error(self):
+        """Test that a project raising an error fails without stopping the other projects."""
+        entry_ids = list(
+            self.batch.entries.order_by("id").values_list("id", flat=True)
+        )
+
+        def start(entry):
+            if entry.id == entry_ids[0]:
+                raise ValueError("CLAM is down")
+            return True
+
+        with patch(
+            "scripts.models.BatchProject.start",
+            autospec=True,
+            side_effect=start,
+        ):
+            advanced, started = schedule_batches(max_in_flight_per_host=3)
+        self.assertEqual(started, entry_ids[1:])
+        entry = BatchProject.objects.get(id=entry_ids[0])
+        self.assertEqual(entry.step, BatchProject.FAILED)
+        self.assertIn("CLAM is down", entry.error_message)
+
+        BatchProject.objects.filter(id__in=entry_ids[1:]).update(
+            process=Process.objects.create(
+                script=self.pipeline.fa_script,
+                folder=self.projects[1].folder,
+                status=STATUS_FINISHED,
+            )
+        )
+
+        def advance(entry):
+            if entry.id == entry_ids[1]:
+                raise FileNotFoundError("No output folder")
+            return True
+
+        with patch(
+            "scripts.models.BatchProject.advance",
+            autospec=True,
+            side_effect=advance,
+        ), patch("scripts.models.BatchProject.start", return_value=False):
+            advanced, started = schedule_batches(max_in_flight_per_host=3)
+        self.assertEqual(advanced, entry_ids[2:])
+        entry = BatchProject.objects.get(id=entry_ids[1])
+        self.assertEqual(entry.step, BatchProject.FAILED)
+        self.assertIn("No output folder", entry.error_message)
@@ -0,0 +1,183 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from scripts.models import (
+    Batch,
+    Pipeline,
+    Process,
+    Project,
+    Script,
+    LogMessage,
+    STATUS_RUNNING,
+)
+
+
+class TestJsonProcess(TestCase):
+    """Test the JSON status endpoint of processes."""
+
+    def setUp(self):
+        self.script = Script.objects.create(name="script", hostname="na")
+        self.process = Process.objects.create(
+            script=self.script, status=STATUS_RUNNING, log_high_water=2
+        )
+        for index in range(2):
+            LogMessage.objects.create(
+                process=self.process,
+                index=index,
+                message="message {}".format(index),
+            )
+        self.url = reverse(
+            "scripts:process_details", kwargs={"process": self.process}
+        )
+        self.client = Client()
+
+    def test_get_since(self):
+        """Test that only the log messages after the cursor are returned."""
+        response = self.client.get(self.url).json()
+        self.assertEqual(response["status"], STATUS_RUNNING)
+        self.assertEqual(len(response["log"]), 2)
+        self.assertEqual(response["cursor"], 2)
+
+        response = self.client.get(self.url, {"since": 1}).json()
+        self.assertEqual([x["message"] for x in response["log"]], ["message 1"])
+        self.assertEqual(response["cursor"], 2)
+
+        response = self.client.get(self.url, {"since": 2}).json()
+        self.assertEqual(response["log"], [])
+
+    def test_get_not_modified(self):
+        """Test that a conditional request is answered with 304 until something changes."""
+        response = self.client.get(self.url, {"since": 2})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(
+            self.url, {"since": 2}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        LogMessage.objects.create(
+            process=self.process, index=2, message="message 2"
+        )
+        Process.objects.filter(pk=self.process.pk).update(log_high_water=3)
+        response = self.client.get(
+            self.url, {"since": 2}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [x["message"] for x in response.json()["log"]], ["message 2"]
+        )
+
+    @override_settings(
+        PROCESS_LONG_POLL_TIMEOUT=0.2, PROCESS_LONG_POLL_INTERVAL=0.05
+    )
+    def test_get_wait_timeout(self):
+        """Test that a long poll request is answered with 304 when nothing changes."""
+        etag = self.client.get(self.url, {"since": 2})["ETag"]
+        response = self.client.get(
+            self.url, {"since": 2, "wait": 10}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_wait_change(self):
+        """Test that a long poll request returns as soon as the process changes."""
+        etag = self.client.get(self.url, {"since": 2})["ETag"]
+
+        def finish_process(seconds):
+            Process.objects.filter(pk=self.process.pk).update(
+                error_message="Something went wrong"
+            )
+
+        with patch("scripts.views.time.sleep", side_effect=finish_process):
+            response = self.client.get(
+                self.url, {"since": 2, "wait": 10}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["error_message"], "Something went wrong"
+        )
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(PROCESS_LONG_POLL_INTERVAL=2.5)
+    def test_get_wait_limit(self):
+        """Test that a long poll request is answered immediately when too many requests are waiting."""
+        etag = self.client.get(self.url, {"since": 2})["ETag"]
+        with patch(
+            "scripts.views.long_poll_slots", threading.BoundedSemaphore(1)
+        ) as slots:
+            slots.acquire()
+            with patch("scripts.views.time.sleep") as sleep:
+                response = self.client.get(
+                    self.url, {"since": 2, "wait": 10}, HTTP_IF_NONE_MATCH=etag
+                )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Retry-After"], "3")
+        sleep.assert_not_called()
+
+    def test_post(self):
+        """Test that POST requests return the full log by default."""
+        response = self.client.post(self.url).json()
+        self.assertEqual(len(response["log"]), 2)
+        self.assertEqual(response["error_message"], "")
+
+
+class TestBatchViews(TestCase):
+    """Test the views of batches."""
+
+    fixtures = ["simple_pipelines.json"]
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "batchUser", password="batchpass"
+        )
+        self.other = get_user_model().objects.create_user(
+            "otherUser", password="otherpass"
+        )
+        self.project = Project.objects.create(
+            name="project",
+            folder="/tmp",
+            pipeline=Pipeline.objects.get(pk=1),
+            user=self.user,
+        )
+        self.client = Client()
+        self.client.login(username="batchUser", password="batchpass")
+
+    def test_create_batch(self):
+        """Test that a batch is created from the projects of the user."""
+        response = self.client.post(
+            reverse("scripts:batches"),
+            {"batch_name": "batch", "projects": [self.project.id]},
+        )
+        self.assertRedirects(response, reverse("scripts:batches"))
+        batch = Batch.objects.get(name="batch")
+        self.assertEqual(batch.user, self.user)
+        self.assertEqual(
+            list(batch.entries.values_list("project", flat=True)),
+            [self.project.id],
+        )
+        response = self.client.get(reverse("scripts:batches"))
+        self.assertContains(response, "0 of 1 projects done")
+
+    def test_create_batch_other_project(self):
+        """Test that projects of other users can not be added to a batch."""
+        self.client.login(username="otherUser", password="otherpass")
+        response = self.client.post(
+            reverse("scripts:batches"),
+            {"batch_name": "batch", "projects": [self.project.id]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Batch.objects.exists())
+
+    def test_batch_status(self):
+        """Test that only the owner can get the status of a batch."""
+        batch = Batch.create_batch("batch", [self.project], self.user)
+        url = reverse("scripts:batch_details", kwargs={"batch": batch})
+        response = self.client.get(url).json()
+        self.assertEqual(response["total"], 1)
+        self.assertEqual(response["projects"][0]["step"], "Forced alignment")
+
+        self.client.login(username="otherUser", password="otherpass")
+        self.assertEqual(self.client.get(url).status_code, 403)
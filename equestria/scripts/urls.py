@@ -6,15 +6,23 @@ from .converters import (
     ProfileConverter,
     ProcessConverter,
     ScriptConverter,
+    BatchConverter,
 )
 
 register_converter(ProjectConverter, "project")
 register_converter(ProfileConverter, "profile")
 register_converter(ProcessConverter, "process")
 register_converter(ScriptConverter, "script")
+register_converter(BatchConverter, "batch")
 
 urlpatterns = [
     path("projects", ProjectOverview.as_view(), name="projects"),
+    path("batches", BatchOverview.as_view(), name="batches"),
+    path(
+        "batches/<batch:batch>/status",
+        JsonBatch.as_view(),
+        name="batch_details",
+    ),
     path(
         "projects/<project:project>/delete",
         ProjectDeleteView.as_view(),
@@ -1,12 +1,32 @@
 """Module to handle uploading files."""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
 from django.views.generic import TemplateView
 from django.shortcuts import render, redirect
-from os.path import basename, dirname
-from django.views.static import serve
-from .models import Project, Profile, Pipeline, BaseParameter
-from django.http import JsonResponse
+from .models import (
+    Batch,
+    Project,
+    Profile,
+    Pipeline,
+    Process,
+    STATUS_ERROR,
+)
+from django.http import (
+    JsonResponse,
+    HttpResponseNotModified,
+    FileResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
+from django.utils.http import parse_etags, quote_etag, urlencode
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import (
+    BatchCreateForm,
     ProjectCreateForm,
     AlterDictionaryForm,
     ProfileSelectForm,
@@ -119,7 +139,7 @@ class AutomaticScriptStartView(LoginRequiredMixin, TemplateView):
         if not project.is_project_script(script):
             raise ValueError("Script is not a project script")
 
-        valid_profiles = script.get_valid_profiles(project.folder)
+        valid_profiles = project.get_valid_profiles(script)
         if len(valid_profiles) > 1:
             profile_form = ProfileSelectForm(
                 request.POST, profiles=valid_profiles
@@ -131,8 +151,8 @@ class AutomaticScriptStartView(LoginRequiredMixin, TemplateView):
             return self.get_render_no_profiles(request, project, script)
         else:
             profile = valid_profiles[0]
-            return redirect(
-                "scripts:start", project=project, profile=profile, script=script
+            return redirect_to_start(
+                project, profile, script, get_shards(request)
             )
 
     def post(self, request, **kwargs):
@@ -150,16 +170,14 @@ class AutomaticScriptStartView(LoginRequiredMixin, TemplateView):
         if not project.is_project_script(script):
             raise ValueError("Script is not a project script")
 
-        valid_profiles = project.pipeline.fa_script.get_valid_profiles(
-            project.folder
-        )
+        valid_profiles = project.get_valid_profiles(script)
         profile_form = ProfileSelectForm(request.POST, profiles=valid_profiles)
         if profile_form.is_valid():
             profile = Profile.objects.get(
                 pk=profile_form.cleaned_data.get("profile")
             )
-            return redirect(
-                "scripts:start", project=project, profile=profile, script=script
+            return redirect_to_start(
+                project, profile, script, get_shards(request)
             )
         else:
             return self.get_render_multiple_profiles(
@@ -213,7 +231,9 @@ class ScriptStartView(LoginRequiredMixin, TemplateView):
         variable_parameters = script.get_variable_parameters()
         parameter_form = ParameterForm(variable_parameters)
 
-        started, error = start_script_get_error(script, project, profile,)
+        started, error = start_script_get_error(
+            script, project, profile, shards=get_shards(request)
+        )
         if started:
             return redirect(redirect_link, project=project, script=script)
         else:
@@ -259,6 +279,7 @@ class ScriptStartView(LoginRequiredMixin, TemplateView):
             parameters=parameter_form.cleaned_data
             if parameter_form.is_valid()
             else None,
+            shards=get_shards(request),
         )
         if started:
             return redirect(redirect_link, project=project, script=script)
@@ -332,7 +353,8 @@ class ScriptLoadScreen(LoginRequiredMixin, TemplateView):
         :param kwargs: keyword arguments
         :return: removes a finished process from a project and then redirects to the fa redirect screen. If the
         project has no running process, the user will be redirected to the change dictionary screen as well. If the
-        process of the project is not finished yet, this function raises a Project.StateException
+        process of the project failed, it is removed and the user is redirected to the automatic start screen to try
+        again. If the process of the project is not finished yet, this function raises a Project.StateException
         """
         project = kwargs.get("project")
         script = kwargs.get("script")
@@ -352,6 +374,11 @@ class ScriptLoadScreen(LoginRequiredMixin, TemplateView):
         if project.current_process.is_finished():
             project.cleanup()
             return redirect(continue_link, project=project)
+        elif project.current_process.get_status() == STATUS_ERROR:
+            project.cleanup()
+            return redirect(
+                "scripts:start_automatic", project=project, script=script
+            )
         else:
             raise Project.StateException("Current process is not finished yet")
 
@@ -450,36 +477,177 @@ class CheckDictionaryScreen(LoginRequiredMixin, TemplateView):
             )
 
 
+long_poll_slots = threading.BoundedSemaphore(
+    settings.PROCESS_LONG_POLL_MAX_WAITERS
+)
+
+
 class JsonProcess(TemplateView):
     """View for representing Processes as JSON."""
 
     def get(self, request, **kwargs):
         """
-        Get request, actually redirecting everything to the POST method.
+        Get request, used for serving AJAX requests the log messages after a cursor and the status of a process.
 
-        :param request: the request of the user
+        The response carries an ETag so that clients can send a conditional request, which is answered with a 304 Not
+        Modified response when nothing changed since the previous request. Conditional requests with a wait GET
+        parameter are held open until the process changes or the wait time (at most PROCESS_LONG_POLL_TIMEOUT seconds)
+        has passed, so clients can long poll for status changes and new log messages. At most
+        PROCESS_LONG_POLL_MAX_WAITERS requests per server process wait at the same time, other requests are answered
+        immediately with a Retry-After header.
+        :param request: the request of the user, the since GET parameter indicates the index of the first log message
+        to return, the wait GET parameter the number of seconds to wait for a change
         :param kwargs: the keyword arguments
-        :return: the same as self.post returns
+        :return: a JsonResponse in the format of self.get_process_data, or a HttpResponseNotModified if the ETag of
+        the request matches
         """
-        return self.post(request, **kwargs)
+        process = kwargs.get("process")
+        since = JsonProcess.get_cursor(request.GET.get("since"))
+        etag = JsonProcess.get_etag(process, since)
+        etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        wait = JsonProcess.get_wait(request.GET.get("wait"))
+        retry_after = None
+        if wait > 0 and etag in etags:
+            if long_poll_slots.acquire(blocking=False):
+                try:
+                    etag = JsonProcess.wait_for_change(
+                        process, since, etag, wait
+                    )
+                finally:
+                    long_poll_slots.release()
+            else:
+                retry_after = math.ceil(settings.PROCESS_LONG_POLL_INTERVAL)
+        if etag in etags:
+            response = HttpResponseNotModified()
+            if retry_after is not None:
+                response["Retry-After"] = retry_after
+        else:
+            response = JsonResponse(
+                JsonProcess.get_process_data(process, since)
+            )
+        response["ETag"] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
 
     def post(self, request, **kwargs):
         """
         Post request, used for serving AJAX requests the information they need.
 
-        :param request: the request of the user
+        :param request: the request of the user, the since POST parameter indicates the index of the first log
+        message to return
         :param kwargs: the keyword arguments
-        :return: a JsonResponse containing the following information:
+        :return: a JsonResponse in the format of self.get_process_data
+        """
+        process = kwargs.get("process")
+        since = JsonProcess.get_cursor(request.POST.get("since"))
+        return JsonResponse(JsonProcess.get_process_data(process, since))
+
+    @staticmethod
+    def get_cursor(value):
+        """
+        Parse a log message cursor.
+
+        :param value: the value of the cursor parameter in the request
+        :return: the index of the first log message to return, 0 if the cursor is missing or invalid
+        """
+        try:
+            return max(0, int(value))
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def get_wait(value):
+        """
+        Parse the number of seconds to wait for a change.
+
+        :param value: the value of the wait parameter in the request
+        :return: the number of seconds to wait, at most PROCESS_LONG_POLL_TIMEOUT, 0 if the parameter is missing or
+        invalid
+        """
+        try:
+            return max(0, min(float(value), settings.PROCESS_LONG_POLL_TIMEOUT))
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def wait_for_change(process, since, etag, wait):
+        """
+        Wait until the status of a process changes.
+
+        The process is only read from the database once every PROCESS_LONG_POLL_INTERVAL seconds, so a waiting request
+        does not query the database more often than a client polling in that interval.
+        :param process: the process, it is refreshed from the database while waiting
+        :param since: the index of the first log message to return
+        :param etag: the ETag of the process status the client already has
+        :param wait: the maximum number of seconds to wait
+        :return: the ETag of the process status after waiting, equal to etag if nothing changed
+        """
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(
+                min(
+                    settings.PROCESS_LONG_POLL_INTERVAL,
+                    max(0, deadline - time.monotonic()),
+                )
+            )
+            process.refresh_from_db(
+                fields=[
+                    "status",
+                    "log_high_water",
+                    "upload_files_done",
+                    "upload_bytes_done",
+                    "error_message",
+                ]
+            )
+            new_etag = JsonProcess.get_etag(process, since)
+            if new_etag != etag:
+                return new_etag
+        return etag
+
+    @staticmethod
+    def get_etag(process, since):
+        """
+        Get the ETag for the status of a process.
+
+        :param process: the process
+        :param since: the index of the first log message to return
+        :return: a quoted ETag that changes whenever the response for this process and cursor changes
+        """
+        return quote_etag(
+            hashlib.md5(
+                "{}-{}-{}-{}-{}-{}".format(
+                    since,
+                    process.status,
+                    process.log_high_water,
+                    process.upload_files_done,
+                    process.upload_bytes_done,
+                    process.error_message,
+                ).encode("utf-8")
+            ).hexdigest()
+        )
+
+    @staticmethod
+    def get_process_data(process, since=0):
+        """
+        Get the information of a process to serve to AJAX requests.
+
+        :param process: the process
+        :param since: the index of the first log message to return
+        :return: a dictionary containing the following information:
                     - status (of the process)
-                    - status_message
-                    - errors (true or false, if errors occurred)
+                    - log (the CLAM log messages of the process from index since)
+                    - cursor (the index to pass as since to only get the log messages after these)
+                    - upload (the number of files and bytes uploaded to CLAM and to upload)
                     - error_message (emtpy if no errors occurred, a message otherwise)
         """
-        process = kwargs.get("process")
-        clam_status = process.get_status()
-        clam_msg = process.get_status_messages()
-        log_messages = JsonProcess.construct_clam_log_format(clam_msg)
-        return JsonResponse({"status": clam_status, "log": log_messages})
+        clam_msg = process.get_status_messages().filter(index__gte=since)
+        return {
+            "status": process.get_status(),
+            "log": JsonProcess.construct_clam_log_format(clam_msg),
+            "cursor": max(since, process.log_high_water),
+            "upload": process.get_upload_progress(),
+            "error_message": process.error_message,
+        }
 
     @staticmethod
     def construct_clam_log_format(clam_msg):
@@ -515,7 +683,7 @@ class ProjectOverview(LoginRequiredMixin, TemplateView):
         """
         pipelines = Pipeline.objects.all()
         form = ProjectCreateForm(request.user, None, pipelines=pipelines)
-        projects = Project.objects.filter(user=request.user.id)
+        projects = Project.get_overview(request.user)
         return render(
             request, self.template_name, {"form": form, "projects": projects},
         )
@@ -532,7 +700,7 @@ class ProjectOverview(LoginRequiredMixin, TemplateView):
         form = ProjectCreateForm(
             request.user, request.POST, pipelines=pipelines
         )
-        projects = Project.objects.filter(user=request.user.id)
+        projects = Project.get_overview(request.user)
         if form.is_valid():
             pipeline_id = form.cleaned_data.get("pipeline")
             project_name = form.cleaned_data.get("project_name")
@@ -582,39 +750,156 @@ class ProjectDeleteView(LoginRequiredMixin, TemplateView):
         return redirect("scripts:projects")
 
 
-def start_script_get_error(script_to_start, project, profile, parameters=None):
+class BatchOverview(LoginRequiredMixin, TemplateView):
+    """Overview of the batches of a user."""
+
+    login_url = "/accounts/login/"
+
+    template_name = "scripts/batch-overview.html"
+
+    def get_batches(self, user):
+        """
+        Get the batches of a user with their progress.
+
+        :param user: the user
+        :return: a list of tuples (batch, progress)
+        """
+        return [
+            (batch, batch.get_progress())
+            for batch in Batch.objects.filter(user=user.id)
+        ]
+
+    def get(self, request, **kwargs):
+        """
+        GET request for the batch overview page.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a render of the batch overview page
+        """
+        return render(
+            request,
+            self.template_name,
+            {
+                "form": BatchCreateForm(request.user),
+                "batches": self.get_batches(request.user),
+            },
+        )
+
+    def post(self, request, **kwargs):
+        """
+        POST request for the batch overview page, creates a batch.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a redirect to the batch overview page if the batch was created, a render of the batch overview page
+        with the errors of the form otherwise
+        """
+        form = BatchCreateForm(request.user, request.POST)
+        if form.is_valid():
+            Batch.create_batch(
+                form.cleaned_data.get("batch_name"),
+                form.cleaned_data.get("projects"),
+                request.user,
+            )
+            return redirect("scripts:batches")
+        return render(
+            request,
+            self.template_name,
+            {"form": form, "batches": self.get_batches(request.user)},
+        )
+
+
+class JsonBatch(LoginRequiredMixin, TemplateView):
+    """View for representing the progress of Batches as JSON."""
+
+    login_url = "/accounts/login/"
+
+    def get(self, request, **kwargs):
+        """
+        Get the progress and throughput of a batch.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a JSON response with the progress of the batch and the step of each of its projects
+        """
+        batch = kwargs.get("batch")
+        if batch.user_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied
+        progress = batch.get_progress()
+        progress["projects"] = [
+            {
+                "project": entry.project.name,
+                "step": entry.get_step_display(),
+                "running": entry.process_id is not None,
+                "error_message": entry.error_message,
+            }
+            for entry in batch.entries.select_related("project")
+        ]
+        return JsonResponse(progress)
+
+
+def get_shards(request):
+    """
+    Get the number of shards to split the input files of a script into from the query string of a request.
+
+    :param request: the request
+    :return: the value of the shards query parameter, 1 if it is missing or not a number
+    """
+    try:
+        return max(1, int(request.GET.get("shards", 1)))
+    except ValueError:
+        return 1
+
+
+def redirect_to_start(project, profile, script, shards):
+    """
+    Redirect to the start view of a script, keeping the number of shards to split the input files into.
+
+    :param project: the project
+    :param profile: the profile to start the script with
+    :param script: the script to start
+    :param shards: the number of shards to split the input files into
+    :return: a redirect to the start view
+    """
+    url = reverse(
+        "scripts:start",
+        kwargs={"project": project, "profile": profile, "script": script},
+    )
+    if shards > 1:
+        url = "{}?{}".format(url, urlencode({"shards": shards}))
+    return redirect(url)
+
+
+def start_script_get_error(
+    script_to_start, project, profile, parameters=None, shards=1
+):
     """
     Render a start screen.
 
-    This method is used by the FA start screen and the G2P start screen. This method tries to start a script and return
-    the process on success.
+    This method is used by the FA start screen and the G2P start screen. This method tries to queue a script for
+    starting, the process is started by a background worker that reports errors through the process status.
     :param parameters: a form for setting variable parameters
     :param script_to_start: the script to start
     :param project: the project to use
     :param profile: the profile to use
-    :return: a Process object if the script was started successfully. A render of the template_name page with a
-    corresponding error message if starting of the script failed
+    :param shards: the number of shards to split the input files into
+    :return: a tuple (True, "") if the script was queued successfully. A tuple (False, error) with a corresponding
+    error message if queueing the script failed
     """
     try:
         if parameters is not None:
-            project.start_script(
-                profile, script_to_start, parameter_values=parameters,
+            project.queue_script(
+                profile,
+                script_to_start,
+                parameter_values=parameters,
+                shards=shards,
             )
         else:
-            project.start_script(profile, script_to_start)
+            project.queue_script(profile, script_to_start, shards=shards)
         return True, ""
-    except BaseParameter.ParameterException:
-        error = "Not all script parameters are filled in"
-    except Project.StateException:
-        error = "There is already a running process for this project"
-    except Profile.IncorrectProfileException:
-        error = "Invalid profile for running this script"
-    except ValueError:
-        error = "Error while starting the process, make sure all input files are specified"
-    except Exception:
-        error = "Error while uploading files to CLAM, please try again later"
-
-    return False, error
+    except Exception as e:
+        return False, Process.get_start_error_message(e)
 
 
 def download_project_archive(request, **kwargs):
@@ -623,9 +908,20 @@ def download_project_archive(request, **kwargs):
 
     :param request: the request
     :param kwargs: keyword arguments
-    :return: a serve of a compressed archive of the project folder (ZIP format)
+    :return: a response with the cached archive of the project files (ZIP format), or a streaming response with the
+    archive while it is built
     """
     project = kwargs.get("project")
 
-    zip_filename = project.create_downloadable_archive()
-    return serve(request, basename(zip_filename), dirname(zip_filename))
+    path, chunks = project.get_downloadable_archive()
+    if path is not None:
+        return FileResponse(
+            open(path, "rb"),
+            as_attachment=True,
+            filename=project.get_archive_name(),
+        )
+    response = StreamingHttpResponse(chunks, content_type="application/zip")
+    response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+        project.get_archive_name()
+    )
+    return response
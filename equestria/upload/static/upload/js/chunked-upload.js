@@ -0,0 +1,147 @@
+UPLOAD_FORM = document.getElementById("upload-form");
+UPLOAD_PROGRESS = document.getElementById("upload-progress");
+UPLOAD_REMOVED = document.getElementById("upload-removed");
+UPLOAD_REMOVED_LIST = document.getElementById("upload-removed-list");
+
+// Number of times a chunk is sent again after a failed request before the upload is paused.
+const CHUNK_RETRIES = 5;
+// Number of milliseconds to wait before sending a chunk again after a failed request.
+const CHUNK_RETRY_TIMEOUT = 2000;
+// Maximum size in bytes of the files that are hashed before uploading, so files that were uploaded before are not sent again.
+const HASH_MAX_SIZE = 256 * 1024 * 1024;
+
+function upload_url(/* parts */) {
+    let parts = Array.prototype.slice.call(arguments);
+    parts.unshift(UPLOAD_FORM.dataset.chunkedUrl);
+    return parts.join("/");
+}
+
+function upload_request(method, url, body, content_type) {
+    let headers = {'X-CSRFToken': UPLOAD_FORM.querySelector("[name=csrfmiddlewaretoken]").value};
+    if (content_type) {
+        headers['Content-Type'] = content_type;
+    }
+    return fetch(url, {method, body, headers, credentials: 'same-origin'}).then(function (response) {
+        return response.json().then(function (data) {
+            return {status: response.status, data};
+        });
+    });
+}
+
+function set_upload_progress(file_name, received, total) {
+    UPLOAD_PROGRESS.innerText = "Uploading " + file_name + ": " + Math.floor(100 * received / total) + "%";
+}
+
+function send_chunk(file, status, index, retries) {
+    let start = index * status.chunk_size;
+    let chunk = file.slice(start, start + status.chunk_size);
+    return upload_request('POST', upload_url(status.upload, index), chunk, 'application/octet-stream').then(function (response) {
+        if (response.status !== 200) {
+            throw new Error(response.data.error);
+        }
+        return response.data.received;
+    }).catch(function (error) {
+        if (retries <= 0) {
+            throw error;
+        }
+        return new Promise(function (resolve) {
+            setTimeout(resolve, CHUNK_RETRY_TIMEOUT);
+        }).then(function () {
+            return send_chunk(file, status, index, retries - 1);
+        });
+    });
+}
+
+function hash_file(file) {
+    if (file.size > HASH_MAX_SIZE || !window.crypto || !crypto.subtle) {
+        return Promise.resolve("");
+    }
+    return file.arrayBuffer().then(function (buffer) {
+        return crypto.subtle.digest('SHA-256', buffer);
+    }).then(function (digest) {
+        return Array.from(new Uint8Array(digest)).map(function (byte) {
+            return byte.toString(16).padStart(2, "0");
+        }).join("");
+    }).catch(function () {
+        return "";
+    });
+}
+
+function upload_file(file) {
+    return hash_file(file).then(function (hash) {
+        let data = new FormData();
+        data.append("name", file.name);
+        data.append("size", file.size);
+        data.append("modified", file.lastModified);
+        data.append("hash", hash);
+        return upload_request('POST', upload_url(), data);
+    }).then(function (response) {
+        if (response.status !== 200) {
+            return response.data.non_saved || [file.name];
+        }
+        if (response.data.complete) {
+            return response.data.non_saved;
+        }
+        let status = response.data;
+        let received = new Set(status.received);
+        let missing = [];
+        for (let index = 0; index < status.chunks; index++) {
+            if (!received.has(index)) {
+                missing.push(index);
+            }
+        }
+        set_upload_progress(file.name, received.size, status.chunks);
+        let workers = [];
+        for (let i = 0; i < Number(UPLOAD_FORM.dataset.parallelChunks); i++) {
+            workers.push((function next() {
+                if (missing.length === 0) {
+                    return Promise.resolve();
+                }
+                return send_chunk(file, status, missing.shift(), CHUNK_RETRIES).then(function (count) {
+                    set_upload_progress(file.name, count, status.chunks);
+                    return next();
+                });
+            })());
+        }
+        return Promise.all(workers).then(function () {
+            return upload_request('POST', upload_url(status.upload, "complete"));
+        }).then(function (response) {
+            return response.data.non_saved || [];
+        });
+    });
+}
+
+function show_removed(names) {
+    UPLOAD_REMOVED_LIST.innerHTML = "";
+    names.forEach(function (name) {
+        let item = document.createElement("li");
+        item.innerText = name;
+        UPLOAD_REMOVED_LIST.appendChild(item);
+    });
+    UPLOAD_REMOVED.style.display = names.length > 0 ? "" : "none";
+}
+
+if (UPLOAD_FORM !== null && window.fetch && window.Blob && Blob.prototype.slice) {
+    UPLOAD_FORM.addEventListener("submit", function (event) {
+        event.preventDefault();
+        let files = Array.from(UPLOAD_FORM.querySelector("input[type=file]").files);
+        let removed = [];
+        files.reduce(function (previous, file) {
+            return previous.then(function () {
+                return upload_file(file);
+            }).then(function (non_saved) {
+                removed = removed.concat(non_saved);
+            });
+        }, Promise.resolve()).then(function () {
+            if (removed.length === 0) {
+                window.location.reload();
+            } else {
+                UPLOAD_PROGRESS.innerText = "Upload finished.";
+                show_removed(removed);
+            }
+        }).catch(function (error) {
+            console.error("Error while uploading files.", error);
+            UPLOAD_PROGRESS.innerText = "The upload was interrupted, select the same files again to resume the upload.";
+        });
+    });
+}
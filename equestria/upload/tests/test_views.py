@@ -1,7 +1,7 @@
 from zipfile import BadZipFile
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client, RequestFactory
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from scripts.models import Project, Pipeline
 from upload.views import *
@@ -254,3 +254,128 @@ AAAA"
         assert shutilRTMock.call_count == 1
         assert shutilMoveMock.call_count == 1
         assert osremoveMock.call_count == 1
+
+
+class TestChunkedUploadView(TestCase):
+    """Check the views of chunked uploads."""
+
+    fixtures = ["uploadDB"]
+
+    def setUp(self):
+        """Set up the data needed to perform tests below."""
+        self.project = Project.create_project(
+            "test4", Pipeline.objects.get(id=1), User.objects.get(id=1)
+        )
+        self.url = reverse("upload:chunked_upload", args=[self.project])
+        self.client = Client()
+        self.client.login(username="admin", password="admin")
+
+    def tearDown(self):
+        self.project.delete()
+
+    def send_chunk(self, upload, index, data):
+        """Send a chunk of an upload."""
+        return self.client.post(
+            reverse(
+                "upload:chunked_upload_chunk",
+                args=[self.project, upload, index],
+            ),
+            data,
+            content_type="application/octet-stream",
+        )
+
+    def complete(self, upload):
+        """Complete an upload."""
+        return self.client.post(
+            reverse(
+                "upload:complete_chunked_upload", args=[self.project, upload]
+            )
+        )
+
+    @override_settings(UPLOAD_CHUNK_SIZE=4)
+    @patch("upload.views.get_upload_extensions", return_value=["wav"])
+    def test_upload(self, extensions_mock):
+        """Test that a file uploaded in chunks in any order is saved and registered."""
+        status = self.client.post(
+            self.url, {"name": "new file.wav", "size": 10, "modified": 1}
+        ).json()
+        self.assertEqual(status["chunks"], 3)
+        self.assertEqual(status["received"], [])
+        self.assertEqual(
+            self.send_chunk(status["upload"], 2, b"89").status_code, 200
+        )
+        self.assertEqual(
+            self.send_chunk(status["upload"], 1, b"456").status_code, 400
+        )
+        self.assertEqual(
+            self.send_chunk(status["upload"], 1, b"4567").status_code, 200
+        )
+        self.assertEqual(self.complete(status["upload"]).status_code, 409)
+
+        resumed = self.client.post(
+            self.url, {"name": "new file.wav", "size": 10, "modified": 1}
+        ).json()
+        self.assertEqual(resumed["upload"], status["upload"])
+        self.assertEqual(resumed["received"], [1, 2])
+        self.send_chunk(status["upload"], 0, b"0123")
+
+        response = self.complete(status["upload"])
+        self.assertEqual(response.json(), {"non_saved": []})
+        with open(os.path.join(self.project.folder, "new_file.wav"), "rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+        self.assertIn("new_file.wav", self.project.get_file_names())
+        self.assertFalse(
+            os.listdir(os.path.join(self.project.folder, Project.UPLOAD_FOLDER))
+        )
+        self.assertEqual(self.complete(status["upload"]).status_code, 404)
+
+    @patch("upload.views.get_upload_extensions", return_value=["wav"])
+    def test_upload_known_file(self, extensions_mock):
+        """Test that a file the user uploaded before is saved without uploading it again."""
+        with open(os.path.join(self.project.folder, "a.wav"), "wb") as f:
+            f.write(b"content")
+        content_hash = self.project.register_file("a.wav").content_hash
+        other = Project.create_project(
+            "test5", Pipeline.objects.get(id=1), User.objects.get(id=1)
+        )
+        self.addCleanup(other.delete)
+        response = self.client.post(
+            reverse("upload:chunked_upload", args=[other]),
+            {"name": "b.wav", "size": 7, "hash": content_hash},
+        ).json()
+        self.assertEqual(response, {"complete": True, "non_saved": []})
+        self.assertTrue(
+            os.path.samefile(
+                os.path.join(self.project.folder, "a.wav"),
+                os.path.join(other.folder, "b.wav"),
+            )
+        )
+        self.assertIn("b.wav", other.get_file_names())
+
+        response = self.client.post(
+            reverse("upload:chunked_upload", args=[other]),
+            {"name": "c.wav", "size": 7, "hash": "0" * 64},
+        ).json()
+        self.assertNotIn("complete", response)
+
+    def test_invalid_extension(self):
+        """Test that files with an invalid extension are refused."""
+        response = self.client.post(self.url, {"name": "a.xml", "size": 10})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["non_saved"], ["a.xml"])
+
+    def test_save_uploaded_zip(self):
+        """Test that uploaded zip archives are extracted with the same filter."""
+        path = os.path.join(self.project.folder, "upload.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("a.wav", b"a")
+            archive.writestr("b.xml", b"b")
+        non_saved = save_uploaded_file(self.project, "a.zip", path, ["wav"])
+        self.assertEqual(non_saved, ["b.xml"])
+        self.assertIn("a.wav", self.project.get_file_names())
+
+    @patch("scripts.models.Project.can_upload", return_value=False)
+    def test_cannot_upload(self, can_upload_mock):
+        """Test that no chunked uploads can be started when the project does not allow uploads."""
+        response = self.client.post(self.url, {"name": "a.wav", "size": 10})
+        self.assertEqual(response.status_code, 404)
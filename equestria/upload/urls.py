@@ -1,6 +1,13 @@
 """Module to parse URL and direct accordingly."""
 from django.urls import path, register_converter
-from .views import UploadProjectView, delete_file_view
+from .views import (
+    UploadProjectView,
+    ChunkedUploadView,
+    ChunkedUploadStatusView,
+    ChunkView,
+    CompleteChunkedUploadView,
+    delete_file_view,
+)
 from scripts.converters import ProjectConverter
 
 register_converter(ProjectConverter, "project")
@@ -10,4 +17,24 @@ urlpatterns = [
         "<project:project>", UploadProjectView.as_view(), name="upload_project"
     ),
     path("<project:project>/delete", delete_file_view, name="delete_file"),
+    path(
+        "<project:project>/chunked",
+        ChunkedUploadView.as_view(),
+        name="chunked_upload",
+    ),
+    path(
+        "<project:project>/chunked/<str:upload>",
+        ChunkedUploadStatusView.as_view(),
+        name="chunked_upload_status",
+    ),
+    path(
+        "<project:project>/chunked/<str:upload>/<int:index>",
+        ChunkView.as_view(),
+        name="chunked_upload_chunk",
+    ),
+    path(
+        "<project:project>/chunked/<str:upload>/complete",
+        CompleteChunkedUploadView.as_view(),
+        name="complete_chunked_upload",
+    ),
 ]
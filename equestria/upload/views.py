@@ -1,9 +1,17 @@
 """Module to handle uploading files."""
 import os
-from django.http import Http404
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect
-from django.views.generic import TemplateView
-from scripts.models import InputTemplate, Project, Profile
+from django.utils.text import get_valid_filename
+from django.views.generic import TemplateView, View
+from scripts.models import InputTemplate, Project, Profile, ProjectFile
+from scripts.services import (
+    blob_store,
+    invalidate_file_index,
+    ChunkedUpload,
+    FilteredZipExtractor,
+)
 
 from .forms import UploadForm
 from django.core.files.storage import FileSystemStorage
@@ -27,25 +35,24 @@ class UploadProjectView(LoginRequiredMixin, TemplateView):
         :param project: the project to render the view for
         :return: a context attribute with standard context for the view
         """
-        files = [
-            x
-            for x in os.listdir(project.folder)
-            if os.path.isfile(os.path.join(project.folder, x))
-        ]
-        templates = InputTemplate.objects.filter(
-            corresponding_profile__script=project.pipeline.fa_script
-        )
-        extensions = list(set([x.extension for x in templates]))
+        files = project.get_file_names()
         context = {
             "project": project,
             "files": files,
-            "extensions": extensions,
+            "extensions": list(set(get_upload_extensions(project))),
             "profiles": Profile.objects.filter(
                 script=project.pipeline.fa_script
             ),
+            "valid_profiles": [
+                profile.id
+                for profile, _ in project.pipeline.fa_script.match_profiles(
+                    files
+                )
+            ],
         }
         if project.can_start_new_process():
             context["can_start"] = True
+            context["max_shards"] = settings.CLAM_MAX_SHARDS
         return context
 
     def get(self, request, **kwargs):
@@ -63,6 +70,7 @@ class UploadProjectView(LoginRequiredMixin, TemplateView):
         context = self.get_standard_context(project)
         if project.can_upload():
             context["upload_form"] = UploadForm()
+            context["parallel_chunks"] = settings.UPLOAD_PARALLEL_CHUNKS
         return render(request, self.template_name, context)
 
     def post(self, request, **kwargs):
@@ -81,10 +89,7 @@ class UploadProjectView(LoginRequiredMixin, TemplateView):
         if not project.can_upload():
             raise Http404("Can't upload files to this project")
 
-        templates = InputTemplate.objects.filter(
-            corresponding_profile__script=project.pipeline.fa_script
-        )
-        extensions = [x.extension for x in templates]
+        extensions = get_upload_extensions(project)
 
         upload_form = UploadForm(request.POST, request.FILES)
         non_saved = list()
@@ -93,7 +98,13 @@ class UploadProjectView(LoginRequiredMixin, TemplateView):
             for file in uploaded_files:
                 name, extension = os.path.splitext(file.name)
                 if extension[1:] == "zip":
-                    non_saved += save_zipped_files(project, file)
+                    try:
+                        non_saved += save_zipped_files(project, file)
+                    except (
+                        FilteredZipExtractor.LimitExceeded,
+                        zipfile.BadZipFile,
+                    ):
+                        non_saved.append(file)
                 elif extension[1:] in extensions:
                     save_file(project, file)
                 else:
@@ -108,6 +119,245 @@ class UploadProjectView(LoginRequiredMixin, TemplateView):
             return render(request, self.template_name, context)
 
 
+class ChunkedUploadMixin(LoginRequiredMixin):
+    """Mixin for the views of chunked uploads to a project."""
+
+    login_url = "/accounts/login/"
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Check whether files can be uploaded to the project before handling the request.
+
+        :param request: the request
+        :param args: arguments
+        :param kwargs: keyword arguments
+        :return: the response of the view, raises PermissionDenied if the user has no access to the project and Http404
+        if no files can be uploaded to the project
+        """
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        project = kwargs.get("project")
+        if not request.user.has_perm("access_project", project):
+            raise PermissionDenied
+        if not project.can_upload():
+            raise Http404("Can't upload files to this project")
+        return super(ChunkedUploadMixin, self).dispatch(
+            request, *args, **kwargs
+        )
+
+    @staticmethod
+    def get_upload(project, upload_id):
+        """
+        Get an existing chunked upload of a project.
+
+        :param project: the project
+        :param upload_id: the identifier of the upload
+        :return: the ChunkedUpload, raises Http404 if it does not exist
+        """
+        upload = ChunkedUpload.get(
+            os.path.join(project.folder, Project.UPLOAD_FOLDER), upload_id
+        )
+        if upload is None:
+            raise Http404("Upload does not exist")
+        return upload
+
+    @staticmethod
+    def get_status(upload):
+        """
+        Get the status of a chunked upload.
+
+        :param upload: the ChunkedUpload
+        :return: a dictionary with the identifier, chunk size, number of chunks and received chunks of the upload
+        """
+        return {
+            "upload": upload.upload_id,
+            "chunk_size": upload.info["chunk_size"],
+            "chunks": upload.get_chunk_count(),
+            "received": upload.get_received(),
+        }
+
+
+class ChunkedUploadView(ChunkedUploadMixin, View):
+    """View for starting or resuming a chunked upload of a file."""
+
+    def post(self, request, **kwargs):
+        """
+        Start the upload of a file or resume the upload of the same file.
+
+        A file of which the hash is sent and that the user already uploaded before is linked from the blob store at once,
+        without uploading it again.
+        :param request: the request with the name, size and optionally the modification time and SHA-256 hash of the
+        file
+        :param kwargs: keyword arguments
+        :return: a JSON response with the status of the upload, a JSON response with complete set if the file is saved
+        without uploading it, or with an error and status 400 if the file can not be uploaded
+        """
+        project = kwargs.get("project")
+        name = get_valid_filename(
+            os.path.basename(request.POST.get("name", ""))
+        )
+        try:
+            size = int(request.POST.get("size", ""))
+        except ValueError:
+            size = -1
+        if not name or not 0 <= size <= settings.UPLOAD_MAX_FILE_SIZE:
+            return JsonResponse({"error": "Invalid file"}, status=400)
+        if not is_accepted_upload(name, get_upload_extensions(project)):
+            return JsonResponse(
+                {"error": "Invalid extension", "non_saved": [name]}, status=400
+            )
+        if save_known_file(
+            project, request.user, name, request.POST.get("hash", "")
+        ):
+            return JsonResponse({"complete": True, "non_saved": []})
+        root = os.path.join(project.folder, Project.UPLOAD_FOLDER)
+        ChunkedUpload.remove_expired(root)
+        upload = ChunkedUpload.start(
+            root, name, size, modified=request.POST.get("modified")
+        )
+        return JsonResponse(self.get_status(upload))
+
+
+class ChunkedUploadStatusView(ChunkedUploadMixin, View):
+    """View for getting the status of a chunked upload."""
+
+    def get(self, request, **kwargs):
+        """
+        Get the status of an upload.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a JSON response with the status of the upload
+        """
+        upload = self.get_upload(kwargs.get("project"), kwargs.get("upload"))
+        return JsonResponse(self.get_status(upload))
+
+
+class ChunkView(ChunkedUploadMixin, View):
+    """View for uploading a single chunk of a file."""
+
+    def post(self, request, **kwargs):
+        """
+        Write a chunk of a file, the body of the request holds the raw bytes of the chunk.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a JSON response with the number of received chunks, or with an error and status 400 if the chunk does
+        not fit in the upload
+        """
+        upload = self.get_upload(kwargs.get("project"), kwargs.get("upload"))
+        try:
+            upload.write_chunk(kwargs.get("index"), request)
+        except ChunkedUpload.InvalidChunk as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        return JsonResponse({"received": len(upload.get_received())})
+
+
+class CompleteChunkedUploadView(ChunkedUploadMixin, View):
+    """View for completing a chunked upload once all chunks are received."""
+
+    def post(self, request, **kwargs):
+        """
+        Complete an upload by moving the file into the project folder, or extracting it if it is a zip archive.
+
+        :param request: the request
+        :param kwargs: keyword arguments
+        :return: a JSON response with the names of the files that are not saved, or with the status of the upload and
+        status 409 if chunks are missing or the upload is already being completed
+        """
+        project = kwargs.get("project")
+        upload = self.get_upload(project, kwargs.get("upload"))
+        if not upload.is_complete() or not upload.claim():
+            return JsonResponse(self.get_status(upload), status=409)
+        try:
+            non_saved = save_uploaded_file(
+                project,
+                upload.name,
+                upload.get_data_path(),
+                get_upload_extensions(project),
+            )
+        finally:
+            upload.discard()
+        return JsonResponse({"non_saved": non_saved})
+
+
+def get_upload_extensions(project):
+    """
+    Get the extensions of the files that can be uploaded to a project.
+
+    :param project: the project
+    :return: a list of the extensions of the input templates of the FA script of the project
+    """
+    templates = InputTemplate.objects.filter(
+        corresponding_profile__script=project.pipeline.fa_script
+    )
+    return [x.extension for x in templates]
+
+
+def is_accepted_upload(name, extensions):
+    """
+    Check whether a file can be uploaded.
+
+    :param name: the name of the file
+    :param extensions: the allowed extensions
+    :return: True if the file is a zip archive or has one of the allowed extensions, False otherwise
+    """
+    extension = os.path.splitext(name)[1][1:]
+    return extension == "zip" or extension in extensions
+
+
+def save_known_file(project, user, name, content_hash):
+    """
+    Save a file to a project from the blob store without uploading it.
+
+    Only input files that the user uploaded to one of their projects before are saved this way, so the contents of a
+    file can not be obtained by only knowing its hash.
+    :param project: the project to save the file to
+    :param user: the user uploading the file
+    :param name: the name of the file
+    :param content_hash: the SHA-256 hash of the contents of the file
+    :return: True if the file is saved, False if it must be uploaded
+    """
+    if (
+        not blob_store.has(content_hash)
+        or os.path.splitext(name)[1][1:] == "zip"
+        or ProjectFile.get_role(name) != ProjectFile.INPUT
+        or not ProjectFile.objects.filter(
+            project__user=user, content_hash=content_hash
+        ).exists()
+    ):
+        return False
+    if not blob_store.link(content_hash, os.path.join(project.folder, name)):
+        return False
+    invalidate_file_index(project.folder)
+    project.register_file(name, content_hash=content_hash)
+    return True
+
+
+def save_uploaded_file(project, name, path, extensions):
+    """
+    Save a completely uploaded file to a project, the file is moved into the project folder.
+
+    Zip archives are extracted and files without an allowed extension are discarded.
+    :param project: the project to save the file to
+    :param name: the name of the file
+    :param path: the path of the uploaded file, on the same file system as the project folder
+    :param extensions: the allowed extensions
+    :return: a list of the names of the files that are not saved
+    """
+    if os.path.splitext(name)[1][1:] == "zip":
+        try:
+            return project.extract_archive(path, extensions)
+        except (FilteredZipExtractor.LimitExceeded, zipfile.BadZipFile):
+            return [name]
+    elif not is_accepted_upload(name, extensions):
+        return [name]
+    os.replace(path, os.path.join(project.folder, name))
+    invalidate_file_index(project.folder)
+    project.register_file(name)
+    return []
+
+
 def handle_folders(project):
     """
     Handle folders in the project folder if they are uploaded.
@@ -126,7 +376,9 @@ def handle_folders(project):
                 if os.path.isfile(file_in_root):
                     os.remove(file_in_root)
                 shutil.move(full_path, project.folder)
+                project.register_file(file)
         shutil.rmtree(sd)
+    invalidate_file_index(project.folder)
 
 
 def save_zipped_files(project, file):
@@ -135,20 +387,9 @@ def save_zipped_files(project, file):
 
     :param project: the project to save the file to
     :param file: the zip file of type <class 'django.core.files.uploadedfile.InMemoryUploadedFile'>
-    :return: None
+    :return: a list of the names of the files in the zip file that are not saved
     """
-    templates = InputTemplate.objects.filter(
-        corresponding_profile__script=project.pipeline.fa_script
-    )
-    extensions = [x.extension for x in templates]
-    with zipfile.ZipFile(file) as zip_file:
-        zip_file.extractall(
-            os.path.join(project.folder, Project.EXTRACT_FOLDER)
-        )
-
-    non_copied = project.move_extracted_files(extensions)
-    shutil.rmtree(os.path.join(project.folder, Project.EXTRACT_FOLDER))
-    return non_copied
+    return project.extract_archive(file, get_upload_extensions(project))
 
 
 def save_file(project, file):
@@ -164,7 +405,9 @@ def save_file(project, file):
     if fs.exists(file.name):
         """Delete previously uploaded file with same name."""
         fs.delete(file.name)
-    fs.save(file.name, file)
+    name = fs.save(file.name, file)
+    invalidate_file_index(path)
+    project.register_file(name)
 
 
 def delete_file_view(request, **kwargs):
@@ -180,6 +423,8 @@ def delete_file_view(request, **kwargs):
     file = request.POST.get("file")
     if os.path.exists(os.path.join(project.folder, file)):
         os.remove(os.path.join(project.folder, file))
+        invalidate_file_index(project.folder)
+        project.unregister_file(file)
         return redirect("upload:upload_project", project=project)
     else:
         raise Http404("File does not exist")
@@ -4,5 +4,11 @@ set -e
 
 cd /equestria/src/website
 
+echo "Starting CLAM process poller"
+sudo -u www-data -E python manage.py poll_processes &
+
+echo "Starting CLAM script sync"
+sudo -u www-data -E python manage.py sync_scripts &
+
 echo "Starting background tasks"
 sudo -u www-data -E python manage.py process_tasks
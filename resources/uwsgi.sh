@@ -4,12 +4,15 @@ set -e
 
 cd /equestria/src/website
 
+# Process status requests on loading screens hold a thread for up to PROCESS_LONG_POLL_TIMEOUT seconds, at most
+# PROCESS_LONG_POLL_MAX_WAITERS of the threads of each process do so. Keep the number of threads above that limit.
 echo "Starting uwsgi server."
 uwsgi --chdir=/equestria/src/website \
     --module=equestria.wsgi:application \
     --master --pidfile=/tmp/project-master.pid \
     --socket=:8000 \
     --processes=5 \
+    --threads=4 \
     --uid=www-data --gid=www-data \
     --harakiri=20 \
     --post-buffering=16384 \